@@ -1,10 +1,9 @@
 # Universal Toolkit - Modular Flask Application
 import os
 import logging
-import threading
-import time
 import atexit
-from flask import Flask, jsonify, send_file
+from flask import Flask, Response, jsonify, request, send_file
+from werkzeug.security import safe_join
 
 # Import all route blueprints
 from routes.main import main_bp
@@ -14,10 +13,16 @@ from routes.audio import audio_bp
 from routes.image import image_bp
 from routes.document import document_bp
 from routes.utility import utility_bp
+from routes.upload import upload_bp
 
 # Import utility functions
-from utils.common import cleanup_old_files, get_progress
-from utils.config import UPLOAD_FOLDER, OUTPUT_FOLDER
+from utils.common import get_progress
+from utils.scheduler import job_scheduler, cancel_job
+from utils.job_journal import mark_watched
+from utils.progress_stream import ProgressStream
+from utils.task_manifest import resolve_download, resolve_stream
+from utils import result_cache, expiry_index
+from utils.config import UPLOAD_FOLDER, OUTPUT_FOLDER, ARTIFACT_TTL_SECONDS
 
 # Setup logging
 logging.basicConfig(
@@ -26,6 +31,18 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Content types of HLS package files
+STREAM_MIMETYPES = {
+    '.m3u8': 'application/vnd.apple.mpegurl',
+    '.m4s': 'video/iso.segment',
+    '.mp4': 'video/mp4',
+    '.vtt': 'text/vtt',
+    '.jpg': 'image/jpeg',
+    '.webp': 'image/webp',
+    '.png': 'image/png',
+    '.json': 'application/json',
+}
+
 def create_app():
     """Create and configure Flask application"""
     app = Flask(__name__)
@@ -49,35 +66,123 @@ def create_app():
     app.register_blueprint(image_bp)
     app.register_blueprint(document_bp)
     app.register_blueprint(utility_bp)
+    app.register_blueprint(upload_bp)
+    
+    @app.before_request
+    def start_sweeper():
+        # Once per web worker (threads do not survive gunicorn's --preload fork);
+        # job processes only write to the expiry index
+        expiry_index.ensure_sweeper()
     
     # Common progress endpoint (used by all modules)
     @app.route('/api/progress/<task_id>')
     def api_get_progress(task_id):
         """Get progress for any task"""
         try:
+            mark_watched(task_id)
             progress = get_progress(task_id)
             return jsonify(progress)
         except Exception as e:
             logger.error(f"Progress endpoint error: {str(e)[:100]}")
             return jsonify({'error': 'Gagal mendapatkan progress'}), 500
     
+    # Progress streams (Server-Sent Events), pushed only when progress changes
+    def progress_stream_response(task_ids):
+        stream = ProgressStream.open(task_ids, request.headers.get('Last-Event-ID'))
+        if stream is None:
+            # Each stream holds a worker thread; over the limit the client polls instead
+            # (EventSource gives up on a non-200 response and app.js switches to polling)
+            response = jsonify({'error': 'Terlalu banyak stream progress, gunakan polling',
+                                'poll_urls': [f'/api/progress/{task_id}' for task_id in task_ids]})
+            response.status_code = 503
+            response.headers['Retry-After'] = '5'
+            return response
+        return Response(stream, mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+        })
+    
+    @app.route('/api/progress/<task_id>/stream')
+    def api_progress_stream(task_id):
+        """Stream progress for one task"""
+        return progress_stream_response([task_id])
+    
+    @app.route('/api/progress/stream')
+    def api_progress_stream_multi():
+        """Stream progress for several tasks (?tasks=id1,id2)"""
+        task_ids = [t for t in request.args.get('tasks', '').split(',') if t]
+        if not task_ids:
+            return jsonify({'error': 'Parameter tasks diperlukan'}), 400
+        if len(task_ids) > 20:
+            return jsonify({'error': 'Maksimal 20 tugas per stream'}), 400
+        return progress_stream_response(task_ids)
+    
+    # Cancel a queued or running task (kills its ffmpeg/pandoc/yt-dlp processes)
+    @app.route('/api/task/<task_id>', methods=['DELETE'])
+    def api_cancel_task(task_id):
+        """Cancel a task"""
+        result = cancel_job(task_id)
+        if result is None:
+            return jsonify({'error': 'Tugas tidak ditemukan'}), 404
+        if not result:
+            return jsonify({'error': 'Tugas sudah selesai'}), 409
+        return jsonify({'success': True, 'message': 'Pembatalan tugas diproses'})
+    
+    # Job queue statistics per resource class
+    @app.route('/api/jobs/stats')
+    def api_job_stats():
+        """Get running and queued job counts"""
+        return jsonify(job_scheduler.stats())
+    
+    # Result cache statistics
+    @app.route('/api/cache/stats')
+    def api_cache_stats():
+        """Get result cache hit/miss counters and size"""
+        return jsonify(result_cache.stats())
+    
+    # Disk usage of tracked uploads and outputs
+    @app.route('/api/storage/stats')
+    def api_storage_stats():
+        """Get tracked artifact counts, quota and free space"""
+        return jsonify(expiry_index.stats())
+    
     # Common download endpoint (used by all modules)
     @app.route('/download/<task_id>')
     def api_download_file(task_id):
         """Download the processed file"""
         try:
-            # Find the output file for this task
-            for filename in os.listdir(OUTPUT_FOLDER):
-                if task_id in filename:
-                    file_path = os.path.join(OUTPUT_FOLDER, filename)
-                    return send_file(file_path, as_attachment=True)
+            # Look up the output recorded in the task manifest
+            artifact = resolve_download(task_id)
+            if not artifact:
+                return jsonify({'error': 'File tidak ditemukan'}), 404
             
-            return jsonify({'error': 'File tidak ditemukan'}), 404
+            return send_file(artifact['path'], mimetype=artifact['mime'], as_attachment=True)
             
         except Exception as e:
             logger.error(f"Download endpoint error: {str(e)[:100]}")
             return jsonify({'error': 'File tidak dapat diunduh'}), 500
     
+    # HLS playlists and segments, thumbnail sprites and their WebVTT index, responsive image variants
+    @app.route('/stream/<task_id>/<path:filename>')
+    def api_stream_file(task_id, filename):
+        """Serve a playlist, segment, sprite or image variant; segments are cacheable, playlists revalidated"""
+        directory = resolve_stream(task_id)
+        path = safe_join(directory, filename) if directory else None
+        if not path or not os.path.isfile(path):
+            return jsonify({'error': 'Streaming tidak ditemukan'}), 404
+        
+        extension = os.path.splitext(filename)[1].lower()
+        playlist = extension == '.m3u8'
+        # Playlists are revalidated; segment names are never reused within a task
+        response = send_file(path, mimetype=STREAM_MIMETYPES.get(extension), conditional=True,
+                             max_age=None if playlist else ARTIFACT_TTL_SECONDS)
+        if playlist:
+            # Playback keeps the package alive (LRU order for quota eviction)
+            expiry_index.touch(directory)
+        else:
+            response.cache_control.immutable = True
+        return response
+    
     # Error handlers
     @app.errorhandler(413)
     def too_large(e):
@@ -126,21 +231,6 @@ def check_binary_dependencies():
     logger.info("All critical binaries are available")
     return True
 
-def initialize_cleanup_scheduler():
-    """Initialize periodic cleanup of old files"""
-    def periodic_cleanup():
-        """Run cleanup every hour"""
-        while True:
-            time.sleep(3600)  # Run every hour
-            try:
-                cleanup_old_files([UPLOAD_FOLDER, OUTPUT_FOLDER], max_age_hours=2)
-            except Exception as e:
-                logger.error(f"Error during periodic cleanup: {e}")
-    
-    cleanup_thread = threading.Thread(target=periodic_cleanup, daemon=True)
-    cleanup_thread.start()
-    logger.info("Periodic cleanup scheduler initialized")
-
 def initialize_app():
     """Initialize the application with dependency checks and cleanup"""
     logger.info("🚀 Initializing Universal Toolkit...")
@@ -154,19 +244,25 @@ def initialize_app():
     if not check_binary_dependencies():
         logger.warning("⚠️ Some features may not work due to missing dependencies")
     
-    # Initial cleanup
-    cleanup_old_files([UPLOAD_FOLDER, OUTPUT_FOLDER], max_age_hours=1)
+    # Remove leftovers the expiry index does not know about
+    expiry_index.reconcile([UPLOAD_FOLDER, OUTPUT_FOLDER])
     logger.info("Initial cleanup completed")
     
-    # Start cleanup scheduler
-    initialize_cleanup_scheduler()
+    # Tracked uploads and outputs are deleted by each web worker's sweeper
+    # (started with its first request) when they expire
+    
+    # Launch the job supervisor; it requeues jobs interrupted by a restart
+    job_scheduler.ensure_dispatcher()
     
     logger.info("✅ Universal Toolkit initialized successfully")
 
-# Register cleanup on exit (for development mode)
-atexit.register(lambda: cleanup_old_files([UPLOAD_FOLDER, OUTPUT_FOLDER], max_age_hours=0))
-
 if __name__ == '__main__':
+    # Register cleanup on exit (development server only; under gunicorn a
+    # worker exiting must not delete files other workers are still serving).
+    # Everything tracked is expired through the index so its rows go too;
+    # untracked leftovers are handled by reconcile() on the next start
+    atexit.register(lambda: expiry_index.sweep_expired(now=float('inf')))
+    
     # Initialize and create app for development
     initialize_app()
     app = create_app()
@@ -0,0 +1,41 @@
+# Job supervisor: runs background jobs outside the gunicorn worker lifecycle
+import sys
+import time
+import logging
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+
+# Importing the blueprints registers every job handler
+import routes.downloader  # noqa: E402,F401
+import routes.video  # noqa: E402,F401
+import routes.audio  # noqa: E402,F401
+import routes.image  # noqa: E402,F401
+import routes.document  # noqa: E402,F401
+import routes.utility  # noqa: E402,F401
+from utils import job_journal  # noqa: E402
+from utils.scheduler import job_scheduler  # noqa: E402
+from utils.config import PROGRESS_TTL_SECONDS  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Finished journal entries are kept as long as their progress entries
+JOURNAL_PURGE_INTERVAL = 3600
+
+def main():
+    """Dispatch journaled jobs until terminated"""
+    if not job_scheduler.start_dispatcher():
+        logger.info("Another job supervisor is already running")
+        return 0
+
+    while True:
+        job_journal.purge_finished(PROGRESS_TTL_SECONDS)
+        time.sleep(JOURNAL_PURGE_INTERVAL)
+
+if __name__ == '__main__':
+    sys.exit(main())
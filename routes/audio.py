@@ -1,12 +1,18 @@
 # Audio processing API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-from werkzeug.utils import secure_filename
-from utils.ffmpeg_wrapper import FFmpegProcessor
+import json
+from utils.ffmpeg_wrapper import FFmpegProcessor, STREAMABLE_FORMATS
 from utils.utility_wrapper import UtilityProcessor
-from utils.common import generate_task_id, get_progress, validate_file_content, allowed_file
-from utils.config import OUTPUT_FOLDER, UPLOAD_FOLDER
+from utils.common import generate_task_id, get_progress, update_progress
+from utils.scheduler import register_job, submit_job
+from routes.upload import (receive_upload, peek_content_hash, discard_upload, receive_stream_source,
+                           stream_transcode_response, allow_stream_body, stream_too_large_response)
+from utils.resource_governor import compute_budget
+from utils.result_cache import make_cache_key, serve_cached, store
+from utils.task_manifest import record_output
+from utils.config import OUTPUT_FOLDER
 
 audio_bp = Blueprint('audio_api', __name__)
 
@@ -14,103 +20,116 @@ audio_bp = Blueprint('audio_api', __name__)
 ffmpeg_processor = FFmpegProcessor(OUTPUT_FOLDER)
 utility_processor = UtilityProcessor(OUTPUT_FOLDER)
 
+@register_job('audio.convert', resource_class='cpu')
+def convert_audio_job(task_id, input_path, output_format, quality, sample_rate, cache_key=None):
+    """Background job: convert uploaded audio"""
+    try:
+        output_path = ffmpeg_processor.convert_audio(input_path, task_id, output_format, quality, sample_rate)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi audio gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @audio_bp.route('/api/audio/convert', methods=['POST'])
 def convert_audio():
     """Convert audio format with quality options"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         output_format = request.form.get('format', 'mp3')
         quality = request.form.get('quality', '192')
         sample_rate = request.form.get('sample_rate', type=int)
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'audio'):
-            return jsonify({'error': 'Format file audio tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'audio', 'Format file audio tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'output_format': output_format, 'quality': quality, 'sample_rate': sample_rate}
+        cache_key = make_cache_key(upload, 'audio.convert', params, 'ffmpeg')
+        if serve_cached(cache_key, task_id, 'audio'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Konversi audio selesai (dari cache)', 'cached': True})
         
-        def convert_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert audio
-                result_path = ffmpeg_processor.convert_audio(input_path, task_id, output_format, quality, sample_rate)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi audio gagal: {str(e)}')
-        
-        thread = threading.Thread(target=convert_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'audio.convert', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi audio dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@audio_bp.route('/api/audio/stream', methods=['POST'])
+def stream_audio():
+    """Convert audio while it uploads and stream the result back (no files on disk)"""
+    try:
+        allow_stream_body()
+        # Options come in the query string when the body is the raw file
+        output_format = request.values.get('format', 'mp3')
+        quality = request.values.get('quality', '192')
+        muxer = STREAMABLE_FORMATS.get(output_format)
+        if not muxer or muxer[2] != 'audio':
+            return jsonify({'error': 'Format ini tidak mendukung streaming'}), 400
+        if not str(quality).isdigit():
+            return jsonify({'error': 'Kualitas audio tidak valid'}), 400
+        
+        source, error = receive_stream_source('audio', 'Format file audio tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        
+        args = ffmpeg_processor.streaming_command(source.get('path'), output_format, quality,
+                                                  threads=compute_budget('cpu'))
+        return stream_transcode_response(args, source, muxer[1], f'audio.{output_format}')
+        
+    except RequestEntityTooLarge as e:
+        return stream_too_large_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@register_job('audio.metadata', resource_class='light')
+def extract_audio_metadata_job(task_id, input_path):
+    """Background job: extract audio metadata to a JSON file"""
+    try:
+        metadata = utility_processor.extract_audio_metadata(input_path, task_id)
+        
+        if metadata:
+            # Save metadata to file
+            metadata_filename = f'metadata_{task_id}.json'
+            metadata_path = os.path.join(OUTPUT_FOLDER, metadata_filename)
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, indent=2, ensure_ascii=False)
+            record_output(task_id, metadata_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Ekstraksi metadata gagal: {str(e)}')
+    finally:
+        # Clean up temp file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @audio_bp.route('/api/audio/metadata', methods=['POST'])
 def extract_audio_metadata():
     """Extract comprehensive audio metadata"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
-        
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
-        
-        if not allowed_file(file.filename, 'audio'):
-            return jsonify({'error': 'Format file audio tidak valid'}), 400
+        # Content probed before needs neither the file on disk nor ffprobe
+        content_hash = peek_content_hash()
+        info = ffmpeg_processor.get_cached_media_info(content_hash)
+        if info:
+            discard_upload()
+            return jsonify({'success': True, 'info': info})
         
         task_id = generate_task_id()
         
-        def extract_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                temp_path = os.path.join(UPLOAD_FOLDER, f'temp_{task_id}_{filename}')
-                file.save(temp_path)
-                
-                # Extract metadata
-                metadata = utility_processor.extract_audio_metadata(temp_path, task_id)
-                
-                # Clean up temp file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                
-                if metadata:
-                    # Save metadata to file
-                    import json
-                    metadata_filename = f'metadata_{task_id}.json'
-                    metadata_path = os.path.join(OUTPUT_FOLDER, metadata_filename)
-                    with open(metadata_path, 'w', encoding='utf-8') as f:
-                        json.dump(metadata, f, indent=2, ensure_ascii=False)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Ekstraksi metadata gagal: {str(e)}')
-        
-        thread = threading.Thread(target=extract_task)
-        thread.daemon = True
-        thread.start()
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'audio', 'Format file audio tidak valid', prefix='temp_')
+        if error:
+            return jsonify({'error': error}), 400
+        temp_path = upload['path']
+        
+        submit_job(task_id, 'audio.metadata', input_path=temp_path)
         
         return jsonify({'task_id': task_id, 'message': 'Ekstraksi metadata dimulai'})
         
@@ -121,27 +140,23 @@ def extract_audio_metadata():
 def get_audio_info():
     """Get audio file information immediately"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
-        
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
-        
-        if not allowed_file(file.filename, 'audio'):
-            return jsonify({'error': 'Format file audio tidak valid'}), 400
+        # Content probed before needs neither the file on disk nor ffprobe
+        content_hash = peek_content_hash()
+        info = ffmpeg_processor.get_cached_media_info(content_hash)
+        if info:
+            discard_upload()
+            return jsonify({'success': True, 'info': info})
         
-        # Save file temporarily
         task_id = generate_task_id()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f'temp_{task_id}_{filename}')
-        file.save(temp_path)
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'audio', 'Format file audio tidak valid', prefix='temp_')
+        if error:
+            return jsonify({'error': error}), 400
+        temp_path = upload['path']
         
         # Get audio info using ffmpeg
-        info = ffmpeg_processor.get_media_info(temp_path)
+        info = ffmpeg_processor.get_media_info(temp_path, upload['sha256'])
         
         # Clean up temp file
         if os.path.exists(temp_path):
@@ -1,150 +1,131 @@
 # Document processing API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
 import os
-from werkzeug.utils import secure_filename
 from utils.pandoc_wrapper import DocumentProcessor
-from utils.common import generate_task_id, get_progress, validate_file_content, allowed_file
-from utils.config import OUTPUT_FOLDER, UPLOAD_FOLDER
+from utils.common import generate_task_id, get_progress, update_progress
+from utils.scheduler import register_job, submit_job
+from routes.upload import receive_upload
+from utils.result_cache import make_cache_key, serve_cached, store
+from utils.config import OUTPUT_FOLDER
 
 document_bp = Blueprint('document_api', __name__)
 
 # Initialize document processor
 document_processor = DocumentProcessor(OUTPUT_FOLDER)
 
+@register_job('document.convert', resource_class='cpu')
+def convert_document_job(task_id, input_path, output_format, cache_key=None):
+    """Background job: convert uploaded document"""
+    try:
+        output_path = document_processor.convert_document(input_path, task_id, output_format)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi dokumen gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @document_bp.route('/api/document/convert', methods=['POST'])
 def convert_document():
     """Convert document format using pandoc"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         output_format = request.form.get('format', 'pdf')
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'document'):
-            return jsonify({'error': 'Format file dokumen tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'document', 'Format file dokumen tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'output_format': output_format}
+        cache_key = make_cache_key(upload, 'document.convert', params, 'pandoc')
+        if serve_cached(cache_key, task_id, 'converted_document'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Konversi dokumen selesai (dari cache)', 'cached': True})
         
-        def convert_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert document
-                result_path = document_processor.convert_document(input_path, task_id, output_format)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi dokumen gagal: {str(e)}')
-        
-        thread = threading.Thread(target=convert_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'document.convert', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi dokumen dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('document.extract_text', resource_class='cpu')
+def extract_text_job(task_id, input_path, cache_key=None):
+    """Background job: extract text from uploaded document"""
+    try:
+        output_path = document_processor.extract_text(input_path, task_id)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Ekstraksi teks gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @document_bp.route('/api/document/extract-text', methods=['POST'])
 def extract_text():
     """Extract plain text from document"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
-        
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'document'):
-            return jsonify({'error': 'Format file dokumen tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'document', 'Format file dokumen tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {}
+        cache_key = make_cache_key(upload, 'document.extract_text', params, 'pandoc')
+        if serve_cached(cache_key, task_id, 'extracted_text'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Ekstraksi teks selesai (dari cache)', 'cached': True})
         
-        def extract_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Extract text
-                result_path = document_processor.extract_text(input_path, task_id)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Ekstraksi teks gagal: {str(e)}')
-        
-        thread = threading.Thread(target=extract_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'document.extract_text', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Ekstraksi teks dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('document.to_markdown', resource_class='cpu')
+def convert_to_markdown_job(task_id, input_path, cache_key=None):
+    """Background job: convert uploaded document to Markdown"""
+    try:
+        output_path = document_processor.convert_to_markdown(input_path, task_id)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi markdown gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @document_bp.route('/api/document/to-markdown', methods=['POST'])
 def convert_to_markdown():
     """Convert document to Markdown format"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
-        
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'document'):
-            return jsonify({'error': 'Format file dokumen tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'document', 'Format file dokumen tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {}
+        cache_key = make_cache_key(upload, 'document.to_markdown', params, 'pandoc')
+        if serve_cached(cache_key, task_id, 'converted_markdown'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Konversi markdown selesai (dari cache)', 'cached': True})
         
-        def convert_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert to markdown
-                result_path = document_processor.convert_to_markdown(input_path, task_id)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi markdown gagal: {str(e)}')
-        
-        thread = threading.Thread(target=convert_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'document.to_markdown', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi markdown dimulai'})
         
@@ -155,24 +136,13 @@ def convert_to_markdown():
 def get_document_info():
     """Get document information immediately"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
-        
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
-        
-        if not allowed_file(file.filename, 'document'):
-            return jsonify({'error': 'Format file dokumen tidak valid'}), 400
-        
-        # Save file temporarily
         task_id = generate_task_id()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f'temp_{task_id}_{filename}')
-        file.save(temp_path)
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'document', 'Format file dokumen tidak valid', prefix='temp_')
+        if error:
+            return jsonify({'error': error}), 400
+        temp_path = upload['path']
         
         # Get document info
         info = document_processor.get_document_info(temp_path)
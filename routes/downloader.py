@@ -1,15 +1,48 @@
 # Downloader API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
-import os
 from utils.yt_dlp_wrapper import MediaDownloader
-from utils.common import generate_task_id, get_progress
+from utils.ffmpeg_wrapper import FFmpegProcessor
+from utils.common import generate_task_id, get_progress, update_progress
+from utils.scheduler import register_job, submit_job
+from utils.task_manifest import resolve_download, get_outputs
+from utils.job_journal import mark_watched
 from utils.config import OUTPUT_FOLDER
 
 downloader_bp = Blueprint('downloader_api', __name__)
 
 # Initialize downloader
 media_downloader = MediaDownloader(OUTPUT_FOLDER)
+video_processor = FFmpegProcessor(OUTPUT_FOLDER)
+
+# Background download jobs (network-bound, scheduled on the io pool)
+@register_job('download.video', resource_class='io')
+def download_video_job(task_id, url, format_type, quality, packaging='file'):
+    """Background job: download video (optionally packaged as HLS for preview)"""
+    hls = packaging == 'hls'
+    if not media_downloader.download_video(url, task_id, format_type, quality, complete=not hls) or not hls:
+        return
+    
+    videos = [a['path'] for a in get_outputs(task_id) if (a['mime'] or '').startswith('video/')]
+    if not videos:
+        update_progress(task_id, 100, 'completed', 'Unduhan berhasil! (tidak ada video untuk streaming)')
+        return
+    # Usually a remux: downloads are mostly H.264/AAC already
+    video_processor.package_hls(videos[0], task_id, start=90)
+
+@register_job('download.audio', resource_class='io')
+def download_audio_job(task_id, url, format_type, quality):
+    """Background job: download audio"""
+    media_downloader.download_audio(url, task_id, format_type, quality)
+
+@register_job('download.playlist', resource_class='io')
+def download_playlist_job(task_id, url, max_downloads):
+    """Background job: download playlist"""
+    media_downloader.download_playlist(url, task_id, max_downloads)
+
+@register_job('download.gallery', resource_class='io')
+def download_gallery_job(task_id, url, site_type):
+    """Background job: download image gallery"""
+    media_downloader.download_gallery(url, task_id, site_type)
 
 @downloader_bp.route('/api/download/video', methods=['POST'])
 def download_video():
@@ -19,18 +52,17 @@ def download_video():
         url = data.get('url')
         format_type = data.get('format', 'mp4')
         quality = data.get('quality', 'best')
+        packaging = data.get('packaging', 'file')
         
         if not url:
             return jsonify({'error': 'URL diperlukan'}), 400
+        if packaging not in ('file', 'hls'):
+            return jsonify({'error': 'Jenis keluaran tidak valid'}), 400
         
         task_id = generate_task_id()
         
-        def download_task():
-            media_downloader.download_video(url, task_id, format_type, quality)
-        
-        thread = threading.Thread(target=download_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'download.video', url=url, format_type=format_type, quality=quality,
+                   packaging=packaging)
         
         return jsonify({'task_id': task_id, 'message': 'Unduhan video dimulai'})
         
@@ -51,12 +83,7 @@ def download_audio():
         
         task_id = generate_task_id()
         
-        def download_task():
-            media_downloader.download_audio(url, task_id, format_type, quality)
-        
-        thread = threading.Thread(target=download_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'download.audio', url=url, format_type=format_type, quality=quality)
         
         return jsonify({'task_id': task_id, 'message': 'Unduhan audio dimulai'})
         
@@ -79,12 +106,7 @@ def download_playlist():
         
         task_id = generate_task_id()
         
-        def download_task():
-            media_downloader.download_playlist(url, task_id, max_downloads)
-        
-        thread = threading.Thread(target=download_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'download.playlist', url=url, max_downloads=max_downloads)
         
         return jsonify({'task_id': task_id, 'message': 'Unduhan playlist dimulai'})
         
@@ -104,12 +126,7 @@ def download_gallery():
         
         task_id = generate_task_id()
         
-        def download_task():
-            media_downloader.download_gallery(url, task_id, site_type)
-        
-        thread = threading.Thread(target=download_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'download.gallery', url=url, site_type=site_type)
         
         return jsonify({'task_id': task_id, 'message': 'Unduhan galeri dimulai'})
         
@@ -140,6 +157,7 @@ def get_video_info():
 def get_download_progress(task_id):
     """Get download progress"""
     try:
+        mark_watched(task_id)
         progress = get_progress(task_id)
         return jsonify(progress)
     except Exception as e:
@@ -149,13 +167,12 @@ def get_download_progress(task_id):
 def download_result(task_id):
     """Download the processed file"""
     try:
-        # Find the output file for this task
-        for filename in os.listdir(OUTPUT_FOLDER):
-            if task_id in filename:
-                file_path = os.path.join(OUTPUT_FOLDER, filename)
-                return send_file(file_path, as_attachment=True)
+        # Look up the output recorded in the task manifest
+        artifact = resolve_download(task_id)
+        if not artifact:
+            return jsonify({'error': 'File tidak ditemukan'}), 404
         
-        return jsonify({'error': 'File tidak ditemukan'}), 404
+        return send_file(artifact['path'], mimetype=artifact['mime'], as_attachment=True)
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
\ No newline at end of file
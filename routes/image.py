@@ -1,234 +1,350 @@
 # Image processing API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
 import os
-from werkzeug.utils import secure_filename
-from utils.image_wrapper import ImageProcessor
-from utils.common import generate_task_id, get_progress, validate_file_content, allowed_file
-from utils.config import OUTPUT_FOLDER, UPLOAD_FOLDER
+import json
+from utils.image_wrapper import (ImageProcessor, RESAMPLE_METHODS, FILTER_TYPES, SAVE_FORMATS, BATCH_OPERATIONS,
+                                 RESPONSIVE_FORMATS)
+from utils.common import generate_task_id, get_progress, update_progress
+from utils.scheduler import register_job, submit_job
+from routes.upload import receive_upload, receive_uploads
+from utils.result_cache import make_cache_key, serve_cached, store
+from utils.config import OUTPUT_FOLDER
 
 image_bp = Blueprint('image_api', __name__)
 
 # Initialize image processor
 image_processor = ImageProcessor(OUTPUT_FOLDER)
 
+# Upper bounds for one batch request
+MAX_BATCH_FILES = 200
+MAX_BATCH_OPERATIONS = 10
+# Upper bound for one responsive image set
+MAX_RESPONSIVE_WIDTHS = 10
+
+@register_job('image.convert', resource_class='cpu')
+def convert_image_job(task_id, input_path, output_format, quality, cache_key=None):
+    """Background job: convert uploaded image"""
+    try:
+        output_path = image_processor.convert_format(input_path, task_id, output_format, quality)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi gambar gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @image_bp.route('/api/image/convert', methods=['POST'])
 def convert_image():
     """Convert image format with quality options"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         output_format = request.form.get('format', 'jpg')
         quality = int(request.form.get('quality', 95))
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'image'):
-            return jsonify({'error': 'Format file gambar tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'output_format': output_format, 'quality': quality}
+        cache_key = make_cache_key(upload, 'image.convert', params, 'pillow')
+        if serve_cached(cache_key, task_id, 'converted_image'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Konversi gambar selesai (dari cache)', 'cached': True})
         
-        def convert_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert image
-                result_path = image_processor.convert_format(input_path, task_id, output_format, quality)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi gambar gagal: {str(e)}')
-        
-        thread = threading.Thread(target=convert_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'image.convert', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi gambar dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('image.resize', resource_class='cpu')
+def resize_image_job(task_id, input_path, width, height, maintain_aspect, resize_method, cache_key=None):
+    """Background job: resize uploaded image"""
+    try:
+        output_path = image_processor.resize_image(input_path, task_id, width, height, maintain_aspect, resize_method)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Resize gambar gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @image_bp.route('/api/image/resize', methods=['POST'])
 def resize_image():
     """Resize image with aspect ratio options"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         width = int(request.form.get('width', 800))
         height = int(request.form.get('height', 600))
         maintain_aspect = request.form.get('maintain_aspect', 'true').lower() == 'true'
         resize_method = request.form.get('method', 'lanczos')
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'image'):
-            return jsonify({'error': 'Format file gambar tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'width': width, 'height': height, 'maintain_aspect': maintain_aspect,
+                  'resize_method': resize_method}
+        cache_key = make_cache_key(upload, 'image.resize', params, 'pillow')
+        if serve_cached(cache_key, task_id, 'resized_image'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Resize gambar selesai (dari cache)', 'cached': True})
         
-        def resize_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Resize image
-                result_path = image_processor.resize_image(input_path, task_id, width, height, maintain_aspect, resize_method)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Resize gambar gagal: {str(e)}')
-        
-        thread = threading.Thread(target=resize_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'image.resize', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Resize gambar dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('image.enhance', resource_class='cpu')
+def enhance_image_job(task_id, input_path, brightness, contrast, saturation, sharpness, cache_key=None):
+    """Background job: enhance uploaded image"""
+    try:
+        output_path = image_processor.enhance_image(input_path, task_id, brightness, contrast, saturation, sharpness)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Peningkatan gambar gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @image_bp.route('/api/image/enhance', methods=['POST'])
 def enhance_image():
     """Enhance image with brightness, contrast, saturation, sharpness"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         brightness = float(request.form.get('brightness', 1.0))
         contrast = float(request.form.get('contrast', 1.0))
         saturation = float(request.form.get('saturation', 1.0))
         sharpness = float(request.form.get('sharpness', 1.0))
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'image'):
-            return jsonify({'error': 'Format file gambar tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'brightness': brightness, 'contrast': contrast, 'saturation': saturation,
+                  'sharpness': sharpness}
+        cache_key = make_cache_key(upload, 'image.enhance', params, 'pillow')
+        if serve_cached(cache_key, task_id, 'enhanced_image'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Peningkatan gambar selesai (dari cache)', 'cached': True})
         
-        def enhance_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Enhance image
-                result_path = image_processor.enhance_image(input_path, task_id, brightness, contrast, saturation, sharpness)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Peningkatan gambar gagal: {str(e)}')
-        
-        thread = threading.Thread(target=enhance_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'image.enhance', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Peningkatan gambar dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('image.filter', resource_class='cpu')
+def apply_filter_job(task_id, input_path, filter_type, cache_key=None):
+    """Background job: apply filter to uploaded image"""
+    try:
+        output_path = image_processor.apply_filters(input_path, task_id, filter_type)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Penerapan filter gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @image_bp.route('/api/image/filter', methods=['POST'])
 def apply_filter():
     """Apply filters to image"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         filter_type = request.form.get('filter', 'none')
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'image'):
-            return jsonify({'error': 'Format file gambar tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'filter_type': filter_type}
+        cache_key = make_cache_key(upload, 'image.filter', params, 'pillow')
+        if serve_cached(cache_key, task_id, 'filtered_image'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Penerapan filter selesai (dari cache)', 'cached': True})
         
-        def filter_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Apply filter
-                result_path = image_processor.apply_filters(input_path, task_id, filter_type)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Penerapan filter gagal: {str(e)}')
-        
-        thread = threading.Thread(target=filter_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'image.filter', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Penerapan filter dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
-@image_bp.route('/api/image/info', methods=['POST'])
-def get_image_info():
-    """Get image file information immediately"""
+def parse_batch_operations(raw):
+    """Validate a JSON list of operation steps; returns (operations, error)"""
+    try:
+        steps = json.loads(raw or '')
+    except ValueError:
+        return None, 'Daftar operasi harus berupa JSON'
+    if not isinstance(steps, list) or not steps:
+        return None, 'Daftar operasi kosong'
+    if len(steps) > MAX_BATCH_OPERATIONS:
+        return None, f'Maksimal {MAX_BATCH_OPERATIONS} operasi per batch'
+    
+    operations = []
+    for step in steps:
+        if not isinstance(step, dict) or step.get('op') not in BATCH_OPERATIONS:
+            return None, f"Operasi tidak dikenal: {step.get('op') if isinstance(step, dict) else step}"
+        try:
+            if step['op'] == 'resize':
+                operation = {'op': 'resize', 'width': int(step.get('width', 800)),
+                             'height': int(step.get('height', 600)),
+                             'maintain_aspect': str(step.get('maintain_aspect', True)).lower() != 'false',
+                             'resize_method': str(step.get('method', 'lanczos'))}
+                if not (0 < operation['width'] <= 10000 and 0 < operation['height'] <= 10000):
+                    return None, 'Ukuran resize tidak valid'
+                if operation['resize_method'] not in RESAMPLE_METHODS:
+                    return None, f"Metode resize tidak didukung: {operation['resize_method']}"
+            elif step['op'] == 'enhance':
+                operation = {'op': 'enhance'}
+                for name in ('brightness', 'contrast', 'saturation', 'sharpness'):
+                    operation[name] = float(step.get(name, 1.0))
+                    if not 0 <= operation[name] <= 5:
+                        return None, f'Nilai {name} harus antara 0 dan 5'
+            else:
+                operation = {'op': 'filter', 'filter_type': str(step.get('filter', 'none'))}
+                if operation['filter_type'] not in FILTER_TYPES:
+                    return None, f"Filter tidak didukung: {operation['filter_type']}"
+        except (TypeError, ValueError):
+            return None, f"Parameter operasi {step['op']} tidak valid"
+        operations.append(operation)
+    return operations, None
+
+@register_job('image.batch', resource_class='cpu')
+def batch_images_job(task_id, file_paths, operations, output_format, quality):
+    """Background job: run an operation chain on every uploaded image"""
+    try:
+        image_processor.batch_process(file_paths, task_id, operations, output_format, quality)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Batch processing gagal: {str(e)}')
+    finally:
+        # Clean up input files
+        for path in file_paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+@image_bp.route('/api/image/batch', methods=['POST'])
+def batch_images():
+    """Resize, enhance and/or filter many images in one task (decoded once each)"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
+        operations, error = parse_batch_operations(request.form.get('operations'))
+        if error:
+            return jsonify({'error': error}), 400
+        output_format = request.form.get('format', 'jpg').lower()
+        if output_format not in SAVE_FORMATS:
+            return jsonify({'error': f'Format tidak didukung: {output_format}'}), 400
+        quality = request.form.get('quality', 95, type=int)
+        if not 1 <= quality <= 100:
+            return jsonify({'error': 'Kualitas harus antara 1 dan 100'}), 400
         
-        file = request.files['file']
+        task_id = generate_task_id()
+        
+        # Multipart 'files' or finalized chunked uploads ('upload_ids'), in order
+        uploads, error = receive_uploads(task_id, 'image', 'Format file gambar tidak valid', MAX_BATCH_FILES)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        submit_job(task_id, 'image.batch', file_paths=[upload['path'] for upload in uploads],
+                   operations=operations, output_format=output_format, quality=quality)
         
-        if not allowed_file(file.filename, 'image'):
-            return jsonify({'error': 'Format file gambar tidak valid'}), 400
+        return jsonify({'task_id': task_id, 'message': f'Batch {len(uploads)} gambar dimulai'})
         
-        # Save file temporarily
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+def parse_responsive_options(form):
+    """Validate comma-separated widths and formats; returns (widths, formats, error)"""
+    try:
+        widths = sorted({int(width) for width in form.get('widths', '320,640,1280').split(',') if width.strip()})
+    except ValueError:
+        return None, None, 'Daftar lebar harus berupa angka, dipisahkan koma'
+    if not widths or len(widths) > MAX_RESPONSIVE_WIDTHS:
+        return None, None, f'Masukkan 1 sampai {MAX_RESPONSIVE_WIDTHS} lebar'
+    if not all(0 < width <= 10000 for width in widths):
+        return None, None, 'Lebar harus antara 1 dan 10000 piksel'
+    
+    formats = []
+    for output_format in form.get('formats', 'webp,jpg').lower().split(','):
+        output_format = 'jpg' if output_format.strip() == 'jpeg' else output_format.strip()
+        if output_format not in RESPONSIVE_FORMATS:
+            return None, None, f'Format tidak didukung: {output_format}'
+        if output_format not in formats:
+            formats.append(output_format)
+    return widths, formats, None
+
+@register_job('image.responsive', resource_class='cpu')
+def responsive_images_job(task_id, input_path, widths, formats, quality):
+    """Background job: srcset variants of an uploaded image"""
+    try:
+        image_processor.responsive_set(input_path, task_id, widths, formats, quality)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Pembuatan varian gambar gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+@image_bp.route('/api/image/responsive', methods=['POST'])
+def responsive_images():
+    """Every width in every format from one upload (srcset variants plus a zip bundle)"""
+    try:
+        widths, formats, error = parse_responsive_options(request.form)
+        if error:
+            return jsonify({'error': error}), 400
+        quality = request.form.get('quality', 85, type=int)
+        if not 1 <= quality <= 100:
+            return jsonify({'error': 'Kualitas harus antara 1 dan 100'}), 400
+        
+        task_id = generate_task_id()
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        
+        submit_job(task_id, 'image.responsive', input_path=upload['path'], widths=widths, formats=formats,
+                   quality=quality)
+        
+        return jsonify({'task_id': task_id, 'message': f'Pembuatan {len(widths) * len(formats)} varian gambar dimulai'})
+        
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@image_bp.route('/api/image/info', methods=['POST'])
+def get_image_info():
+    """Get image file information immediately"""
+    try:
         task_id = generate_task_id()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f'temp_{task_id}_{filename}')
-        file.save(temp_path)
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'image', 'Format file gambar tidak valid', prefix='temp_')
+        if error:
+            return jsonify({'error': error}), 400
+        temp_path = upload['path']
         
         # Get image info
         info = image_processor.get_image_info(temp_path)
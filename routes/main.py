@@ -1,5 +1,6 @@
 # Main route handlers for Universal Toolkit
 from flask import Blueprint, render_template
+from utils.task_manifest import resolve_stream
 from utils.config import INDONESIAN_LABELS
 
 main_bp = Blueprint('main', __name__)
@@ -82,4 +83,10 @@ def document():
 @main_bp.route('/utilities')
 def utilities():
     """Utilities page"""
-    return render_template('utilities.html', labels=INDONESIAN_LABELS)
\ No newline at end of file
+    return render_template('utilities.html', labels=INDONESIAN_LABELS)
+
+@main_bp.route('/preview/<task_id>')
+def preview(task_id):
+    """In-browser preview of an HLS-packaged result"""
+    stream_url = f'/stream/{task_id}/master.m3u8' if resolve_stream(task_id) else None
+    return render_template('preview.html', task_id=task_id, stream_url=stream_url, labels=INDONESIAN_LABELS)
@@ -0,0 +1,245 @@
+# Chunked upload API routes for Universal Toolkit
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import os
+import hashlib
+from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge
+from utils.upload_sessions import (UploadError, create_session, get_session, write_chunk,
+                                   finalize_session, claim_upload, abort_session, public_session)
+from utils.common import validate_file_content, allowed_file, sniff_file_types, generate_task_id
+from utils.expiry_index import track
+from utils.stream_transcode import StreamTranscode, StreamTranscodeError
+from utils.probe_cache import remember_content_hash
+from utils.config import UPLOAD_FOLDER, STREAM_TRANSCODE_MAX_BYTES
+
+upload_bp = Blueprint('upload_api', __name__)
+
+# Uploads whose ffprobe results are worth reusing by content hash
+MEDIA_TYPES = ('video', 'audio')
+# Leading bytes checked before a body is piped into a transcode
+SNIFF_BYTES = 4096
+
+def upload_error_response(e: UploadError):
+    body = {'error': str(e)}
+    if e.received is not None:
+        body['received'] = e.received
+    return jsonify(body), e.status_code
+
+def receive_upload(task_id, file_type=None, invalid_message='Format file tidak valid', prefix=''):
+    """Save the upload of the current request for a task
+
+    Accepts either a multipart 'file' field or the 'upload_id' of a finalized
+    chunked upload. Returns (upload, error) where upload has 'path',
+    'filename' and the content 'sha256'.
+    """
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        return _claim_chunked(upload_id, task_id, file_type, prefix)
+
+    if 'file' not in request.files:
+        return None, 'Tidak ada file yang diunggah'
+
+    return _save_multipart(request.files['file'], task_id, file_type, invalid_message, prefix)
+
+def receive_uploads(task_id, file_type=None, invalid_message='Format file tidak valid', max_files=None):
+    """Save all uploads of the current request for a task, in order
+
+    Accepts multipart 'files' fields or an ordered list of 'upload_ids' of
+    finalized chunked uploads. Returns (uploads, error); on error no saved
+    file is kept.
+    """
+    upload_ids = request.form.getlist('upload_ids')
+    files = [file for file in request.files.getlist('files') if file and file.filename]
+    items = upload_ids or files
+    if not items:
+        return None, 'Tidak ada file yang diunggah'
+    if max_files and len(items) > max_files:
+        return None, f'Maksimal {max_files} file per permintaan'
+
+    uploads = []
+    for index, item in enumerate(items):
+        # Index prefix keeps equal filenames apart
+        prefix = f'{index:02d}_'
+        if upload_ids:
+            upload, error = _claim_chunked(item, task_id, file_type, prefix)
+        else:
+            upload, error = _save_multipart(item, task_id, file_type, invalid_message, prefix)
+        if error:
+            for saved in uploads:
+                if os.path.exists(saved['path']):
+                    os.remove(saved['path'])
+            return None, error
+        uploads.append(upload)
+    return uploads, None
+
+def _claim_chunked(upload_id, task_id, file_type, prefix):
+    try:
+        input_path, session = claim_upload(upload_id, task_id, file_type, prefix)
+    except UploadError as e:
+        return None, str(e)
+    track(input_path, task_id, 'upload', session['total_size'])
+    if file_type in MEDIA_TYPES:
+        remember_content_hash(input_path, session['sha256'])
+    return {'path': input_path, 'filename': session['filename'], 'sha256': session['sha256']}, None
+
+def _save_multipart(file, task_id, file_type, invalid_message, prefix):
+    # Validate file
+    is_valid, message = validate_file_content(file)
+    if not is_valid:
+        return None, message
+
+    if file_type and not allowed_file(file.filename, file_type):
+        return None, invalid_message
+
+    filename = secure_filename(file.filename)
+    input_path = os.path.join(UPLOAD_FOLDER, f'{prefix}{task_id}_{filename}')
+    sha256 = save_with_hash(file, input_path)
+    track(input_path, task_id, 'upload', os.path.getsize(input_path))
+    if file_type in MEDIA_TYPES:
+        remember_content_hash(input_path, sha256)
+    return {'path': input_path, 'filename': filename, 'sha256': sha256}, None
+
+def peek_content_hash():
+    """SHA-256 of the current request's upload without saving or claiming it"""
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        session = get_session(upload_id)
+        return session['sha256'] if session and session['status'] == 'complete' else None
+
+    file = request.files.get('file')
+    if not file:
+        return None
+    hasher = hashlib.sha256()
+    file.stream.seek(0)
+    while block := file.stream.read(1024 * 1024):
+        hasher.update(block)
+    file.stream.seek(0)
+    return hasher.hexdigest()
+
+def discard_upload():
+    """Drop the current request's chunked upload when it is answered without the file"""
+    upload_id = request.form.get('upload_id')
+    if upload_id:
+        abort_session(upload_id)
+
+def receive_stream_source(file_type, invalid_message='Format file tidak valid'):
+    """Input of a pipe-through transcode, without saving it to UPLOAD_FOLDER
+
+    Accepts the raw request body (streamed as it arrives), a multipart 'file'
+    or the 'upload_id' of a finalized chunked upload. Returns (source, error)
+    where source has 'stream' and 'prefix' (bytes already read for content
+    sniffing) or, for a chunked upload, 'path'.
+    """
+    upload_id = request.values.get('upload_id')
+    if upload_id:
+        upload, error = _claim_chunked(upload_id, f'stream_{generate_task_id()}', file_type, '')
+        return ({'path': upload['path']} if upload else None), error
+
+    if request.mimetype in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        file = request.files.get('file')
+        if not file or not file.filename:
+            return None, 'Tidak ada file yang diunggah'
+        if not allowed_file(file.filename, file_type):
+            return None, invalid_message
+        stream = file.stream
+    else:
+        stream = request.stream
+
+    # Enough leading bytes to recognize the container
+    header = b''
+    while len(header) < SNIFF_BYTES and (block := stream.read(SNIFF_BYTES - len(header))):
+        header += block
+    if not header:
+        return None, 'Tidak ada file yang diunggah'
+    if file_type not in sniff_file_types(header):
+        return None, invalid_message
+    return {'stream': stream, 'prefix': header}, None
+
+def allow_stream_body():
+    """Raise the size limit to STREAM_TRANSCODE_MAX_BYTES for a raw body piped into a transcode
+
+    Must run before the request body or form is touched. Multipart bodies
+    are parsed (and spooled) by Werkzeug first, so they keep MAX_CONTENT_LENGTH.
+    """
+    if request.mimetype not in ('multipart/form-data', 'application/x-www-form-urlencoded'):
+        request.max_content_length = STREAM_TRANSCODE_MAX_BYTES
+
+def stream_too_large_response(e: RequestEntityTooLarge):
+    limit = request.max_content_length // (1024 * 1024)
+    return jsonify({'error': f'File terlalu besar (maksimal {limit}MB)'}), 413
+
+def stream_transcode_response(args, source, mimetype, filename):
+    """Start a pipe-through transcode and stream its output as a chunked download"""
+    transcode = StreamTranscode(args, source.get('stream'), source.get('prefix', b''), source.get('path'))
+    try:
+        transcode.start()
+    except StreamTranscodeError as e:
+        return jsonify({'error': str(e)}), e.status_code
+    return Response(stream_with_context(iter(transcode)), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'Cache-Control': 'no-store',
+        'X-Accel-Buffering': 'no',  # Disable proxy buffering (nginx)
+    })
+
+def save_with_hash(file, path):
+    """Save an uploaded file while computing its SHA-256 in the same pass"""
+    hasher = hashlib.sha256()
+    file.stream.seek(0)
+    with open(path, 'wb') as out:
+        while block := file.stream.read(1024 * 1024):
+            hasher.update(block)
+            out.write(block)
+    return hasher.hexdigest()
+
+@upload_bp.route('/api/upload/init', methods=['POST'])
+def init_upload():
+    """Start a resumable chunked upload"""
+    try:
+        data = request.get_json(silent=True) or {}
+        try:
+            size = int(data.get('size'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Ukuran file tidak valid'}), 400
+        session = create_session(data.get('filename'), size, data.get('file_type'))
+        return jsonify(session)
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@upload_bp.route('/api/upload/<upload_id>', methods=['GET'])
+def upload_status(upload_id):
+    """Get bytes received so far (used to resume)"""
+    session = get_session(upload_id)
+    if not session:
+        return jsonify({'error': 'Sesi unggahan tidak ditemukan'}), 404
+    return jsonify(public_session(session))
+
+@upload_bp.route('/api/upload/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """Receive one chunk as the raw request body (?offset=N)"""
+    try:
+        offset = request.args.get('offset', type=int)
+        if offset is None:
+            return jsonify({'error': 'Parameter offset diperlukan'}), 400
+        return jsonify(write_chunk(upload_id, offset, request.stream, request.content_length))
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@upload_bp.route('/api/upload/<upload_id>/finalize', methods=['POST'])
+def finalize_upload(upload_id):
+    """Verify a completed upload; its upload_id can then be sent to any processing endpoint"""
+    try:
+        return jsonify(finalize_session(upload_id))
+    except UploadError as e:
+        return upload_error_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@upload_bp.route('/api/upload/<upload_id>', methods=['DELETE'])
+def cancel_upload(upload_id):
+    """Abort an upload and delete its partial data"""
+    abort_session(upload_id)
+    return jsonify({'success': True})
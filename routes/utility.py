@@ -1,10 +1,11 @@
 # Utility API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
 import os
 from werkzeug.utils import secure_filename
 from utils.utility_wrapper import UtilityProcessor
-from utils.common import generate_task_id, get_progress, validate_file_content
+from utils.common import generate_task_id, get_progress, update_progress, validate_file_content
+from utils.scheduler import register_job, submit_job
+from utils.expiry_index import track
 from utils.config import OUTPUT_FOLDER, UPLOAD_FOLDER
 
 utility_bp = Blueprint('utility_api', __name__)
@@ -12,6 +13,11 @@ utility_bp = Blueprint('utility_api', __name__)
 # Initialize utility processor
 utility_processor = UtilityProcessor(OUTPUT_FOLDER)
 
+@register_job('qr.generate', resource_class='light')
+def generate_qr_code_job(task_id, text, error_correction, box_size, border, fill_color, back_color):
+    """Background job: generate QR code image"""
+    utility_processor.generate_qr_code(text, task_id, error_correction, box_size, border, fill_color, back_color)
+
 @utility_bp.route('/api/qr/generate', methods=['POST'])
 def generate_qr_code():
     """Generate QR code with customization options"""
@@ -29,18 +35,27 @@ def generate_qr_code():
         
         task_id = generate_task_id()
         
-        def generate_task():
-            utility_processor.generate_qr_code(text, task_id, error_correction, box_size, border, fill_color, back_color)
-        
-        thread = threading.Thread(target=generate_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'qr.generate', text=text, error_correction=error_correction, box_size=box_size,
+                   border=border, fill_color=fill_color, back_color=back_color)
         
         return jsonify({'task_id': task_id, 'message': 'Pembuatan QR code dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('archive.create', resource_class='light')
+def create_archive_job(task_id, file_paths, archive_type, archive_name):
+    """Background job: create archive from uploaded files"""
+    try:
+        utility_processor.create_archive(file_paths, task_id, archive_type, archive_name)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Pembuatan arsip gagal: {str(e)}')
+    finally:
+        # Clean up uploaded files
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
 @utility_bp.route('/api/archive/create', methods=['POST'])
 def create_archive():
     """Create archive from uploaded files"""
@@ -63,34 +78,32 @@ def create_archive():
                     filename = secure_filename(file.filename)
                     file_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
                     file.save(file_path)
+                    track(file_path, task_id, 'upload', os.path.getsize(file_path))
                     file_paths.append(file_path)
         
         if not file_paths:
             return jsonify({'error': 'Tidak ada file valid yang ditemukan'}), 400
         
-        def archive_task():
-            try:
-                # Create archive
-                result_path = utility_processor.create_archive(file_paths, task_id, archive_type, archive_name)
-                
-                # Clean up uploaded files
-                for file_path in file_paths:
-                    if os.path.exists(file_path):
-                        os.remove(file_path)
-                        
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Pembuatan arsip gagal: {str(e)}')
-        
-        thread = threading.Thread(target=archive_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'archive.create', file_paths=file_paths, archive_type=archive_type,
+                   archive_name=archive_name)
         
         return jsonify({'task_id': task_id, 'message': 'Pembuatan arsip dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('archive.extract', resource_class='light')
+def extract_archive_job(task_id, input_path):
+    """Background job: extract uploaded archive"""
+    try:
+        utility_processor.extract_archive(input_path, task_id)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Ekstraksi arsip gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @utility_bp.route('/api/archive/extract', methods=['POST'])
 def extract_archive():
     """Extract archive file"""
@@ -112,33 +125,31 @@ def extract_archive():
         
         task_id = generate_task_id()
         
-        def extract_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Extract archive
-                result_path = utility_processor.extract_archive(input_path, task_id)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Ekstraksi arsip gagal: {str(e)}')
-        
-        thread = threading.Thread(target=extract_task)
-        thread.daemon = True
-        thread.start()
+        # Save uploaded file now; the request stream is closed once we respond
+        filename = secure_filename(file.filename)
+        input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
+        file.save(input_path)
+        track(input_path, task_id, 'upload', os.path.getsize(input_path))
+        
+        submit_job(task_id, 'archive.extract', input_path=input_path)
         
         return jsonify({'task_id': task_id, 'message': 'Ekstraksi arsip dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('hash.generate', resource_class='light')
+def generate_file_hash_job(task_id, input_path, hash_type):
+    """Background job: hash uploaded file"""
+    try:
+        utility_processor.generate_file_hash(input_path, task_id, hash_type)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Perhitungan hash gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @utility_bp.route('/api/hash/generate', methods=['POST'])
 def generate_file_hash():
     """Generate file hash (MD5, SHA1, SHA256)"""
@@ -156,33 +167,31 @@ def generate_file_hash():
         
         task_id = generate_task_id()
         
-        def hash_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Generate hash
-                result = utility_processor.generate_file_hash(input_path, task_id, hash_type)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Perhitungan hash gagal: {str(e)}')
-        
-        thread = threading.Thread(target=hash_task)
-        thread.daemon = True
-        thread.start()
+        # Save uploaded file now; the request stream is closed once we respond
+        filename = secure_filename(file.filename)
+        input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
+        file.save(input_path)
+        track(input_path, task_id, 'upload', os.path.getsize(input_path))
+        
+        submit_job(task_id, 'hash.generate', input_path=input_path, hash_type=hash_type)
         
         return jsonify({'task_id': task_id, 'message': 'Perhitungan hash dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@register_job('encoding.convert', resource_class='light')
+def convert_text_encoding_job(task_id, input_path, target_encoding):
+    """Background job: convert uploaded text file encoding"""
+    try:
+        utility_processor.convert_text_encoding(input_path, task_id, target_encoding)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi encoding gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @utility_bp.route('/api/encoding/convert', methods=['POST'])
 def convert_text_encoding():
     """Convert text file encoding"""
@@ -204,27 +213,13 @@ def convert_text_encoding():
         
         task_id = generate_task_id()
         
-        def encoding_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert encoding
-                result_path = utility_processor.convert_text_encoding(input_path, task_id, target_encoding)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi encoding gagal: {str(e)}')
-        
-        thread = threading.Thread(target=encoding_task)
-        thread.daemon = True
-        thread.start()
+        # Save uploaded file now; the request stream is closed once we respond
+        filename = secure_filename(file.filename)
+        input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
+        file.save(input_path)
+        track(input_path, task_id, 'upload', os.path.getsize(input_path))
+        
+        submit_job(task_id, 'encoding.convert', input_path=input_path, target_encoding=target_encoding)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi encoding dimulai'})
         
@@ -1,186 +1,474 @@
 # Video processing API routes for Universal Toolkit
 from flask import Blueprint, request, jsonify, send_file
-import threading
+from werkzeug.exceptions import RequestEntityTooLarge
 import os
-from werkzeug.utils import secure_filename
-from utils.ffmpeg_wrapper import FFmpegProcessor
-from utils.common import generate_task_id, get_progress, validate_file_content, allowed_file
-from utils.config import OUTPUT_FOLDER, UPLOAD_FOLDER
+import json
+from utils.ffmpeg_wrapper import (FFmpegProcessor, VIDEO_TARGETS, AUDIO_TARGETS, RESOLUTIONS, STREAMABLE_FORMATS,
+                                  THUMBNAIL_WIDTH, THUMBNAIL_COLUMNS, THUMBNAIL_MAX_COUNT, parse_time,
+                                  thumbnail_urls)
+from utils.common import generate_task_id, get_progress, update_progress
+from utils.scheduler import register_job, submit_job
+from routes.upload import (receive_upload, receive_uploads, peek_content_hash, discard_upload,
+                           receive_stream_source, stream_transcode_response, allow_stream_body,
+                           stream_too_large_response)
+from utils.resource_governor import compute_budget
+from utils.result_cache import make_cache_key, serve_cached, store
+from utils.task_manifest import get_outputs
+from utils.upload_sessions import hash_file
+from utils.config import OUTPUT_FOLDER
 
 video_bp = Blueprint('video_api', __name__)
 
 # Initialize video processor
 video_processor = FFmpegProcessor(OUTPUT_FOLDER)
 
+# Upper bound on outputs requested from one upload
+MAX_RENDITIONS = 8
+MAX_CUT_RANGES = 20
+MAX_MERGE_FILES = 20
+CUT_MODES = ('copy', 'smart')
+PACKAGINGS = ('file', 'hls')
+
+@register_job('video.convert', resource_class='cpu')
+def convert_video_job(task_id, input_path, output_format, resolution, crf, cache_key=None, packaging='file'):
+    """Background job: convert uploaded video"""
+    try:
+        output_path = video_processor.convert_video(input_path, task_id, output_format, resolution, crf,
+                                                    packaging)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Konversi video gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @video_bp.route('/api/video/convert', methods=['POST'])
 def convert_video():
     """Convert video format with compression options"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         output_format = request.form.get('format', 'mp4')
         resolution = request.form.get('resolution', None)
-        crf = int(request.form.get('crf', 23))
+        # No CRF given: streams that already match the target are copied instead of re-encoded
+        crf = request.form.get('crf', type=int)
+        # 'hls' writes fMP4 segments and playlists for in-browser preview instead of one file
+        packaging = request.form.get('packaging', 'file')
+        if packaging not in PACKAGINGS:
+            return jsonify({'error': 'Jenis keluaran tidak valid'}), 400
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'video'):
-            return jsonify({'error': 'Format file video tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        if packaging == 'hls':
+            submit_job(task_id, 'video.convert', input_path=input_path, output_format='mp4',
+                       resolution=resolution, crf=crf, packaging=packaging)
+            return jsonify({'task_id': task_id, 'message': 'Pembuatan streaming dimulai'})
+        
+        # Reuse the result of an identical earlier request
+        params = {'output_format': output_format, 'resolution': resolution, 'crf': crf}
+        cache_key = make_cache_key(upload, 'video.convert', params, 'ffmpeg')
+        if serve_cached(cache_key, task_id, 'video'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Konversi video selesai (dari cache)', 'cached': True})
         
-        def convert_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Convert video
-                result_path = video_processor.convert_video(input_path, task_id, output_format, resolution, crf)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Konversi video gagal: {str(e)}')
-        
-        thread = threading.Thread(target=convert_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'video.convert', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Konversi video dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+@video_bp.route('/api/video/stream', methods=['POST'])
+def stream_video():
+    """Convert video while it uploads and stream it back as fragmented MP4 or WebM (no files on disk)"""
+    try:
+        allow_stream_body()
+        # Options come in the query string when the body is the raw file
+        options = request.values
+        output_format = options.get('format', 'mp4')
+        resolution = options.get('resolution') or None
+        muxer = STREAMABLE_FORMATS.get(output_format)
+        if not muxer or muxer[2] != 'video':
+            return jsonify({'error': 'Format ini tidak mendukung streaming'}), 400
+        if resolution is not None and resolution not in RESOLUTIONS:
+            return jsonify({'error': f'Resolusi tidak didukung: {resolution}'}), 400
+        try:
+            crf = int(options['crf']) if options.get('crf') else None
+        except ValueError:
+            return jsonify({'error': 'Nilai CRF tidak valid'}), 400
+        
+        source, error = receive_stream_source('video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        
+        args = video_processor.streaming_command(source.get('path'), output_format, resolution=resolution,
+                                                 crf=crf, threads=compute_budget('cpu'))
+        return stream_transcode_response(args, source, muxer[1], f'video.{output_format}')
+        
+    except RequestEntityTooLarge as e:
+        return stream_too_large_response(e)
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@register_job('video.extract_audio', resource_class='cpu')
+def extract_audio_job(task_id, input_path, output_format, cache_key=None):
+    """Background job: extract audio track from uploaded video"""
+    try:
+        output_path = video_processor.extract_audio_from_video(input_path, task_id, output_format)
+        store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Ekstraksi audio gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @video_bp.route('/api/video/extract-audio', methods=['POST'])
 def extract_audio():
     """Extract audio from video file"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         output_format = request.form.get('format', 'mp3')
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'video'):
-            return jsonify({'error': 'Format file video tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        # Reuse the result of an identical earlier request
+        params = {'output_format': output_format}
+        cache_key = make_cache_key(upload, 'video.extract_audio', params, 'ffmpeg')
+        if serve_cached(cache_key, task_id, 'extracted_audio'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Ekstraksi audio selesai (dari cache)', 'cached': True})
         
-        def extract_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Extract audio
-                result_path = video_processor.extract_audio_from_video(input_path, task_id, output_format)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Ekstraksi audio gagal: {str(e)}')
-        
-        thread = threading.Thread(target=extract_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'video.extract_audio', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Ekstraksi audio dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
+def parse_cut_ranges(raw):
+    """Validate a JSON list of {start, duration} (or {start, end}) ranges; returns (ranges, error)"""
+    if not raw:
+        return None, None
+    try:
+        specs = json.loads(raw)
+    except ValueError:
+        return None, 'Daftar rentang harus berupa JSON'
+    if not isinstance(specs, list) or not specs:
+        return None, 'Daftar rentang kosong'
+    if len(specs) > MAX_CUT_RANGES:
+        return None, f'Maksimal {MAX_CUT_RANGES} rentang per permintaan'
+    
+    ranges = []
+    for spec in specs:
+        if not isinstance(spec, dict) or 'start' not in spec:
+            return None, 'Setiap rentang memerlukan start'
+        start = str(spec['start'])
+        if 'end' in spec:
+            start_seconds, end_seconds = parse_time(start), parse_time(str(spec['end']))
+            if start_seconds is None or end_seconds is None or end_seconds <= start_seconds:
+                return None, f'Rentang tidak valid: {start} - {spec["end"]}'
+            duration = f'{end_seconds - start_seconds:.3f}'
+        else:
+            duration = str(spec.get('duration', '00:01:00'))
+            if parse_time(start) is None or not parse_time(duration):
+                return None, f'Rentang tidak valid: {start} + {duration}'
+        ranges.append([start, duration])
+    return ranges, None
+
+@register_job('video.split', resource_class='cpu')
+def split_video_job(task_id, input_path, start_time=None, duration=None, mode='copy', ranges=None,
+                    cache_key=None):
+    """Background job: split/trim uploaded video"""
+    try:
+        if ranges:
+            # Several clips in one task; downloaded together as a bundle
+            video_processor.split_video_ranges(input_path, task_id, ranges, mode)
+        else:
+            output_path = video_processor.split_video(input_path, task_id, start_time, duration, mode)
+            store(cache_key, output_path)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Pemotongan video gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
 @video_bp.route('/api/video/split', methods=['POST'])
 def split_video():
-    """Split/trim video by time"""
+    """Split/trim video by time
+
+    mode=smart cuts exactly (re-encoding only the GOPs at the cut points);
+    ranges takes a JSON list of cuts, each producing its own clip.
+    """
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
-        
-        file = request.files['file']
         start_time = request.form.get('start_time', '00:00:00')
         duration = request.form.get('duration', '00:01:00')
+        mode = request.form.get('mode', 'copy')
+        if mode not in CUT_MODES:
+            return jsonify({'error': 'Mode pemotongan tidak valid'}), 400
+        ranges, error = parse_cut_ranges(request.form.get('ranges'))
+        if error:
+            return jsonify({'error': error}), 400
+        if ranges and len(ranges) == 1:
+            (start_time, duration), ranges = ranges[0], None
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        task_id = generate_task_id()
         
-        if not allowed_file(file.filename, 'video'):
-            return jsonify({'error': 'Format file video tidak valid'}), 400
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
         
-        task_id = generate_task_id()
+        if ranges:
+            submit_job(task_id, 'video.split', input_path=input_path, mode=mode, ranges=ranges)
+            return jsonify({'task_id': task_id, 'message': f'Pemotongan {len(ranges)} rentang dimulai'})
+        
+        # Reuse the result of an identical earlier request
+        params = {'start_time': start_time, 'duration': duration, 'mode': mode}
+        cache_key = make_cache_key(upload, 'video.split', params, 'ffmpeg')
+        if serve_cached(cache_key, task_id, 'split_video'):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Pemotongan video selesai (dari cache)', 'cached': True})
         
-        def split_task():
-            try:
-                # Save uploaded file
-                filename = secure_filename(file.filename)
-                input_path = os.path.join(UPLOAD_FOLDER, f'{task_id}_{filename}')
-                file.save(input_path)
-                
-                # Split video
-                result_path = video_processor.split_video(input_path, task_id, start_time, duration)
-                
-                # Clean up input file
-                if os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                from utils.common import update_progress
-                update_progress(task_id, 0, 'error', f'Pemotongan video gagal: {str(e)}')
-        
-        thread = threading.Thread(target=split_task)
-        thread.daemon = True
-        thread.start()
+        submit_job(task_id, 'video.split', input_path=input_path, cache_key=cache_key, **params)
         
         return jsonify({'task_id': task_id, 'message': 'Pemotongan video dimulai'})
         
     except Exception as e:
         return jsonify({'error': f'Error: {str(e)}'}), 500
 
-@video_bp.route('/api/video/info', methods=['POST'])
-def get_video_info():
-    """Get video file information"""
+@register_job('video.merge', resource_class='cpu')
+def merge_videos_job(task_id, file_paths):
+    """Background job: merge uploaded videos in order"""
+    try:
+        video_processor.merge_videos(file_paths, task_id)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Penggabungan video gagal: {str(e)}')
+    finally:
+        # Clean up input files
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+@video_bp.route('/api/video/merge', methods=['POST'])
+def merge_videos():
+    """Merge several videos (multipart 'files' or ordered 'upload_ids') into one"""
+    try:
+        task_id = generate_task_id()
+        
+        uploads, error = receive_uploads(task_id, 'video', 'Format file video tidak valid', MAX_MERGE_FILES)
+        if error:
+            return jsonify({'error': error}), 400
+        if len(uploads) < 2:
+            os.remove(uploads[0]['path'])
+            return jsonify({'error': 'Minimal 2 video untuk digabungkan'}), 400
+        
+        submit_job(task_id, 'video.merge', file_paths=[upload['path'] for upload in uploads])
+        
+        return jsonify({'task_id': task_id, 'message': f'Penggabungan {len(uploads)} video dimulai'})
+        
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+def parse_renditions(raw):
+    """Validate a JSON list of rendition specs; returns (renditions, error)"""
+    try:
+        specs = json.loads(raw or '')
+    except ValueError:
+        return None, 'Daftar rendisi harus berupa JSON'
+    if not isinstance(specs, list) or not specs:
+        return None, 'Daftar rendisi kosong'
+    if len(specs) > MAX_RENDITIONS:
+        return None, f'Maksimal {MAX_RENDITIONS} rendisi per permintaan'
+    
+    renditions, names = [], set()
+    for spec in specs:
+        if not isinstance(spec, dict):
+            return None, 'Setiap rendisi harus berupa objek'
+        output_format = str(spec.get('format', 'mp4')).lower()
+        audio_only = output_format in AUDIO_TARGETS and output_format not in VIDEO_TARGETS
+        kind = spec.get('type') or ('audio' if audio_only else 'video')
+        if kind == 'video':
+            resolution = spec.get('resolution')
+            crf = spec.get('crf')
+            if output_format not in VIDEO_TARGETS:
+                return None, f'Format video tidak didukung: {output_format}'
+            if resolution is not None and resolution not in RESOLUTIONS:
+                return None, f'Resolusi tidak didukung: {resolution}'
+            if crf is not None and (not isinstance(crf, int) or not 0 <= crf <= 63):
+                return None, 'Nilai CRF tidak valid'
+            rendition = {'type': 'video', 'format': output_format, 'resolution': resolution, 'crf': crf}
+            name = resolution or 'source'
+        elif kind == 'audio':
+            quality = str(spec.get('quality', '192'))
+            if output_format not in AUDIO_TARGETS:
+                return None, f'Format audio tidak didukung: {output_format}'
+            if not quality.isdigit():
+                return None, 'Kualitas audio tidak valid'
+            rendition = {'type': 'audio', 'format': output_format, 'quality': quality}
+            name = 'audio'
+        else:
+            return None, f'Jenis rendisi tidak dikenal: {kind}'
+        
+        # Unique output names within the task
+        base, suffix = name, 2
+        while name in names:
+            name = f'{base}_{suffix}'
+            suffix += 1
+        names.add(name)
+        rendition['name'] = name
+        renditions.append(rendition)
+    return renditions, None
+
+@register_job('video.renditions', resource_class='cpu')
+def renditions_job(task_id, input_path, renditions):
+    """Background job: produce all requested renditions from one decode"""
+    try:
+        video_processor.convert_renditions(input_path, task_id, renditions)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Pembuatan rendisi gagal: {str(e)}')
+    finally:
+        # Clean up input file
+        if os.path.exists(input_path):
+            os.remove(input_path)
+
+@video_bp.route('/api/video/renditions', methods=['POST'])
+def create_renditions():
+    """Create several renditions (e.g. 1080p, 720p, 480p and MP3) of one upload"""
     try:
-        if 'file' not in request.files:
-            return jsonify({'error': 'Tidak ada file yang diunggah'}), 400
+        renditions, error = parse_renditions(request.form.get('renditions'))
+        if error:
+            return jsonify({'error': error}), 400
+        
+        task_id = generate_task_id()
         
-        file = request.files['file']
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Validate file
-        is_valid, message = validate_file_content(file)
-        if not is_valid:
-            return jsonify({'error': message}), 400
+        submit_job(task_id, 'video.renditions', input_path=upload['path'], renditions=renditions)
         
-        if not allowed_file(file.filename, 'video'):
-            return jsonify({'error': 'Format file video tidak valid'}), 400
+        return jsonify({'task_id': task_id, 'message': f'Pembuatan {len(renditions)} rendisi dimulai',
+                        'renditions': [r['name'] for r in renditions]})
+        
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+def parse_thumbnail_options(options):
+    """Validate sprite tile width, sample count and columns; returns (params, error)"""
+    try:
+        width = int(options.get('width') or THUMBNAIL_WIDTH)
+        count = int(options['count']) if options.get('count') else None
+        columns = int(options.get('columns') or THUMBNAIL_COLUMNS)
+    except (TypeError, ValueError):
+        return None, 'Parameter cuplikan harus berupa angka'
+    if not 64 <= width <= 480:
+        return None, 'Lebar cuplikan harus antara 64 dan 480 piksel'
+    if count is not None and not 1 <= count <= THUMBNAIL_MAX_COUNT:
+        return None, f'Jumlah cuplikan harus antara 1 dan {THUMBNAIL_MAX_COUNT}'
+    if not 1 <= columns <= 20:
+        return None, 'Jumlah kolom harus antara 1 dan 20'
+    return {'width': width, 'count': count, 'columns': columns}, None
+
+def _source_video(source_task_id):
+    """Video output of an earlier task (e.g. a download), or None"""
+    for artifact in reversed(get_outputs(source_task_id)):
+        if (artifact['mime'] or '').startswith('video/') and os.path.isfile(artifact['path']):
+            return artifact['path']
+    return None
+
+@register_job('video.thumbnails', resource_class='cpu')
+def thumbnails_job(task_id, width, count, columns, input_path=None, source_path=None, cache_key=None):
+    """Background job: sprite sheet, WebVTT index and poster for a video"""
+    try:
+        if source_path:
+            # Outputs of other tasks are hashed here, off the request path
+            upload = {'sha256': hash_file(source_path), 'filename': source_path}
+            params = {'width': width, 'count': count, 'columns': columns}
+            cache_key = make_cache_key(upload, 'video.thumbnails', params, 'ffmpeg')
+            if serve_cached(cache_key, task_id, 'thumbnails', kind='stream', **thumbnail_urls(task_id)):
+                return
+        output_dir = video_processor.generate_thumbnails(input_path or source_path, task_id, width, count, columns)
+        store(cache_key, output_dir)
+    except Exception as e:
+        update_progress(task_id, 0, 'error', f'Pembuatan cuplikan gagal: {str(e)}')
+    finally:
+        # Only uploads are consumed; a source task keeps its output
+        if input_path and os.path.exists(input_path):
+            os.remove(input_path)
+
+@video_bp.route('/api/video/thumbnails', methods=['POST'])
+def create_thumbnails():
+    """Thumbnail sprite sheet with a WebVTT index for an upload or an earlier task's video"""
+    try:
+        options = request.get_json(silent=True) or request.form
+        params, error = parse_thumbnail_options(options)
+        if error:
+            return jsonify({'error': error}), 400
         
-        # Save file temporarily
         task_id = generate_task_id()
-        filename = secure_filename(file.filename)
-        temp_path = os.path.join(UPLOAD_FOLDER, f'temp_{task_id}_{filename}')
-        file.save(temp_path)
+        
+        source_task_id = options.get('source_task_id')
+        if source_task_id:
+            source_path = _source_video(str(source_task_id))
+            if not source_path:
+                return jsonify({'error': 'Video dari tugas tersebut tidak ditemukan'}), 404
+            submit_job(task_id, 'video.thumbnails', source_path=source_path, **params)
+            return jsonify({'task_id': task_id, 'message': 'Pembuatan cuplikan dimulai'})
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid')
+        if error:
+            return jsonify({'error': error}), 400
+        input_path = upload['path']
+        
+        # Same content and options: reuse the earlier sprite package
+        cache_key = make_cache_key(upload, 'video.thumbnails', params, 'ffmpeg')
+        if serve_cached(cache_key, task_id, 'thumbnails', kind='stream', **thumbnail_urls(task_id)):
+            os.remove(input_path)
+            return jsonify({'task_id': task_id, 'message': 'Cuplikan selesai (dari cache)', 'cached': True})
+        
+        submit_job(task_id, 'video.thumbnails', input_path=input_path, cache_key=cache_key, **params)
+        
+        return jsonify({'task_id': task_id, 'message': 'Pembuatan cuplikan dimulai'})
+        
+    except Exception as e:
+        return jsonify({'error': f'Error: {str(e)}'}), 500
+
+@video_bp.route('/api/video/info', methods=['POST'])
+def get_video_info():
+    """Get video file information"""
+    try:
+        # Content probed before needs neither the file on disk nor ffprobe
+        content_hash = peek_content_hash()
+        info = video_processor.get_cached_media_info(content_hash)
+        if info:
+            discard_upload()
+            return jsonify({'success': True, 'info': info})
+        
+        task_id = generate_task_id()
+        
+        # Save the multipart file or claim a finalized chunked upload
+        upload, error = receive_upload(task_id, 'video', 'Format file video tidak valid', prefix='temp_')
+        if error:
+            return jsonify({'error': error}), 400
+        temp_path = upload['path']
         
         # Get video info
-        info = video_processor.get_media_info(temp_path)
+        info = video_processor.get_media_info(temp_path, upload['sha256'])
         
         # Clean up temp file
         if os.path.exists(temp_path):
@@ -0,0 +1,92 @@
+"""Benchmark and quality check of the reduced-scale JPEG resize path
+
+Compares resize_op (Image.draft + reducing_gap) with a full decode followed
+by the same filter, on a synthetic photo-like JPEG, and fails when the PSNR
+between the two drops below the floor.
+
+    python scripts/bench_resize.py [--size 6000x4000] [--min-psnr 40]
+"""
+import io
+import os
+import sys
+import math
+import time
+import argparse
+from PIL import Image, ImageChops, ImageDraw, ImageFilter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.image_wrapper import resize_op, fit_size, RESAMPLE_METHODS  # noqa: E402
+
+TARGET_WIDTHS = (320, 640, 1280)
+METHODS = ('lanczos', 'bicubic', 'bilinear')
+
+def make_jpeg(width: int, height: int, quality: int = 90) -> bytes:
+    """Gradients, hard edges and noise, so both smooth areas and detail are measured"""
+    gradient = Image.linear_gradient('L').resize((width, height))
+    img = Image.merge('RGB', (gradient, gradient.transpose(Image.Transpose.ROTATE_180),
+                              gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(img)
+    step = max(1, min(width, height) // 12)
+    for index, x in enumerate(range(0, width, step)):
+        draw.ellipse((x, (index * step) % height, x + step, (index * step) % height + step),
+                     outline=(255, 255 - index * 9 % 256, index * 17 % 256), width=max(1, step // 20))
+        draw.line((x, 0, width - x, height), fill=(index * 23 % 256, 40, 200), width=3)
+    noise = Image.effect_noise((width, height), 24).convert('RGB')
+    img = ImageChops.add(img.filter(ImageFilter.GaussianBlur(1)), noise, scale=1.5, offset=-40)
+    buffer = io.BytesIO()
+    img.save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+def psnr(a: Image.Image, b: Image.Image) -> float:
+    histogram = ImageChops.difference(a, b).histogram()
+    bands = len(a.getbands())
+    squared = sum(count * (index % 256) ** 2 for index, count in enumerate(histogram))
+    mse = squared / (a.width * a.height * bands)
+    return math.inf if mse == 0 else 10 * math.log10(255 ** 2 / mse)
+
+def full_resize(data: bytes, width: int, method: str) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img.resize(fit_size(img.size, width, width), RESAMPLE_METHODS[method])
+
+def fast_resize(data: bytes, width: int, method: str) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    result = resize_op(img, width, width, resize_method=method)
+    result.load()
+    return result
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--size', default='6000x4000', help='source JPEG size, WxH')
+    parser.add_argument('--min-psnr', type=float, default=40.0, help='fail below this PSNR in dB')
+    args = parser.parse_args()
+    width, height = (int(part) for part in args.size.lower().split('x'))
+
+    data = make_jpeg(width, height)
+    print(f"Source: {width}x{height} JPEG, {len(data) // 1024} KB")
+    print(f"{'target':>8} {'method':>9} {'full ms':>9} {'fast ms':>9} {'PSNR dB':>9} {'max diff':>9}")
+
+    worst = math.inf
+    for target in TARGET_WIDTHS:
+        for method in METHODS:
+            reference, full_ms = timed(full_resize, data, target, method)
+            result, fast_ms = timed(fast_resize, data, target, method)
+            assert result.size == reference.size, (result.size, reference.size)
+            quality = psnr(reference, result)
+            max_diff = max(high for _, high in ImageChops.difference(reference, result).getextrema())
+            worst = min(worst, quality)
+            print(f"{target:>8} {method:>9} {full_ms:>9.0f} {fast_ms:>9.0f} {quality:>9.1f} {max_diff:>9}")
+
+    if worst < args.min_psnr:
+        print(f"FAIL: worst PSNR {worst:.1f} dB is below {args.min_psnr} dB")
+        return 1
+    print(f"OK: worst PSNR {worst:.1f} dB (floor {args.min_psnr} dB)")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,6 +24,9 @@ class UniversalToolkit {
         
         // Progress updates
         this.progressCheckers = new Map();
+
+        // Files above this size use the resumable chunked upload API
+        this.chunkedUploadThreshold = 8 * 1024 * 1024;
     }
 
     setupFileUpload() {
@@ -148,7 +151,15 @@ class UniversalToolkit {
                     body: JSON.stringify(data)
                 });
             } else {
-                // Handle file upload forms
+                // Handle file upload forms; large files are sent in resumable chunks first
+                const fileInput = form.querySelector('input[type="file"]');
+                const file = fileInput && fileInput.files[0];
+                const fileType = this.fileTypeForAction(action);
+                if (file && fileType && file.size > this.chunkedUploadThreshold) {
+                    const uploadId = await this.uploadChunked(file, fileType, progressContainer);
+                    formData.delete(fileInput.name);
+                    formData.set('upload_id', uploadId);
+                }
                 response = await fetch(action, {
                     method: 'POST',
                     body: formData
@@ -167,7 +178,7 @@ class UniversalToolkit {
 
         } catch (error) {
             console.error('Form submission error:', error);
-            this.showResult(resultContainer, 'error', 'Error', 'An unexpected error occurred. Please try again.');
+            this.showResult(resultContainer, 'error', 'Error', error.userMessage || 'An unexpected error occurred. Please try again.');
         } finally {
             // Re-enable submit button
             if (submitButton) {
@@ -179,50 +190,224 @@ class UniversalToolkit {
         }
     }
 
+    fileTypeForAction(action) {
+        const match = (action || '').match(/\/api\/(video|audio|image|document)\//);
+        return match ? match[1] : null;
+    }
+
+    async uploadChunked(file, fileType, progressContainer) {
+        // Resumable upload: init once, PUT chunks at the server's offset, then finalize.
+        // The upload id is kept per file so a reload or dropped connection resumes it.
+        const storageKey = `upload:${fileType}:${file.name}:${file.size}:${file.lastModified}`;
+        const fail = (message) => Object.assign(new Error(message), { userMessage: message });
+        let uploadId = localStorage.getItem(storageKey);
+        let chunkSize = 0;
+        let received = 0;
+
+        if (uploadId) {
+            const response = await fetch(`/api/upload/${uploadId}`);
+            const session = response.ok ? await response.json() : null;
+            if (session && session.status === 'uploading') {
+                received = session.received;
+                chunkSize = session.chunk_size;
+            } else {
+                uploadId = null;
+            }
+        }
+
+        if (!uploadId) {
+            const response = await fetch('/api/upload/init', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size, file_type: fileType })
+            });
+            const session = await response.json();
+            if (!response.ok) throw fail(session.error);
+            uploadId = session.upload_id;
+            chunkSize = session.chunk_size;
+            localStorage.setItem(storageKey, uploadId);
+        }
+
+        let retries = 0;
+        while (received < file.size) {
+            this.updateProgress(progressContainer, {
+                progress: Math.floor(received * 100 / file.size),
+                message: `Mengunggah... ${this.formatFileSize(received)} / ${this.formatFileSize(file.size)}`
+            });
+            try {
+                const response = await fetch(`/api/upload/${uploadId}?offset=${received}`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream' },
+                    body: file.slice(received, received + chunkSize)
+                });
+                const result = await response.json();
+                if (typeof result.received === 'number') {
+                    // On 409 the server reports the offset it actually has
+                    received = result.received;
+                }
+                if (!response.ok && response.status !== 409) throw fail(result.error);
+                retries = 0;
+            } catch (error) {
+                if (error.userMessage || ++retries > 5) throw error;
+                // Network drop: back off, then ask the server where to resume
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                const status = await fetch(`/api/upload/${uploadId}`).then(r => r.json()).catch(() => null);
+                if (status && typeof status.received === 'number') received = status.received;
+            }
+        }
+
+        const response = await fetch(`/api/upload/${uploadId}/finalize`, { method: 'POST' });
+        const result = await response.json();
+        localStorage.removeItem(storageKey);
+        if (!response.ok) throw fail(result.error);
+        return uploadId;
+    }
+
     trackProgress(taskId, progressContainer, resultContainer) {
         if (this.progressCheckers.has(taskId)) {
-            clearInterval(this.progressCheckers.get(taskId));
+            this.progressCheckers.get(taskId)();
         }
 
-        const checkProgress = async () => {
-            try {
-                const response = await fetch(`/api/progress/${taskId}`);
-                const progress = await response.json();
+        this.showCancelButton(progressContainer, taskId);
+
+        const stop = this.watchProgress(taskId, (progress) => {
+            this.updateProgress(progressContainer, progress);
+            if (this.isTerminalStatus(progress.status)) {
+                this.removeCancelButton(progressContainer);
+            }
+            
+            if (progress.status === 'completed') {
+                this.progressCheckers.delete(taskId);
                 
-                this.updateProgress(progressContainer, progress);
+                this.showResult(resultContainer, 'success', 'Completed!', progress.message);
+                this.showDownloadButton(resultContainer, taskId);
+                if (progress.preview_url) {
+                    this.showPreviewButton(resultContainer, progress.preview_url);
+                }
                 
-                if (progress.status === 'completed') {
-                    clearInterval(this.progressCheckers.get(taskId));
-                    this.progressCheckers.delete(taskId);
-                    
-                    this.showResult(resultContainer, 'success', 'Completed!', progress.message);
-                    this.showDownloadButton(resultContainer, taskId);
-                    
-                    if (progressContainer) {
-                        setTimeout(() => {
-                            progressContainer.style.display = 'none';
-                        }, 2000);
-                    }
-                } else if (progress.status === 'error') {
-                    clearInterval(this.progressCheckers.get(taskId));
-                    this.progressCheckers.delete(taskId);
-                    
-                    this.showResult(resultContainer, 'error', 'Error', progress.message);
-                    
-                    if (progressContainer) {
+                if (progressContainer) {
+                    setTimeout(() => {
                         progressContainer.style.display = 'none';
-                    }
+                    }, 2000);
+                }
+            } else if (this.isTerminalStatus(progress.status)) {
+                this.progressCheckers.delete(taskId);
+                
+                const title = progress.status === 'cancelled' ? 'Cancelled' : 'Error';
+                this.showResult(resultContainer, 'error', title, progress.message);
+                
+                if (progressContainer) {
+                    progressContainer.style.display = 'none';
                 }
+            }
+        });
+        this.progressCheckers.set(taskId, stop);
+    }
+
+    showCancelButton(progressContainer, taskId) {
+        if (!progressContainer) return;
+        this.removeCancelButton(progressContainer);
+
+        const cancelButton = document.createElement('button');
+        cancelButton.type = 'button';
+        cancelButton.className = 'btn btn-secondary cancel-btn';
+        cancelButton.textContent = 'Batalkan';
+        cancelButton.addEventListener('click', async () => {
+            cancelButton.disabled = true;
+            // The progress stream reports the final 'cancelled' state
+            const cancelled = await this.cancelTask(taskId);
+            if (!cancelled) cancelButton.disabled = false;
+        });
+
+        progressContainer.appendChild(cancelButton);
+    }
+
+    removeCancelButton(progressContainer) {
+        const existingButton = progressContainer && progressContainer.querySelector('.cancel-btn');
+        if (existingButton) existingButton.remove();
+    }
+
+    async cancelTask(taskId) {
+        try {
+            const response = await fetch(`/api/task/${taskId}`, { method: 'DELETE' });
+            if (!response.ok) {
+                const result = await response.json();
+                this.showAlert(result.error || 'Gagal membatalkan tugas', 'error');
+                return false;
+            }
+            return true;
+        } catch (error) {
+            console.error('Cancel task error:', error);
+            return false;
+        }
+    }
+
+    isTerminalStatus(status) {
+        // 'unknown': the task id does not exist (or its progress expired); watchProgress
+        // only passes it on once it persists, a new task may not be visible yet
+        return ['completed', 'error', 'cancelled', 'interrupted', 'unknown'].includes(status);
+    }
+
+    watchProgress(taskId, onUpdate) {
+        // Prefer the Server-Sent Events stream; fall back to 1-second polling
+        // when EventSource is unavailable or the stream keeps failing
+        let stopped = false;
+        let source = null;
+        let pollTimer = null;
+        let failures = 0;
+        // A just-submitted task may briefly read as 'unknown' (same grace as the server stream)
+        const unknownGraceMs = 5000;
+        const started = Date.now();
+
+        const stop = () => {
+            stopped = true;
+            if (source) source.close();
+            if (pollTimer) clearTimeout(pollTimer);
+        };
+
+        const handle = (progress) => {
+            if (stopped) return;
+            if (progress.status === 'unknown' && Date.now() - started < unknownGraceMs) return;
+            onUpdate(progress);
+            if (this.isTerminalStatus(progress.status)) stop();
+        };
+
+        const poll = async () => {
+            if (stopped) return;
+            try {
+                const response = await fetch(`/api/progress/${taskId}`);
+                handle(await response.json());
             } catch (error) {
                 console.error('Progress check error:', error);
             }
+            if (!stopped) pollTimer = setTimeout(poll, 1000);
         };
 
-        const interval = setInterval(checkProgress, 1000);
-        this.progressCheckers.set(taskId, interval);
-        
-        // Initial check
-        checkProgress();
+        if (!window.EventSource) {
+            poll();
+            return stop;
+        }
+
+        source = new EventSource(`/api/progress/${taskId}/stream`);
+        source.addEventListener('open', () => {
+            failures = 0;
+        });
+        source.addEventListener('progress', (e) => {
+            handle(JSON.parse(e.data));
+        });
+        source.addEventListener('done', () => source.close());
+        source.onerror = () => {
+            // The server ends streams periodically and EventSource reconnects by itself;
+            // only repeated failures without a successful reconnect switch to polling
+            failures += 1;
+            if (stopped) return;
+            if (failures >= 3 || source.readyState === EventSource.CLOSED) {
+                source.close();
+                poll();
+            }
+        };
+
+        return stop;
     }
 
     updateProgress(progressContainer, progress) {
@@ -275,6 +460,84 @@ class UniversalToolkit {
         resultContainer.appendChild(downloadButton);
     }
 
+    showPreviewButton(resultContainer, previewUrl) {
+        if (!resultContainer || resultContainer.querySelector('.preview-btn')) return;
+
+        const previewButton = document.createElement('a');
+        previewButton.href = previewUrl;
+        previewButton.target = '_blank';
+        previewButton.className = 'btn btn-secondary preview-btn';
+        previewButton.textContent = 'Pratinjau';
+
+        resultContainer.appendChild(previewButton);
+    }
+
+    // HLS preview: native playback where supported (Safari), otherwise
+    // fMP4 segments are fed to Media Source Extensions one at a time
+    async startStreamPreview(video, masterUrl) {
+        if (video.canPlayType('application/vnd.apple.mpegurl')) {
+            video.src = masterUrl;
+            return;
+        }
+        if (!window.MediaSource) throw new Error('Browser tidak mendukung pemutaran streaming');
+
+        const fetchText = async (url) => {
+            const response = await fetch(url);
+            if (!response.ok) throw new Error('Playlist tidak ditemukan');
+            return response.text();
+        };
+        const playlistLines = (text) => text.split('\n').map(line => line.trim()).filter(Boolean);
+
+        // Master playlist: the variant URI and its CODECS attribute
+        const masterLines = playlistLines(await fetchText(masterUrl));
+        const infIndex = masterLines.findIndex(line => line.startsWith('#EXT-X-STREAM-INF'));
+        const codecs = infIndex >= 0 && (masterLines[infIndex].match(/CODECS="([^"]+)"/) || [])[1];
+        if (!codecs) throw new Error('Playlist tidak valid');
+        const variantUrl = new URL(masterLines[infIndex + 1], new URL(masterUrl, location.href));
+
+        // Media playlist: init segment and media segments in order
+        const mediaText = await fetchText(variantUrl);
+        const initUri = (mediaText.match(/#EXT-X-MAP:URI="([^"]+)"/) || [])[1];
+        const segmentUris = playlistLines(mediaText).filter(line => !line.startsWith('#'));
+
+        const mimeType = `video/mp4; codecs="${codecs}"`;
+        if (!MediaSource.isTypeSupported(mimeType)) throw new Error('Codec video tidak didukung browser');
+
+        const mediaSource = new MediaSource();
+        video.src = URL.createObjectURL(mediaSource);
+        await new Promise(resolve => mediaSource.addEventListener('sourceopen', resolve, { once: true }));
+        const sourceBuffer = mediaSource.addSourceBuffer(mimeType);
+
+        const whenUpdated = (operation) => new Promise((resolve, reject) => {
+            sourceBuffer.addEventListener('updateend', resolve, { once: true });
+            sourceBuffer.addEventListener('error', reject, { once: true });
+            operation();
+        });
+        const appendSegment = async (uri) => {
+            const response = await fetch(new URL(uri, variantUrl));
+            const data = await response.arrayBuffer();
+            await whenUpdated(() => sourceBuffer.appendBuffer(data));
+        };
+        const bufferedAhead = () => {
+            const ranges = sourceBuffer.buffered;
+            return ranges.length ? ranges.end(ranges.length - 1) - video.currentTime : 0;
+        };
+
+        if (initUri) await appendSegment(initUri);
+        for (const uri of segmentUris) {
+            // Stay about a minute ahead of playback and drop what was already played
+            while (bufferedAhead() > 60) {
+                await new Promise(resolve => setTimeout(resolve, 1000));
+            }
+            const ranges = sourceBuffer.buffered;
+            if (ranges.length && video.currentTime - ranges.start(0) > 30) {
+                await whenUpdated(() => sourceBuffer.remove(0, video.currentTime - 10));
+            }
+            await appendSegment(uri);
+        }
+        mediaSource.endOfStream();
+    }
+
     // Utility functions
     showAlert(message, type = 'info') {
         const alert = document.createElement('div');
@@ -0,0 +1,62 @@
+# enhance_op must match chained ImageEnhance within rounding
+import random
+
+import pytest
+from PIL import Image, ImageChops
+
+from utils.image_wrapper import enhance_op, _enhance_chain, flatten_alpha
+
+# Largest per-channel difference allowed against the sequential chain
+MAX_LEVEL_DIFF = 3
+
+FACTOR_SETS = [
+    (1.3, 1.0, 1.0, 1.0),
+    (1.0, 0.6, 1.0, 1.0),
+    (1.0, 1.0, 1.8, 1.0),
+    (1.0, 1.0, 1.0, 2.0),
+    (0.8, 1.4, 0.5, 1.5),
+    (1.6, 0.7, 1.2, 0.4),
+    (1.0, 1.0, 0.0, 3.0),
+]
+
+def sample_image(mode: str) -> Image.Image:
+    """Gradients plus noise, so both flat areas and edges are compared"""
+    size = (96, 64)
+    gradient = Image.linear_gradient('L').resize(size)
+    # Seeded, so every run compares the same pixels
+    noise = Image.frombytes('L', size, random.Random(0).randbytes(size[0] * size[1]))
+    rgb = Image.merge('RGB', (gradient, ImageChops.add(gradient.rotate(90), noise, scale=4),
+                              noise.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if mode == 'RGB':
+        return rgb
+    if mode == 'L':
+        return rgb.convert('L')
+    img = rgb.convert('L') if mode == 'LA' else rgb.copy()
+    img.putalpha(gradient.transpose(Image.Transpose.ROTATE_180))
+    return img
+
+def max_diff(a: Image.Image, b: Image.Image) -> int:
+    assert a.mode == b.mode and a.size == b.size
+    return max(band.getextrema()[1] for band in ImageChops.difference(a, b).split())
+
+@pytest.mark.parametrize('mode', ['RGB', 'L', 'RGBA', 'LA'])
+@pytest.mark.parametrize('factors', FACTOR_SETS)
+def test_matches_sequential_chain(mode, factors):
+    img = sample_image(mode)
+    assert max_diff(enhance_op(img, *factors), _enhance_chain(img, *factors)) <= MAX_LEVEL_DIFF
+
+@pytest.mark.parametrize('mode', ['RGBA', 'LA'])
+def test_alpha_is_preserved(mode):
+    img = sample_image(mode)
+    result = enhance_op(img, 1.2, 1.3, 1.4, 1.5)
+    assert result.getchannel('A').tobytes() == img.getchannel('A').tobytes()
+
+@pytest.mark.parametrize('factors', FACTOR_SETS)
+def test_flatten_matches_chain_then_flatten(factors):
+    img = sample_image('RGBA')
+    expected = flatten_alpha(_enhance_chain(img, *factors))
+    assert max_diff(enhance_op(img, *factors, flatten=True), expected) <= MAX_LEVEL_DIFF
+
+def test_neutral_factors_return_input_unchanged():
+    img = sample_image('RGB')
+    assert enhance_op(img).tobytes() == img.tobytes()
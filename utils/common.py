@@ -7,12 +7,10 @@ import mimetypes
 from datetime import datetime
 from werkzeug.utils import secure_filename
 from .config import ALLOWED_EXTENSIONS, ALLOWED_MIME_TYPES
+from .progress_store import progress_store
 
 logger = logging.getLogger(__name__)
 
-# Progress tracking dictionary
-progress_data = {}
-
 # Rate limiting dictionary - stores last request times by IP
 rate_limit_data = {}
 
@@ -58,22 +56,63 @@ def validate_file_content(file, file_type=None):
     
     return True, "Valid"
 
-def update_progress(task_id, progress, status, message=""):
-    """Update progress for a task"""
-    progress_data[task_id] = {
+# Magic byte signatures: (offset, signature, file types the content may belong to)
+MAGIC_SIGNATURES = [
+    (0, b'\xff\xd8\xff', {'image'}),                       # JPEG
+    (0, b'\x89PNG\r\n\x1a\n', {'image'}),                  # PNG
+    (0, b'GIF8', {'image'}),                                 # GIF
+    (0, b'BM', {'image'}),                                   # BMP
+    (0, b'II*\x00', {'image'}),                              # TIFF (little endian)
+    (0, b'MM\x00*', {'image'}),                              # TIFF (big endian)
+    (0, b'\x00\x00\x01\x00', {'image'}),                     # ICO
+    (8, b'WEBP', {'image'}),                                 # WebP (RIFF)
+    (8, b'WAVE', {'audio'}),                                 # WAV (RIFF)
+    (8, b'AVI ', {'video'}),                                 # AVI (RIFF)
+    (4, b'ftyp', {'video', 'audio'}),                        # MP4/MOV/M4A/3GP
+    (0, b'\x1a\x45\xdf\xa3', {'video', 'audio'}),            # Matroska/WebM
+    (0, b'FLV', {'video'}),                                  # FLV
+    (0, b'\x30\x26\xb2\x75', {'video', 'audio'}),            # ASF/WMV/WMA
+    (0, b'OggS', {'audio', 'video'}),                        # Ogg/Opus
+    (0, b'fLaC', {'audio'}),                                 # FLAC
+    (0, b'ID3', {'audio'}),                                  # MP3 with ID3 tag
+    (0, b'%PDF', {'document'}),                              # PDF
+    (0, b'PK\x03\x04', {'document', 'archive'}),             # DOCX/ODT/EPUB/ZIP
+    (0, b'\xd0\xcf\x11\xe0', {'document'}),                  # Legacy Office (DOC)
+    (0, b'{\\rtf', {'document'}),                            # RTF
+    (0, b'\x1f\x8b', {'archive'}),                           # GZIP
+    (0, b'BZh', {'archive'}),                                # BZIP2
+    (257, b'ustar', {'archive'}),                            # TAR
+]
+
+def sniff_file_types(header: bytes):
+    """Detect which file types the leading bytes of a file belong to (empty set if unknown)"""
+    for offset, signature, file_types in MAGIC_SIGNATURES:
+        if header[offset:offset + len(signature)] == signature:
+            return file_types
+    # MPEG audio frame sync (MP3/AAC without tags)
+    if len(header) >= 2 and header[0] == 0xff and (header[1] & 0xe0) == 0xe0:
+        return {'audio'}
+    if header[:1] == b'P' and header[1:2] in (b'2', b'3', b'5', b'6'):
+        return {'image'}  # PGM/PPM
+    return set()
+
+def update_progress(task_id, progress, status, message="", **extra):
+    """Update progress for a task (extra keyword fields are stored alongside)"""
+    progress_store.set(task_id, {
         'progress': progress,
         'status': status,
         'message': message,
-        'timestamp': datetime.now().isoformat()
-    }
+        'timestamp': datetime.now().isoformat(),
+        **extra
+    })
 
 def get_progress(task_id):
     """Get progress for a task"""
-    return progress_data.get(task_id, {
+    return progress_store.get(task_id) or {
         'progress': 0,
         'status': 'unknown',
         'message': 'Tugas tidak ditemukan'
-    })
+    }
 
 def generate_task_id():
     """Generate unique task ID"""
@@ -87,24 +126,6 @@ def safe_filename(filename, task_id=None):
         return f"{task_id}_{name}{ext}"
     return base_name
 
-def cleanup_old_files(folders, max_age_hours=1):
-    """Clean up old files from specified folders"""
-    try:
-        current_time = time.time()
-        max_age_seconds = max_age_hours * 3600
-        
-        for folder in folders:
-            if os.path.exists(folder):
-                for filename in os.listdir(folder):
-                    file_path = os.path.join(folder, filename)
-                    if os.path.isfile(file_path):
-                        file_age = current_time - os.path.getctime(file_path)
-                        if file_age > max_age_seconds:
-                            os.remove(file_path)
-                            logger.info(f"Membersihkan file lama: {file_path}")
-    except Exception as e:
-        logger.error(f"Error saat pembersihan: {e}")
-
 def format_file_size(bytes_count):
     """Format file size in human readable format"""
     if bytes_count == 0:
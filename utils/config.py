@@ -4,6 +4,8 @@ import os
 # Directory paths
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'outputs'
+STATE_FOLDER = os.environ.get('STATE_FOLDER', 'state')  # SQLite state shared by all workers on the node
+CACHE_FOLDER = os.environ.get('CACHE_FOLDER', 'cache')  # Content-addressed conversion results
 
 # File type extensions
 ALLOWED_EXTENSIONS = {
@@ -22,6 +24,82 @@ ALLOWED_MIME_TYPES = {
     'application/msword', 'text/plain', 'text/markdown', 'text/html'
 }
 
+# Background job concurrency per resource class
+# cpu: ffmpeg/pandoc/Pillow work, io: network downloads, light: quick utilities
+JOB_CONCURRENCY = {
+    'cpu': int(os.environ.get('JOB_CPU_WORKERS', os.cpu_count() or 2)),
+    'io': int(os.environ.get('JOB_IO_WORKERS', 4)),
+    'light': int(os.environ.get('JOB_LIGHT_WORKERS', 4)),
+}
+
+# Where jobs run: 'supervisor' (separate process that survives gunicorn worker
+# recycling) or 'thread' (inside one web worker; development only)
+JOB_RUNNER = os.environ.get('JOB_RUNNER', 'supervisor')
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 2))  # Runs per job, counting restarts
+# Threads per job (ffmpeg -threads, filter threads); 0 divides the cores among running CPU jobs
+JOB_THREAD_BUDGET = int(os.environ.get('JOB_THREAD_BUDGET', 0))
+# Priority of job processes and their children, below the web workers
+JOB_NICE_LEVELS = {
+    'cpu': int(os.environ.get('JOB_CPU_NICE', 10)),
+    'io': int(os.environ.get('JOB_IO_NICE', 5)),
+    'light': 0,
+}
+JOB_IONICE_LEVELS = {'cpu': 7, 'io': 4}  # Best-effort class, 0 (highest) to 7
+SUPERVISOR_LOCK_PATH = os.path.join(STATE_FOLDER, 'job_supervisor.lock')
+# Cancel tasks whose progress nobody has polled or streamed for this long (0 disables)
+ABANDONED_TASK_SECONDS = int(os.environ.get('ABANDONED_TASK_SECONDS', 10 * 60))
+
+# Progress tracking backend: 'sqlite' (shared across gunicorn workers and the job supervisor)
+# or 'memory' (web process only; progress written by job processes is not visible)
+PROGRESS_BACKEND = os.environ.get('PROGRESS_BACKEND', 'sqlite')
+PROGRESS_DB_PATH = os.path.join(STATE_FOLDER, 'progress.db')
+PROGRESS_TTL_SECONDS = int(os.environ.get('PROGRESS_TTL_SECONDS', 6 * 3600))
+PROGRESS_FLUSH_INTERVAL = float(os.environ.get('PROGRESS_FLUSH_INTERVAL', 0.5))
+# Open progress streams (SSE) per web worker; each holds a worker thread, so keep this
+# well below gunicorn's --threads. Clients over the limit fall back to polling.
+PROGRESS_STREAM_MAX_CONCURRENT = int(os.environ.get('PROGRESS_STREAM_MAX_CONCURRENT', 8))
+
+# Task bookkeeping database (output manifests and other per-task state)
+TASK_DB_PATH = os.path.join(STATE_FOLDER, 'tasks.db')
+
+# Chunked (resumable) uploads
+CHUNKED_UPLOAD_MAX_SIZE = int(os.environ.get('CHUNKED_UPLOAD_MAX_SIZE', 2 * 1024 * 1024 * 1024))  # 2GB
+CHUNKED_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Must stay below MAX_CONTENT_LENGTH
+CHUNKED_UPLOAD_TTL_SECONDS = int(os.environ.get('CHUNKED_UPLOAD_TTL_SECONDS', 24 * 3600))
+
+# Result cache for repeated conversions (size-bounded, LRU eviction)
+RESULT_CACHE_ENABLED = os.environ.get('RESULT_CACHE_ENABLED', 'true').lower() == 'true'
+RESULT_CACHE_MAX_BYTES = int(os.environ.get('RESULT_CACHE_MAX_BYTES', 5 * 1024 * 1024 * 1024))  # 5GB
+
+# Segmented video encoding: long inputs are split at keyframes and the chunks encoded in parallel
+SEGMENTED_ENCODE_MIN_SECONDS = int(os.environ.get('SEGMENTED_ENCODE_MIN_SECONDS', 10 * 60))  # 0 disables
+SEGMENTED_ENCODE_MAX_WORKERS = int(os.environ.get('SEGMENTED_ENCODE_MAX_WORKERS', os.cpu_count() or 2))
+SEGMENTED_ENCODE_MIN_SEGMENT_SECONDS = int(os.environ.get('SEGMENTED_ENCODE_MIN_SEGMENT_SECONDS', 60))
+
+# Pipe-through transcodes (/api/audio/stream, /api/video/stream) running at once per web worker
+STREAM_TRANSCODE_MAX_CONCURRENT = int(os.environ.get('STREAM_TRANSCODE_MAX_CONCURRENT', 2))
+# Raw request bodies piped into those transcodes are never buffered, so they may exceed MAX_CONTENT_LENGTH
+STREAM_TRANSCODE_MAX_BYTES = int(os.environ.get('STREAM_TRANSCODE_MAX_BYTES', 2 * 1024 * 1024 * 1024))  # 2GB
+
+# HLS packaging (fMP4 segments served under /stream/<task_id>/)
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', 6))
+
+# Large image limits: uploads above the pixel count are refused before decoding (decompression
+# bombs); full decodes plus their working copies must fit the memory budget
+IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 250_000_000))
+IMAGE_MEMORY_BUDGET = int(os.environ.get('IMAGE_MEMORY_BUDGET', 1024 * 1024 * 1024))  # 1GB
+IMAGE_STRIP_BYTES = int(os.environ.get('IMAGE_STRIP_BYTES', 16 * 1024 * 1024))  # Rows processed at a time
+
+# ffprobe result cache (entries held in each process / in the shared database)
+PROBE_CACHE_MEMORY_ENTRIES = int(os.environ.get('PROBE_CACHE_MEMORY_ENTRIES', 256))
+PROBE_CACHE_DB_ENTRIES = int(os.environ.get('PROBE_CACHE_DB_ENTRIES', 5000))
+
+# Artifact expiry and disk usage limits for uploads/ and outputs/
+ARTIFACT_TTL_SECONDS = int(os.environ.get('ARTIFACT_TTL_SECONDS', 2 * 3600))
+UPLOAD_TTL_SECONDS = int(os.environ.get('UPLOAD_TTL_SECONDS', 6 * 3600))  # Orphaned inputs of crashed jobs
+STORAGE_QUOTA_BYTES = int(os.environ.get('STORAGE_QUOTA_BYTES', 10 * 1024 * 1024 * 1024))  # 10GB
+STORAGE_MIN_FREE_BYTES = int(os.environ.get('STORAGE_MIN_FREE_BYTES', 1024 * 1024 * 1024))  # 1GB
+
 # Indonesian text labels
 INDONESIAN_LABELS = {
     'downloader': 'Pengunduh Media',
@@ -43,4 +121,6 @@ INDONESIAN_LABELS = {
 
 # Create directories
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
\ No newline at end of file
+os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(STATE_FOLDER, exist_ok=True)
+os.makedirs(CACHE_FOLDER, exist_ok=True)
\ No newline at end of file
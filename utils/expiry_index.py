@@ -0,0 +1,245 @@
+# Expiry index of uploads and outputs with a disk usage quota
+import os
+import time
+import shutil
+import logging
+import threading
+from typing import Dict, Optional
+from .sqlite_store import connect
+from .config import (TASK_DB_PATH, OUTPUT_FOLDER, ARTIFACT_TTL_SECONDS, UPLOAD_TTL_SECONDS,
+                     CHUNKED_UPLOAD_TTL_SECONDS, STORAGE_QUOTA_BYTES, STORAGE_MIN_FREE_BYTES)
+
+logger = logging.getLogger(__name__)
+
+# Longest sleep between sweeps; the sweeper wakes earlier for the next expiry
+SWEEP_INTERVAL = 30
+# Recently used artifacts are never evicted for quota (downloads in flight)
+QUOTA_GRACE_SECONDS = 300
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS artifact_expiry (
+            path TEXT PRIMARY KEY,
+            task_id TEXT,
+            kind TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            expires_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_artifact_expiry_expires ON artifact_expiry (expires_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_artifact_expiry_access ON artifact_expiry (last_access)')
+    # Running total of tracked bytes, kept by triggers so quota checks need no SUM() over the table
+    conn.execute('CREATE TABLE IF NOT EXISTS artifact_totals (id INTEGER PRIMARY KEY CHECK (id = 0), bytes INTEGER NOT NULL)')
+    conn.execute('INSERT OR IGNORE INTO artifact_totals (id, bytes) '
+                 'SELECT 0, COALESCE(SUM(size), 0) FROM artifact_expiry')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS artifact_expiry_insert AFTER INSERT ON artifact_expiry
+        BEGIN UPDATE artifact_totals SET bytes = bytes + NEW.size WHERE id = 0; END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS artifact_expiry_delete AFTER DELETE ON artifact_expiry
+        BEGIN UPDATE artifact_totals SET bytes = bytes - OLD.size WHERE id = 0; END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS artifact_expiry_resize AFTER UPDATE OF size ON artifact_expiry
+        BEGIN UPDATE artifact_totals SET bytes = bytes + NEW.size - OLD.size WHERE id = 0; END
+    ''')
+
+_init_schema()
+
+_sweeper_pid = None
+_sweeper_lock = threading.Lock()
+_wakeup = threading.Event()
+
+def track(path: str, task_id: Optional[str] = None, kind: str = 'output', size: int = 0,
+          ttl_seconds: Optional[int] = None):
+    """Register a file or directory to be deleted once it expires (again: renews the expiry)
+
+    Free disk space is left to the sweeper's interval; only the cheap quota
+    check runs here.
+    """
+    if ttl_seconds is None:
+        ttl_seconds = UPLOAD_TTL_SECONDS if kind == 'upload' else ARTIFACT_TTL_SECONDS
+    now = time.time()
+    # An upsert (not INSERT OR REPLACE) so the size triggers see the old row
+    connect(TASK_DB_PATH).execute(
+        'INSERT INTO artifact_expiry (path, task_id, kind, size, expires_at, last_access) '
+        'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (path) DO UPDATE SET task_id = excluded.task_id, '
+        'kind = excluded.kind, size = excluded.size, expires_at = excluded.expires_at, '
+        'last_access = excluded.last_access',
+        (path, task_id, kind, size, now + ttl_seconds, now)
+    )
+    # Only wakes a sweeper in this process; job processes rely on the web workers' interval
+    if size and _over_quota():
+        _wakeup.set()
+
+def forget(path: str):
+    """Stop tracking a path (moved or deleted by its owner)"""
+    connect(TASK_DB_PATH).execute('DELETE FROM artifact_expiry WHERE path = ?', (path,))
+
+def touch(path: str):
+    """Mark an artifact as recently used (LRU order for quota eviction)"""
+    connect(TASK_DB_PATH).execute(
+        'UPDATE artifact_expiry SET last_access = ? WHERE path = ?', (time.time(), path)
+    )
+
+def _remove_path(path: str):
+    """Delete a file or directory tree; already gone counts as deleted"""
+    if os.path.isdir(path):
+        # Another worker may be removing the same tree; only what is left matters
+        shutil.rmtree(path, ignore_errors=True)
+        if os.path.exists(path):
+            raise OSError(f'Directory not fully removed: {path}')
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _evict(path: str, condition: str = '', params: tuple = ()) -> bool:
+    """Delete one artifact, then its index row; returns False if it stays (or another worker got it)"""
+    conn = connect(TASK_DB_PATH)
+    if not conn.execute(f'SELECT 1 FROM artifact_expiry WHERE path = ?{condition}', (path, *params)).fetchone():
+        return False
+    try:
+        _remove_path(path)
+    except OSError as e:
+        # The row stays, so the next sweep retries instead of leaking the file
+        logger.warning(f"Could not delete {path}: {e}")
+        return False
+    removed = conn.execute('DELETE FROM artifact_expiry WHERE path = ?', (path,)).rowcount
+    # Drop the manifest entry too (task_outputs lives in the same database)
+    conn.execute('DELETE FROM task_outputs WHERE path = ?', (path,))
+    return bool(removed)
+
+def sweep_expired(now: Optional[float] = None) -> int:
+    """Delete every artifact whose expiry has passed (by now, default the current time)"""
+    now = time.time() if now is None else now
+    rows = connect(TASK_DB_PATH).execute(
+        'SELECT path FROM artifact_expiry WHERE expires_at <= ?', (now,)
+    ).fetchall()
+    removed = sum(1 for (path,) in rows if _evict(path, ' AND expires_at <= ?', (now,)))
+    if removed:
+        logger.info(f"Removed {removed} expired artifacts")
+    return removed
+
+def _tracked_bytes() -> int:
+    row = connect(TASK_DB_PATH).execute('SELECT bytes FROM artifact_totals WHERE id = 0').fetchone()
+    return row[0] if row else 0
+
+def _over_quota() -> bool:
+    return _tracked_bytes() > STORAGE_QUOTA_BYTES
+
+def _low_disk() -> bool:
+    return shutil.disk_usage(OUTPUT_FOLDER).free < STORAGE_MIN_FREE_BYTES
+
+def _prune_consumed_uploads():
+    """Forget uploads already deleted by their job so they stop counting toward the quota"""
+    conn = connect(TASK_DB_PATH)
+    rows = conn.execute("SELECT path FROM artifact_expiry WHERE kind = 'upload'").fetchall()
+    gone = [(path,) for (path,) in rows if not os.path.exists(path)]
+    if gone:
+        conn.executemany("DELETE FROM artifact_expiry WHERE path = ? AND kind = 'upload'", gone)
+
+def enforce_quota() -> int:
+    """Evict least recently used outputs while over quota or low on free space"""
+    if not (_over_quota() or _low_disk()):
+        return 0
+
+    _prune_consumed_uploads()
+
+    cutoff = time.time() - QUOTA_GRACE_SECONDS
+    # Uploads are inputs of jobs that may still run; they only leave by expiry
+    candidates = connect(TASK_DB_PATH).execute(
+        "SELECT path FROM artifact_expiry WHERE kind != 'upload' AND last_access < ? ORDER BY last_access",
+        (cutoff,)
+    ).fetchall()
+
+    removed = 0
+    for (path,) in candidates:
+        if not (_over_quota() or _low_disk()):
+            break
+        if _evict(path, ' AND last_access < ?', (cutoff,)):
+            removed += 1
+    if removed:
+        logger.warning(f"Storage quota: evicted {removed} least recently used artifacts")
+    return removed
+
+def _seconds_until_next_expiry() -> float:
+    row = connect(TASK_DB_PATH).execute('SELECT MIN(expires_at) FROM artifact_expiry').fetchone()
+    if row[0] is None:
+        return SWEEP_INTERVAL
+    return min(SWEEP_INTERVAL, max(0.0, row[0] - time.time()))
+
+def sweep():
+    """One sweeper pass: expired artifacts, then quota and free space"""
+    sweep_expired()
+    enforce_quota()
+
+def _sweep_loop():
+    while True:
+        try:
+            sweep()
+            delay = _seconds_until_next_expiry()
+        except Exception as e:
+            logger.error(f"Artifact sweep failed: {e}")
+            delay = SWEEP_INTERVAL
+        _wakeup.wait(delay)
+        _wakeup.clear()
+
+def ensure_sweeper():
+    """Start the background sweeper once per process (web workers only, not job processes)"""
+    global _sweeper_pid
+    if _sweeper_pid == os.getpid():
+        return
+    with _sweeper_lock:
+        if _sweeper_pid == os.getpid():
+            return
+        _sweeper_pid = os.getpid()
+    threading.Thread(target=_sweep_loop, name='artifact-sweeper', daemon=True).start()
+
+def stats() -> Dict:
+    """Tracked artifact counts and disk usage"""
+    count = connect(TASK_DB_PATH).execute('SELECT COUNT(*) FROM artifact_expiry').fetchone()[0]
+    return {
+        'artifacts': count,
+        'tracked_bytes': _tracked_bytes(),
+        'quota_bytes': STORAGE_QUOTA_BYTES,
+        'free_bytes': shutil.disk_usage(OUTPUT_FOLDER).free,
+        'min_free_bytes': STORAGE_MIN_FREE_BYTES,
+    }
+
+def reconcile(folders, max_age_seconds: int = ARTIFACT_TTL_SECONDS) -> int:
+    """Delete untracked leftovers older than max_age_seconds (run once at startup)
+
+    Covers files written before the index existed or by processes that died
+    before registering them. Untracked chunked upload parts are indexed with
+    the upload session expiry instead, counted from their last write.
+    """
+    conn = connect(TASK_DB_PATH)
+    cutoff = time.time() - max_age_seconds
+    removed = 0
+    for folder in folders:
+        if not os.path.exists(folder):
+            continue
+        for name in os.listdir(folder):
+            path = os.path.join(folder, name)
+            if conn.execute('SELECT 1 FROM artifact_expiry WHERE path = ?', (path,)).fetchone():
+                continue
+            if name.startswith('chunked_'):
+                # A resumable upload may still continue; it expires like its session
+                remaining = os.path.getmtime(path) + CHUNKED_UPLOAD_TTL_SECONDS - time.time()
+                track(path, kind='upload', size=os.path.getsize(path), ttl_seconds=max(0, remaining))
+                continue
+            if os.path.getmtime(path) > cutoff:
+                continue
+            try:
+                _remove_path(path)
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Could not delete {path}: {e}")
+    if removed:
+        logger.info(f"Removed {removed} untracked leftovers")
+    return removed
@@ -1,13 +1,138 @@
 # FFmpeg wrapper for comprehensive audio/video processing
 import os
+import glob
+import math
+import time
+import shutil
 import ffmpeg
 import subprocess
+import threading
 import logging
-from typing import Optional, Dict, List, Tuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, List, Tuple
+from PIL import Image
 from .common import update_progress
+from .task_manifest import record_output
+from .config import (SEGMENTED_ENCODE_MIN_SECONDS, SEGMENTED_ENCODE_MAX_WORKERS,
+                     SEGMENTED_ENCODE_MIN_SEGMENT_SECONDS, HLS_SEGMENT_SECONDS)
+from . import probe_cache, resource_governor
 
 logger = logging.getLogger(__name__)
 
+# Minimum time between progress updates from one ffmpeg run
+PROGRESS_UPDATE_INTERVAL = 1.0
+
+# Target codecs per output container: (encoder, codec names that may be stream-copied)
+VIDEO_TARGETS = {
+    'mp4': {'video': ('libx264', {'h264'}), 'audio': ('aac', {'aac'})},
+    'mkv': {'video': ('libx264', {'h264'}), 'audio': ('aac', {'aac'})},
+    'webm': {'video': ('libvpx-vp9', {'vp9'}), 'audio': ('libvorbis', {'vorbis', 'opus'})},
+}
+AUDIO_TARGETS = {
+    'mp3': ('libmp3lame', {'mp3'}),
+    'aac': ('aac', {'aac'}),
+    'm4a': ('aac', {'aac'}),
+    'opus': ('libopus', {'opus'}),
+    'ogg': ('libvorbis', {'vorbis'}),
+    'webm': ('libopus', {'opus'}),
+    'flac': ('flac', {'flac'}),
+    'wav': ('pcm_s16le', {'pcm_s16le'}),
+}
+LOSSLESS_AUDIO = {'flac', 'wav'}
+# Formats that can be written front to back into a pipe: format -> (muxer, mimetype, kind)
+STREAMABLE_FORMATS = {
+    'mp3': ('mp3', 'audio/mpeg', 'audio'),
+    'opus': ('opus', 'audio/ogg', 'audio'),
+    'ogg': ('ogg', 'audio/ogg', 'audio'),
+    'wav': ('wav', 'audio/wav', 'audio'),
+    'm4a': ('mp4', 'audio/mp4', 'audio'),
+    'mp4': ('mp4', 'video/mp4', 'video'),
+    'webm': ('webm', 'video/webm', 'video'),
+}
+# MP4 without seeking back: empty moov up front, then self-contained fragments
+FRAGMENTED_MP4_FLAGS = 'frag_keyframe+empty_moov+default_base_moof'
+# Streamed encodes have to keep pace with the download
+STREAMING_ENCODER_OPTIONS = {
+    'libx264': {'preset': 'veryfast'},
+    'libvpx-vp9': {'deadline': 'realtime', 'cpu-used': 8},
+}
+# Containers that carry AAC as ADTS; copying into MP4/M4A needs aac_adtstoasc
+ADTS_CONTAINERS = {'mpegts', 'aac', 'hls'}
+# Smart cut re-encodes the partial GOPs at cut points with the source's own codec
+SMART_CUT_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+# Profiles accepted by libx264/libx265, matched when re-encoding part of a stream
+ENCODER_PROFILES = {'baseline', 'main', 'high', 'high10', 'high422', 'high444', 'main10'}
+# Cut points this close to a keyframe need no boundary re-encode
+KEYFRAME_TOLERANCE = 0.001
+# Codecs merged clips may keep by stream copy (anything else is normalized to H.264/AAC)
+MERGE_VIDEO_CODECS = {'h264'}
+MERGE_AUDIO_CODECS = {'aac', None}
+# Thumbnail sprites: tile width, tiles per row, sample bounds and timestamps per ffmpeg process
+THUMBNAIL_WIDTH = 160
+THUMBNAIL_COLUMNS = 10
+THUMBNAIL_MIN_COUNT = 10
+THUMBNAIL_MAX_COUNT = 100
+THUMBNAIL_BATCH_SIZE = 10
+RESOLUTIONS = {
+    '4K': (3840, 2160), '2160p': (3840, 2160), '1440p': (2560, 1440), '1080p': (1920, 1080),
+    '720p': (1280, 720), '480p': (854, 480), '360p': (640, 360),
+}
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def parse_time(value) -> Optional[float]:
+    """Seconds from '90', '90.5' or 'HH:MM:SS(.ms)'"""
+    try:
+        seconds = 0.0
+        for part in str(value).split(':'):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except (TypeError, ValueError):
+        return None
+
+def _available_cores() -> int:
+    """Threads the current job may use (its resource governor budget)"""
+    return resource_governor.thread_budget()
+
+def _apply_thread_budget(stream, threads: int):
+    """Cap decoder and encoder threads of every input and output in a graph
+
+    Explicit 'threads' options of single inputs or outputs are kept.
+    """
+    pending, seen = [stream.node], set()
+    while pending:
+        node = pending.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        if isinstance(node, (ffmpeg.nodes.InputNode, ffmpeg.nodes.OutputNode)):
+            node.kwargs.setdefault('threads', threads)
+        pending.extend(edge.upstream_node for edge in node.incoming_edges)
+
+def _vtt_timestamp(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    return f'{hours:02d}:{minutes:02d}:{millis // 1000:02d}.{millis % 1000:03d}'
+
+def _format_eta(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}j {seconds % 3600 // 60}m'
+    if seconds >= 60:
+        return f'{seconds // 60}m {seconds % 60}d'
+    return f'{seconds}d'
+
+def thumbnail_urls(task_id: str) -> Dict[str, str]:
+    """Public URLs of a thumbnail package (served like HLS files)"""
+    return {name: f'/stream/{task_id}/{filename}' for name, filename in
+            (('sprite_url', 'sprite.jpg'), ('vtt_url', 'thumbnails.vtt'), ('poster_url', 'poster.jpg'))}
+
 class FFmpegProcessor:
     """Comprehensive FFmpeg wrapper for audio/video processing"""
     
@@ -33,53 +158,302 @@ class FFmpegProcessor:
             return numerator / denominator
         except (ValueError, TypeError):
             return 0.0
+
+    def _probe(self, input_path: str) -> Optional[Dict]:
+        """Raw ffprobe output, or None if the file cannot be probed"""
+        try:
+            return probe_cache.probe(input_path)
+        except Exception as e:
+            logger.warning(f"Could not probe {input_path}: {e}")
+            return None
+
+    def _probe_duration(self, input_path: str, probe: Optional[Dict] = None) -> Optional[float]:
+        """Media duration in seconds, or None if ffprobe cannot tell"""
+        probe = probe or self._probe(input_path)
+        try:
+            return float(probe['format']['duration'])
+        except (TypeError, KeyError, ValueError):
+            return None
+
+    def _first_stream(self, probe: Optional[Dict], codec_type: str) -> Optional[Dict]:
+        for stream in (probe or {}).get('streams', []):
+            disposition = stream.get('disposition', {})
+            # Cover art is reported as a video stream
+            if stream.get('codec_type') == codec_type and not disposition.get('attached_pic'):
+                return stream
+        return None
+
+    def _count_streams(self, probe: Optional[Dict], codec_type: str) -> int:
+        return sum(1 for stream in (probe or {}).get('streams', [])
+                   if stream.get('codec_type') == codec_type
+                   and not stream.get('disposition', {}).get('attached_pic'))
+
+    def _plan_video_streams(self, probe: Optional[Dict], output_format: str, resolution: Optional[str],
+                            crf: Optional[int]) -> Dict[str, str]:
+        """Decide per stream whether it can be stream-copied ('copy') or must be encoded"""
+        targets = VIDEO_TARGETS.get(output_format)
+        plan = {}
+        for codec_type in ('video', 'audio'):
+            encoder, copyable = targets[codec_type] if targets else (None, set())
+            source = self._first_stream(probe, codec_type)
+            can_copy = source is not None and source.get('codec_name') in copyable
+            if codec_type == 'video':
+                # An explicit CRF asks for re-compression
+                can_copy = can_copy and crf is None
+                if resolution in RESOLUTIONS:
+                    can_copy = can_copy and (source.get('width'), source.get('height')) == RESOLUTIONS[resolution]
+            plan[codec_type] = 'copy' if can_copy else encoder
+        return plan
+
+    def _plan_audio_stream(self, probe: Optional[Dict], output_format: str, quality: str,
+                           sample_rate: Optional[int]) -> Optional[str]:
+        """Encoder for the audio stream, or 'copy' when the source already fits"""
+        encoder, copyable = AUDIO_TARGETS.get(output_format, (None, set()))
+        source = self._first_stream(probe, 'audio')
+        if source is None or source.get('codec_name') not in copyable:
+            return encoder
+        if sample_rate and int(source.get('sample_rate') or 0) != int(sample_rate):
+            return encoder
+        if output_format not in LOSSLESS_AUDIO:
+            # Re-encoding lossy audio at an equal or higher bitrate only loses quality;
+            # a clearly lower requested bitrate is a request to shrink the file
+            source_bitrate = int(source.get('bit_rate') or probe['format'].get('bit_rate') or 0)
+            if not source_bitrate or source_bitrate > int(quality) * 1000 * 1.1:
+                return encoder
+        return 'copy'
+
+    def _copy_bitstream_filters(self, probe: Optional[Dict], output_format: str,
+                                audio_codec: Optional[str]) -> Dict[str, str]:
+        """Bitstream filters needed when copying streams into another container"""
+        options = {}
+        format_names = set(((probe or {}).get('format', {}).get('format_name') or '').split(','))
+        if audio_codec == 'copy' and output_format in ('mp4', 'm4a', 'mkv') and format_names & ADTS_CONTAINERS:
+            options['bsf:a'] = 'aac_adtstoasc'
+        return options
+
+    def _encoder_profile(self, stream: Dict) -> Optional[str]:
+        """x264/x265 profile name for a probed stream's profile ('High 10' -> 'high10')"""
+        profile = (stream.get('profile') or '').lower().replace('constrained ', '').replace(' ', '').replace(':', '')
+        return profile if profile in ENCODER_PROFILES else None
+
+    def _describe_path(self, codecs) -> str:
+        codecs = [codec for codec in codecs if codec]
+        if codecs and all(codec == 'copy' for codec in codecs):
+            return 'remux'
+        if any(codec == 'copy' for codec in codecs):
+            return 'partial_remux'
+        return 'transcode'
+
+    def _run(self, stream, task_id: str, duration: Optional[float], message: str,
+             start: int = 10, end: int = 95,
+             on_progress: Optional[Callable[[float, Optional[float]], None]] = None,
+             threads: Optional[int] = None):
+        """Run ffmpeg and report real progress, speed and ETA from -progress output
+
+        Progress is mapped into the start..end range; updates are throttled to
+        one per PROGRESS_UPDATE_INTERVAL and only sent when something changed.
+        With on_progress, every (out_time, speed) is handed to it instead, for
+        runs that report into a combined progress. Codec and filter threads
+        are capped at threads (default: the job's whole budget).
+        """
+        threads = threads or _available_cores()
+        _apply_thread_budget(stream, threads)
+        args = stream.global_args(
+            '-progress', 'pipe:1', '-nostats', '-filter_threads', str(threads),
+            '-filter_complex_threads', str(threads)
+        ).overwrite_output().compile()
+        started = time.time()
+        process = subprocess.Popen(args, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE, text=True)
+
+        # Drain stderr concurrently so a chatty ffmpeg never blocks on a full pipe
+        stderr_tail = deque(maxlen=50)
+        stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+        stderr_reader.start()
+
+        block = {}
+        last_update = 0.0
+        last_percent = None
+        speed = None
+        for line in process.stdout:
+            key, _, value = line.strip().partition('=')
+            if key != 'progress':
+                block[key] = value
+                continue
+
+            # One progress block is complete
+            out_time_us = _to_float(block.get('out_time_us'))
+            out_time = out_time_us / 1_000_000 if out_time_us is not None else None
+            speed = _to_float(block.get('speed', '').rstrip('x')) or speed
+            fps = _to_float(block.get('fps'))
+            block = {}
+
+            if on_progress:
+                if out_time is not None:
+                    on_progress(out_time, speed)
+                continue
+
+            now = time.time()
+            if not (duration and out_time is not None) or now - last_update < PROGRESS_UPDATE_INTERVAL:
+                continue
+
+            fraction = min(max(out_time / duration, 0.0), 1.0)
+            percent = int(start + (end - start) * fraction)
+            if percent == last_percent:
+                continue
+
+            extra = {'encode_speed': speed, 'fps': fps}
+            status_text = f'{message} {int(fraction * 100)}%'
+            if speed:
+                eta = (duration - out_time) / speed
+                extra['eta_seconds'] = int(eta)
+                status_text += f' ({speed:.1f}x, sisa ~{_format_eta(eta)})'
+            update_progress(task_id, percent, 'processing', status_text, **extra)
+            last_update, last_percent = now, percent
+
+        process.wait()
+        stderr_reader.join()
+        if process.returncode != 0:
+            raise ffmpeg.Error('ffmpeg', None, ''.join(stderr_tail).encode())
+
+        elapsed = time.time() - started
+        if duration and elapsed > 0:
+            # Encode speed per job, used for capacity planning
+            logger.info(f"ffmpeg task {task_id}: {duration:.1f}s of media in {elapsed:.1f}s "
+                        f"({duration / elapsed:.2f}x realtime)")
         
+    def _segment_count(self, duration: Optional[float], plan: Dict[str, str]) -> int:
+        """Number of chunks to encode in parallel (1 means a single ffmpeg run)"""
+        if not SEGMENTED_ENCODE_MIN_SECONDS or not duration or duration < SEGMENTED_ENCODE_MIN_SECONDS:
+            return 1
+        # Remuxing is I/O bound, and without a known encoder the chunks could not match
+        if plan['video'] in (None, 'copy'):
+            return 1
+        workers = min(SEGMENTED_ENCODE_MAX_WORKERS, _available_cores())
+        return max(1, min(workers, int(duration // max(SEGMENTED_ENCODE_MIN_SEGMENT_SECONDS, 1))))
+
+    def _convert_video_segmented(self, input_path: str, task_id: str, output_path: str, output_format: str,
+                                 probe: Optional[Dict], plan: Dict[str, str], crf: int,
+                                 resolution: Optional[str], duration: float, segments: int) -> int:
+        """Encode the video as keyframe-aligned chunks in parallel and concat them losslessly
+
+        Only the video is chunked; the audio track is processed once alongside so
+        chunk boundaries never produce audio gaps. Returns the number of chunks.
+        """
+        work_dir = os.path.join(self.output_folder, f'segments_{task_id}')
+        os.makedirs(work_dir, exist_ok=True)
+        started = time.time()
+        try:
+            # Stream-copy split: the segment muxer cuts at the first keyframe after each boundary
+            split = ffmpeg.output(ffmpeg.input(input_path).video, os.path.join(work_dir, 'source_%04d.mkv'),
+                                  vcodec='copy', f='segment', segment_time=f'{duration / segments:.3f}',
+                                  reset_timestamps=1)
+            self._run(split, task_id, duration, 'Membagi video di keyframe...', start=10, end=15)
+            chunks = sorted(glob.glob(os.path.join(work_dir, 'source_*.mkv')))
+            encoded = [os.path.join(work_dir, f'encoded_{index:04d}.mkv') for index in range(len(chunks))]
+
+            # Combined progress over all chunks
+            encoded_seconds = {}
+            progress_lock = threading.Lock()
+            last_update = [0.0]
+
+            def report(index: int, out_time: float, speed: Optional[float]):
+                with progress_lock:
+                    encoded_seconds[index] = out_time
+                    now = time.time()
+                    if now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+                        return
+                    last_update[0] = now
+                    done = sum(encoded_seconds.values())
+                fraction = min(done / duration, 1.0)
+                combined_speed = done / max(now - started, 0.001)
+                eta = (duration - done) / combined_speed if combined_speed else 0
+                update_progress(task_id, int(15 + 75 * fraction), 'processing',
+                                f'Memproses video ({len(chunks)} bagian paralel) {int(fraction * 100)}% '
+                                f'({combined_speed:.1f}x, sisa ~{_format_eta(eta)})',
+                                encode_speed=combined_speed, eta_seconds=int(eta), segments=len(chunks))
+
+            # Identical encoder settings for every chunk; cores are shared between them
+            chunk_options = {'vcodec': plan['video'], 'crf': crf}
+            chunk_threads = max(1, _available_cores() // len(chunks))
+
+            def encode_chunk(index: int):
+                stream = ffmpeg.input(chunks[index]).video
+                if resolution in RESOLUTIONS:
+                    stream = ffmpeg.filter(stream, 'scale', *RESOLUTIONS[resolution])
+                self._run(ffmpeg.output(stream, encoded[index], **chunk_options), task_id, None, '',
+                          on_progress=lambda out_time, speed: report(index, out_time, speed), threads=chunk_threads)
+
+            audio_path = None
+            if self._first_stream(probe, 'audio'):
+                audio_path = os.path.join(work_dir, 'audio.mka')
+                audio_options = {'acodec': plan['audio']}
+                audio_options.update(self._copy_bitstream_filters(probe, output_format, plan['audio']))
+                audio = ffmpeg.output(ffmpeg.input(input_path).audio, audio_path, **audio_options)
+
+            # Each chunk is its own ffmpeg process; the pool threads only wait on them
+            pool = ThreadPoolExecutor(max_workers=len(chunks) + 1, thread_name_prefix=f'segments-{task_id}')
+            try:
+                futures = [pool.submit(encode_chunk, index) for index in range(len(chunks))]
+                if audio_path:
+                    futures.append(pool.submit(self._run, audio, task_id, None, '',
+                                               on_progress=lambda out_time, speed: None, threads=1))
+                for future in futures:
+                    future.result()
+            finally:
+                pool.shutdown(cancel_futures=True)
+
+            # Lossless concat of the encoded chunks (paths relative to the list file)
+            list_path = os.path.join(work_dir, 'chunks.txt')
+            with open(list_path, 'w') as f:
+                for path in encoded:
+                    f.write(f"file '{os.path.basename(path)}'\n")
+            streams = [ffmpeg.input(list_path, f='concat', safe=0).video]
+            if audio_path:
+                streams.append(ffmpeg.input(audio_path).audio)
+            self._run(ffmpeg.output(*streams, output_path, c='copy'), task_id, duration,
+                      'Menggabungkan bagian video...', start=90, end=95)
+
+            elapsed = time.time() - started
+            logger.info(f"ffmpeg task {task_id}: {duration:.1f}s of media in {elapsed:.1f}s "
+                        f"({duration / elapsed:.2f}x realtime, {len(chunks)} parallel segments)")
+            return len(chunks)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
     def convert_audio(self, input_path: str, task_id: str, output_format: str = 'mp3',
                      quality: str = '192', sample_rate: Optional[int] = None) -> Optional[str]:
         """Convert audio format with quality options"""
         try:
-            update_progress(task_id, 20, 'processing', 'Mengonversi format audio...')
+            update_progress(task_id, 10, 'processing', 'Mengonversi format audio...')
             
             output_filename = f'audio_{task_id}.{output_format}'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            # Build ffmpeg stream
+            probe = self._probe(input_path)
             stream = ffmpeg.input(input_path)
             
-            # Audio codec options
+            # Stream-copy when the source codec already matches the target
+            acodec = self._plan_audio_stream(probe, output_format, quality, sample_rate)
             audio_options = {}
-            if output_format == 'mp3':
-                audio_options['acodec'] = 'libmp3lame'
+            if acodec:
+                audio_options['acodec'] = acodec
+            if acodec not in (None, 'copy') and output_format not in LOSSLESS_AUDIO:
                 audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'aac':
-                audio_options['acodec'] = 'aac'
-                audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'm4a':
-                audio_options['acodec'] = 'aac'
-                audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'opus':
-                audio_options['acodec'] = 'libopus'
-                audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'ogg':
-                audio_options['acodec'] = 'libvorbis'
-                audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'webm':
-                audio_options['acodec'] = 'libopus'
-                audio_options['audio_bitrate'] = f'{quality}k'
-            elif output_format == 'flac':
-                audio_options['acodec'] = 'flac'
-            elif output_format == 'wav':
-                audio_options['acodec'] = 'pcm_s16le'
-                
-            if sample_rate:
+            if sample_rate and acodec != 'copy':
                 audio_options['ar'] = sample_rate
-                
-            update_progress(task_id, 60, 'processing', 'Memproses audio...')
+            audio_options.update(self._copy_bitstream_filters(probe, output_format, acodec))
             
+            conversion = self._describe_path([acodec])
+            message = 'Menyalin audio tanpa encode ulang...' if conversion == 'remux' else 'Memproses audio...'
             stream = ffmpeg.output(stream, output_path, **audio_options)
-            ffmpeg.run(stream, overwrite_output=True, quiet=True)
+            self._run(stream, task_id, self._probe_duration(input_path, probe), message)
+            logger.info(f"Audio conversion {task_id}: {conversion} (acodec={acodec})")
             
-            update_progress(task_id, 100, 'completed', f'Audio berhasil dikonversi ke {output_format}!')
+            record_output(task_id, output_path)
+            suffix = ' (tanpa encode ulang)' if conversion == 'remux' else ''
+            update_progress(task_id, 100, 'completed', f'Audio berhasil dikonversi ke {output_format}{suffix}!',
+                            conversion=conversion)
             return output_path
             
         except Exception as e:
@@ -88,49 +462,57 @@ class FFmpegProcessor:
             return None
     
     def convert_video(self, input_path: str, task_id: str, output_format: str = 'mp4',
-                     resolution: Optional[str] = None, crf: int = 23) -> Optional[str]:
+                     resolution: Optional[str] = None, crf: Optional[int] = None,
+                     packaging: str = 'file') -> Optional[str]:
         """Convert video format with compression options"""
+        if packaging == 'hls':
+            return self.package_hls(input_path, task_id, resolution, crf)
         try:
-            update_progress(task_id, 20, 'processing', 'Mengonversi format video...')
+            update_progress(task_id, 10, 'processing', 'Mengonversi format video...')
             
             output_filename = f'video_{task_id}.{output_format}'
             output_path = os.path.join(self.output_folder, output_filename)
             
+            probe = self._probe(input_path)
             stream = ffmpeg.input(input_path)
             
-            # Video codec options
-            video_options = {'crf': crf}
-            if output_format == 'mp4':
-                video_options['vcodec'] = 'libx264'
-                video_options['acodec'] = 'aac'
-            elif output_format == 'webm':
-                video_options['vcodec'] = 'libvpx-vp9'
-                video_options['acodec'] = 'libvorbis'
-            elif output_format == 'mkv':
-                video_options['vcodec'] = 'libx264'
-                video_options['acodec'] = 'aac'
-                
+            # Decide per stream: remux (copy) when codec and size already match the target
+            plan = self._plan_video_streams(probe, output_format, resolution, crf)
+            video_options = {}
+            if plan['video'] != 'copy':
+                video_options['crf'] = crf if crf is not None else 23
+            if plan['video']:
+                video_options['vcodec'] = plan['video']
+            if plan['audio']:
+                video_options['acodec'] = plan['audio']
+            video_options.update(self._copy_bitstream_filters(probe, output_format, plan['audio']))
+            
             # Resolution scaling (supports both upscaling and downscaling)
-            if resolution:
-                if resolution == '4K' or resolution == '2160p':
-                    stream = ffmpeg.filter(stream, 'scale', 3840, 2160)
-                elif resolution == '1440p':
-                    stream = ffmpeg.filter(stream, 'scale', 2560, 1440)
-                elif resolution == '1080p':
-                    stream = ffmpeg.filter(stream, 'scale', 1920, 1080)
-                elif resolution == '720p':
-                    stream = ffmpeg.filter(stream, 'scale', 1280, 720)
-                elif resolution == '480p':
-                    stream = ffmpeg.filter(stream, 'scale', 854, 480)
-                elif resolution == '360p':
-                    stream = ffmpeg.filter(stream, 'scale', 640, 360)
-                    
-            update_progress(task_id, 60, 'processing', 'Memproses video...')
-            
-            stream = ffmpeg.output(stream, output_path, **video_options)
-            ffmpeg.run(stream, overwrite_output=True, quiet=True)
-            
-            update_progress(task_id, 100, 'completed', f'Video berhasil dikonversi ke {output_format}!')
+            streams = [stream]
+            if resolution in RESOLUTIONS and plan['video'] != 'copy':
+                # Filtering yields only the video stream; map the audio explicitly so it is kept
+                streams = [ffmpeg.filter(stream.video, 'scale', *RESOLUTIONS[resolution])]
+                if self._first_stream(probe, 'audio'):
+                    streams.append(stream.audio)
+            
+            conversion = self._describe_path(plan.values())
+            duration = self._probe_duration(input_path, probe)
+            segments = self._segment_count(duration, plan)
+            if segments > 1:
+                # Long encodes scale with cores: keyframe-aligned chunks encoded in parallel
+                segments = self._convert_video_segmented(input_path, task_id, output_path, output_format, probe,
+                                                         plan, video_options['crf'], resolution, duration, segments)
+            else:
+                message = 'Menyalin stream tanpa encode ulang...' if conversion == 'remux' else 'Memproses video...'
+                stream = ffmpeg.output(*streams, output_path, **video_options)
+                self._run(stream, task_id, duration, message)
+            logger.info(f"Video conversion {task_id}: {conversion} (video={plan['video']}, audio={plan['audio']}, "
+                        f"segments={segments})")
+            
+            record_output(task_id, output_path)
+            suffix = ' (tanpa encode ulang)' if conversion == 'remux' else ''
+            update_progress(task_id, 100, 'completed', f'Video berhasil dikonversi ke {output_format}{suffix}!',
+                            conversion=conversion, streams=plan, segments=segments)
             return output_path
             
         except Exception as e:
@@ -138,11 +520,296 @@ class FFmpegProcessor:
             update_progress(task_id, 0, 'error', f'Konversi video gagal: {str(e)}')
             return None
     
+    def streaming_command(self, input_path: Optional[str], output_format: str, quality: str = '192',
+                          resolution: Optional[str] = None, crf: Optional[int] = None,
+                          threads: Optional[int] = None) -> List[str]:
+        """ffmpeg arguments that write output_format to stdout, for STREAMABLE_FORMATS
+
+        Reads stdin when input_path is None; such input is not probed, so
+        nothing is stream-copied. MP4/M4A are written as fragmented MP4.
+        """
+        muxer, _, kind = STREAMABLE_FORMATS[output_format]
+        probe = self._probe(input_path) if input_path else None
+        source = ffmpeg.input(input_path or 'pipe:0')
+        options = {'f': muxer}
+        if muxer == 'mp4':
+            options['movflags'] = FRAGMENTED_MP4_FLAGS
+        
+        if kind == 'audio':
+            streams = [source.audio]
+            options['acodec'] = self._plan_audio_stream(probe, output_format, quality, None)
+            if options['acodec'] != 'copy' and output_format not in LOSSLESS_AUDIO:
+                options['audio_bitrate'] = f'{quality}k'
+        else:
+            plan = self._plan_video_streams(probe, output_format, resolution, crf)
+            video = source.video
+            if resolution in RESOLUTIONS and plan['video'] != 'copy':
+                video = video.filter('scale', *RESOLUTIONS[resolution])
+            # 'a?' maps the audio only if there is one
+            streams = [video, source['a?']]
+            options.update(vcodec=plan['video'], acodec=plan['audio'])
+            if plan['video'] != 'copy':
+                options['crf'] = crf if crf is not None else 23
+                options.update(STREAMING_ENCODER_OPTIONS.get(plan['video'], {}))
+        options.update(self._copy_bitstream_filters(probe, output_format, options['acodec']))
+        
+        threads = threads or _available_cores()
+        stream = ffmpeg.output(*streams, 'pipe:1', **options)
+        _apply_thread_budget(stream, threads)
+        return stream.global_args(
+            '-nostats', '-loglevel', 'error', '-filter_threads', str(threads), '-filter_complex_threads', str(threads)
+        ).compile()
+    
+    def package_hls(self, input_path: str, task_id: str, resolution: Optional[str] = None,
+                    crf: Optional[int] = None, start: int = 10) -> Optional[str]:
+        """Package a video as HLS (fMP4 segments plus playlists) in a per-task directory
+
+        H.264/AAC sources are segmented by stream copy; anything else is encoded
+        with a keyframe at every segment boundary. Returns the directory.
+        """
+        try:
+            update_progress(task_id, start, 'processing', 'Menyiapkan streaming HLS...')
+            
+            output_dir = os.path.join(self.output_folder, f'hls_{task_id}')
+            os.makedirs(output_dir, exist_ok=True)
+            
+            probe = self._probe(input_path)
+            source = ffmpeg.input(input_path)
+            plan = self._plan_video_streams(probe, 'mp4', resolution, crf)
+            options = {'vcodec': plan['video']}
+            if plan['video'] != 'copy':
+                options['crf'] = crf if crf is not None else 23
+                # Segments can only start on keyframes
+                options['force_key_frames'] = f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})'
+            
+            streams = [source.video]
+            if resolution in RESOLUTIONS and plan['video'] != 'copy':
+                streams = [ffmpeg.filter(source.video, 'scale', *RESOLUTIONS[resolution])]
+            if self._first_stream(probe, 'audio'):
+                streams.append(source.audio)
+                options['acodec'] = plan['audio']
+                options.update(self._copy_bitstream_filters(probe, 'mp4', plan['audio']))
+            
+            stream = ffmpeg.output(
+                *streams, os.path.join(output_dir, 'stream.m3u8'), f='hls',
+                hls_time=HLS_SEGMENT_SECONDS, hls_playlist_type='vod', hls_segment_type='fmp4',
+                hls_fmp4_init_filename='init.mp4', hls_segment_filename=os.path.join(output_dir, 'seg_%05d.m4s'),
+                # The master playlist carries the CODECS attribute the preview player needs
+                master_pl_name='master.m3u8', **options
+            )
+            conversion = self._describe_path(plan.values())
+            message = 'Membuat segmen tanpa encode ulang...' if conversion == 'remux' else 'Membuat segmen HLS...'
+            self._run(stream, task_id, self._probe_duration(input_path, probe), message, start=start + 5)
+            logger.info(f"HLS packaging {task_id}: {conversion} (video={plan['video']}, audio={plan['audio']})")
+            
+            record_output(task_id, output_dir, kind='stream')
+            update_progress(task_id, 100, 'completed', 'Video siap diputar langsung di browser!',
+                            conversion=conversion, stream_url=f'/stream/{task_id}/master.m3u8',
+                            preview_url=f'/preview/{task_id}')
+            return output_dir
+            
+        except Exception as e:
+            logger.error(f"HLS packaging failed: {e}")
+            update_progress(task_id, 0, 'error', f'Pembuatan streaming gagal: {str(e)}')
+            return None
+    
+    def generate_thumbnails(self, input_path: str, task_id: str, width: int = THUMBNAIL_WIDTH,
+                            count: Optional[int] = None, columns: int = THUMBNAIL_COLUMNS) -> Optional[str]:
+        """Build a thumbnail sprite sheet with a WebVTT index and a poster image
+
+        Every sample is an input-side seek followed by a keyframe-only decode
+        (skip_frame nokey), scaled in the same process, so no frame between
+        keyframes is ever decoded. Returns the directory.
+        """
+        output_dir = os.path.join(self.output_folder, f'thumbnails_{task_id}')
+        frames_dir = os.path.join(output_dir, 'frames')
+        try:
+            update_progress(task_id, 10, 'processing', 'Membaca video...')
+            
+            probe = self._probe(input_path)
+            duration = self._probe_duration(input_path, probe)
+            video = self._first_stream(probe, 'video')
+            if not duration or not video or not video.get('width') or not video.get('height'):
+                raise ValueError('Video tidak dapat dibaca')
+            
+            if not count:
+                count = min(THUMBNAIL_MAX_COUNT, max(THUMBNAIL_MIN_COUNT, int(duration // 10)))
+            step = duration / count
+            # Middle of each interval, so the first tile is not a black intro frame
+            times = [step * (index + 0.5) for index in range(count)]
+            # Even height for the source aspect ratio
+            height = max(2, round(width * video['height'] / video['width'] / 2) * 2)
+            
+            os.makedirs(frames_dir, exist_ok=True)
+            frame_paths = [os.path.join(frames_dir, f'{index:04d}.jpg') for index in range(count)]
+            batches = [range(first, min(first + THUMBNAIL_BATCH_SIZE, count))
+                       for first in range(0, count, THUMBNAIL_BATCH_SIZE)]
+            
+            done = [0]
+            lock = threading.Lock()
+            
+            def extract(batch: range):
+                outputs = []
+                for index in batch:
+                    # Fast seek to the keyframe before the sample; only keyframes are decoded
+                    source = ffmpeg.input(input_path, ss=round(times[index], 3), skip_frame='nokey',
+                                          noaccurate_seek=None)
+                    scaled = source.video.filter('scale', width, height, flags='fast_bilinear')
+                    outputs.append(ffmpeg.output(scaled, frame_paths[index], vframes=1, **{'q:v': 4}))
+                # No duration: progress is counted per batch below
+                self._run(ffmpeg.merge_outputs(*outputs), task_id, None, '', threads=batch_threads)
+                with lock:
+                    done[0] += len(batch)
+                    update_progress(task_id, 10 + int(done[0] / count * 75), 'processing',
+                                    f'Mengambil cuplikan {done[0]}/{count}...')
+            
+            workers = min(len(batches), _available_cores())
+            batch_threads = max(1, _available_cores() // workers)
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                # list() re-raises the first failed batch
+                list(pool.map(extract, batches))
+            
+            update_progress(task_id, 90, 'processing', 'Menyusun sprite...')
+            rows = math.ceil(count / columns)
+            sheet = Image.new('RGB', (columns * width, rows * height))
+            cues = ['WEBVTT', '']
+            for index, path in enumerate(frame_paths):
+                x, y = index % columns * width, index // columns * height
+                # A sample past the last keyframe yields no frame; its tile stays black
+                if os.path.exists(path):
+                    with Image.open(path) as tile:
+                        sheet.paste(tile.convert('RGB').resize((width, height)), (x, y))
+                end = duration if index == count - 1 else step * (index + 1)
+                cues += [f'{_vtt_timestamp(step * index)} --> {_vtt_timestamp(end)}',
+                         f'sprite.jpg#xywh={x},{y},{width},{height}', '']
+            sheet.save(os.path.join(output_dir, 'sprite.jpg'), 'JPEG', quality=80, optimize=True)
+            with open(os.path.join(output_dir, 'thumbnails.vtt'), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(cues))
+            
+            poster = next((path for path in frame_paths[count // 10:] + frame_paths if os.path.exists(path)), None)
+            if poster:
+                shutil.copy2(poster, os.path.join(output_dir, 'poster.jpg'))
+            shutil.rmtree(frames_dir, ignore_errors=True)
+            logger.info(f"Thumbnails {task_id}: {count} tiles of {width}x{height} in {len(batches)} batches")
+            
+            record_output(task_id, output_dir, kind='stream')
+            update_progress(task_id, 100, 'completed', f'{count} cuplikan siap!', thumbnails=count,
+                            **thumbnail_urls(task_id))
+            return output_dir
+            
+        except Exception as e:
+            logger.error(f"Thumbnail generation failed: {e}")
+            shutil.rmtree(output_dir, ignore_errors=True)
+            update_progress(task_id, 0, 'error', f'Pembuatan cuplikan gagal: {str(e)}')
+            return None
+    
+    def convert_renditions(self, input_path: str, task_id: str, renditions: List[Dict]) -> Optional[List[str]]:
+        """Produce several renditions (video sizes and audio-only) from a single decode
+
+        Each rendition has 'name', 'type' ('video' or 'audio'), 'format' and
+        optionally 'resolution', 'crf' (video) or 'quality' (audio). All outputs
+        are written by one ffmpeg run, so they advance together.
+        """
+        try:
+            update_progress(task_id, 10, 'processing', f'Menyiapkan {len(renditions)} rendisi...')
+            
+            probe = self._probe(input_path)
+            duration = self._probe_duration(input_path, probe)
+            has_audio = self._first_stream(probe, 'audio') is not None
+            if not has_audio and any(r['type'] == 'audio' for r in renditions):
+                raise ValueError('Video tidak memiliki trek audio')
+            source = ffmpeg.input(input_path)
+            
+            plans = []
+            for rendition in renditions:
+                if rendition['type'] == 'audio':
+                    plans.append({'audio': self._plan_audio_stream(probe, rendition['format'],
+                                                                   rendition['quality'], None)})
+                else:
+                    plans.append(self._plan_video_streams(probe, rendition['format'], rendition.get('resolution'),
+                                                          rendition.get('crf')))
+            
+            # The decoded video feeds every scaled rendition through one split filter
+            to_scale = [index for index, (rendition, plan) in enumerate(zip(renditions, plans))
+                        if rendition['type'] == 'video' and plan['video'] != 'copy'
+                        and rendition.get('resolution') in RESOLUTIONS]
+            branches = {}
+            if len(to_scale) > 1:
+                split = source.video.filter_multi_output('split')
+                for branch, index in enumerate(to_scale):
+                    branches[index] = split[branch].filter('scale', *RESOLUTIONS[renditions[index]['resolution']])
+            elif to_scale:
+                index = to_scale[0]
+                branches[index] = source.video.filter('scale', *RESOLUTIONS[renditions[index]['resolution']])
+            
+            outputs, paths = [], []
+            for index, (rendition, plan) in enumerate(zip(renditions, plans)):
+                path = os.path.join(self.output_folder, f"rendition_{task_id}_{rendition['name']}.{rendition['format']}")
+                options = {}
+                if rendition['type'] == 'audio':
+                    streams = [source.audio]
+                    if plan['audio']:
+                        options['acodec'] = plan['audio']
+                    if plan['audio'] not in (None, 'copy') and rendition['format'] not in LOSSLESS_AUDIO:
+                        options['audio_bitrate'] = f"{rendition['quality']}k"
+                else:
+                    streams = [branches.get(index, source.video)]
+                    if has_audio:
+                        streams.append(source.audio)
+                    if plan['video'] != 'copy':
+                        options['crf'] = rendition.get('crf') if rendition.get('crf') is not None else 23
+                    if plan['video']:
+                        options['vcodec'] = plan['video']
+                    if plan['audio'] and has_audio:
+                        options['acodec'] = plan['audio']
+                options.update(self._copy_bitstream_filters(probe, rendition['format'], plan['audio']))
+                outputs.append(ffmpeg.output(*streams, path, **options))
+                paths.append(path)
+            
+            # -progress covers the whole run; per rendition, report the bytes written so far
+            last_update = [0.0]
+            
+            def report(out_time: float, speed: Optional[float]):
+                now = time.time()
+                if not duration or now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+                    return
+                last_update[0] = now
+                fraction = min(max(out_time / duration, 0.0), 1.0)
+                status = [{'name': rendition['name'], 'percent': int(fraction * 100),
+                           'bytes': os.path.getsize(path) if os.path.exists(path) else 0}
+                          for rendition, path in zip(renditions, paths)]
+                extra = {'encode_speed': speed, 'renditions': status}
+                status_text = f'Membuat {len(renditions)} rendisi {int(fraction * 100)}%'
+                if speed:
+                    eta = (duration - out_time) / speed
+                    extra['eta_seconds'] = int(eta)
+                    status_text += f' ({speed:.1f}x, sisa ~{_format_eta(eta)})'
+                update_progress(task_id, int(10 + 85 * fraction), 'processing', status_text, **extra)
+            
+            self._run(ffmpeg.merge_outputs(*outputs), task_id, duration, '', on_progress=report)
+            
+            summary = []
+            for rendition, plan, path in zip(renditions, plans, paths):
+                artifact = record_output(task_id, path)
+                summary.append({'name': rendition['name'], 'format': rendition['format'], 'size': artifact['size'],
+                                'conversion': self._describe_path(plan.values())})
+            logger.info(f"Renditions {task_id}: {len(renditions)} outputs from one decode "
+                        f"({', '.join(r['name'] for r in renditions)})")
+            
+            update_progress(task_id, 100, 'completed', f'{len(renditions)} rendisi berhasil dibuat!',
+                            renditions=summary)
+            return paths
+            
+        except Exception as e:
+            logger.error(f"Rendition conversion failed: {e}")
+            update_progress(task_id, 0, 'error', f'Pembuatan rendisi gagal: {str(e)}')
+            return None
+    
     def extract_audio_from_video(self, input_path: str, task_id: str, 
                                output_format: str = 'mp3') -> Optional[str]:
         """Extract audio from video file"""
         try:
-            update_progress(task_id, 20, 'processing', 'Mengekstrak audio dari video...')
+            update_progress(task_id, 10, 'processing', 'Mengekstrak audio dari video...')
             
             output_filename = f'extracted_audio_{task_id}.{output_format}'
             output_path = os.path.join(self.output_folder, output_filename)
@@ -156,11 +823,10 @@ class FFmpegProcessor:
             elif output_format == 'wav':
                 audio_options['acodec'] = 'pcm_s16le'
                 
-            update_progress(task_id, 60, 'processing', 'Memproses ekstraksi audio...')
-            
             stream = ffmpeg.output(stream, output_path, **audio_options)
-            ffmpeg.run(stream, overwrite_output=True, quiet=True)
+            self._run(stream, task_id, self._probe_duration(input_path), 'Memproses ekstraksi audio...')
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'Audio berhasil diekstrak!')
             return output_path
             
@@ -169,88 +835,355 @@ class FFmpegProcessor:
             update_progress(task_id, 0, 'error', f'Ekstraksi audio gagal: {str(e)}')
             return None
     
+    def _merge_signature(self, probe: Optional[Dict]) -> Dict:
+        """Stream properties that must be equal for clips to be concatenated by stream copy"""
+        video = self._first_stream(probe, 'video') or {}
+        audio = self._first_stream(probe, 'audio') or {}
+        return {
+            'video_codec': video.get('codec_name'), 'profile': video.get('profile'),
+            'width': video.get('width'), 'height': video.get('height'), 'pix_fmt': video.get('pix_fmt'),
+            'frame_rate': video.get('r_frame_rate'), 'time_base': video.get('time_base'),
+            'audio_codec': audio.get('codec_name'), 'sample_rate': audio.get('sample_rate'),
+            'channels': audio.get('channels'),
+        }
+
+    def _write_concat_list(self, list_path: str, paths: List[str]):
+        with open(list_path, 'w') as f:
+            for path in paths:
+                # Concat demuxer quoting: ' is written as '\''
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
     def merge_videos(self, video_paths: List[str], task_id: str) -> Optional[str]:
-        """Merge multiple videos into one"""
+        """Merge multiple videos into one
+
+        Compatible clips are concatenated by stream copy. Otherwise the clips
+        that differ from the most common copyable format are normalized to it
+        in parallel, so the merge takes about as long as the slowest clip.
+        If any clip has audio the result has audio; silent clips get a silent
+        track. Only the first video and audio stream of each clip are kept.
+        """
+        work_dir = os.path.join(self.output_folder, f'merge_{task_id}')
         try:
-            update_progress(task_id, 20, 'processing', 'Menggabungkan video...')
+            update_progress(task_id, 10, 'processing', 'Memeriksa video...')
             
             output_filename = f'merged_video_{task_id}.mp4'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            # Create concat file for ffmpeg
-            concat_file = os.path.join(self.output_folder, f'concat_{task_id}.txt')
-            with open(concat_file, 'w') as f:
-                for video_path in video_paths:
-                    f.write(f"file '{video_path}'\n")
+            probes = [self._probe(path) for path in video_paths]
+            if not all(probes):
+                raise ValueError('Salah satu video tidak dapat dibaca')
+            durations = [self._probe_duration(path, probe) for path, probe in zip(video_paths, probes)]
+            total_duration = sum(durations) if all(durations) else None
+            signatures = [self._merge_signature(probe) for probe in probes]
             
-            update_progress(task_id, 60, 'processing', 'Memproses penggabungan...')
+            has_audio = any(sig['audio_codec'] for sig in signatures)
+            for path, probe in zip(video_paths, probes):
+                extra = self._count_streams(probe, 'audio') - 1
+                if extra > 0:
+                    logger.warning(f"Video merge {task_id}: {os.path.basename(path)} has {extra} "
+                                   f"extra audio tracks; only the first is merged")
             
-            (
-                ffmpeg
-                .input(concat_file, format='concat', safe=0)
-                .output(output_path, c='copy')
-                .overwrite_output()
-                .run(quiet=True)
-            )
+            # Target: the most common signature among copyable clips (earliest wins ties);
+            # a silent target is only possible when no clip has audio, or audio would be lost
+            copyable = [sig for sig in signatures
+                        if sig['video_codec'] in MERGE_VIDEO_CODECS and sig['audio_codec'] in MERGE_AUDIO_CODECS
+                        and (sig['audio_codec'] or not has_audio)]
+            if copyable:
+                target = max(copyable, key=copyable.count)
+            else:
+                first = signatures[0]
+                target = dict(first, video_codec='h264', profile=None, pix_fmt='yuv420p', time_base=None,
+                              audio_codec='aac' if has_audio else None, sample_rate='48000', channels=2)
+            mismatched = [index for index, sig in enumerate(signatures) if sig != target]
             
-            # Clean up concat file
-            os.remove(concat_file)
+            if not mismatched:
+                concat_file = os.path.join(self.output_folder, f'concat_{task_id}.txt')
+                self._write_concat_list(concat_file, video_paths)
+                try:
+                    stream = ffmpeg.input(concat_file, format='concat', safe=0).output(output_path, c='copy')
+                    self._run(stream, task_id, total_duration, 'Memproses penggabungan...')
+                finally:
+                    os.remove(concat_file)
+                conversion = 'remux'
+            else:
+                os.makedirs(work_dir, exist_ok=True)
+                pieces = self._normalize_for_merge(video_paths, task_id, probes, durations, target, mismatched, work_dir)
+                concat_file = os.path.join(work_dir, 'concat.txt')
+                self._write_concat_list(concat_file, pieces)
+                options = {'c': 'copy'}
+                if target['audio_codec']:
+                    options['bsf:a'] = 'aac_adtstoasc'
+                stream = ffmpeg.input(concat_file, format='concat', safe=0).output(output_path, **options)
+                self._run(stream, task_id, total_duration, 'Menggabungkan video...', start=85, end=95)
+                conversion = 'partial_remux' if len(mismatched) < len(video_paths) else 'transcode'
             
-            update_progress(task_id, 100, 'completed', 'Video berhasil digabungkan!')
+            logger.info(f"Video merge {task_id}: {len(video_paths)} clips, {len(mismatched)} normalized")
+            record_output(task_id, output_path)
+            update_progress(task_id, 100, 'completed', 'Video berhasil digabungkan!',
+                            conversion=conversion, normalized=len(mismatched))
             return output_path
             
         except Exception as e:
             logger.error(f"Video merge failed: {e}")
             update_progress(task_id, 0, 'error', f'Penggabungan video gagal: {str(e)}')
             return None
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _normalize_for_merge(self, video_paths: List[str], task_id: str, probes: List[Dict],
+                             durations: List[Optional[float]], target: Dict, mismatched: List[int],
+                             work_dir: str) -> List[str]:
+        """Bring every clip into the target format as MPEG-TS pieces, encoding only mismatched clips
+
+        TS carries the codec parameters in-band, so copied and re-encoded pieces
+        concatenate cleanly. Returns the piece paths in clip order.
+        """
+        pieces = [os.path.join(work_dir, f'clip_{index:03d}.ts') for index in range(len(video_paths))]
+        width, height = target['width'], target['height']
+        workers = max(1, min(len(mismatched), _available_cores()))
+        encode_options = {'vcodec': 'libx264', 'crf': 20, 'pix_fmt': target['pix_fmt'] or 'yuv420p', 'f': 'mpegts'}
+        clip_threads = max(1, _available_cores() // workers)
+        profile = self._encoder_profile(target)
+        if profile:
+            encode_options['profile:v'] = profile
+        if target['audio_codec']:
+            encode_options.update(acodec='aac', ar=target['sample_rate'], ac=target['channels'])
+        
+        # Combined progress of the clips being encoded
+        encode_total = sum(durations[index] or 0 for index in mismatched)
+        encoded_seconds = {}
+        progress_lock = threading.Lock()
+        last_update = [0.0]
+        
+        def report(index: int, out_time: float, speed: Optional[float]):
+            with progress_lock:
+                encoded_seconds[index] = out_time
+                now = time.time()
+                if not encode_total or now - last_update[0] < PROGRESS_UPDATE_INTERVAL:
+                    return
+                last_update[0] = now
+                fraction = min(sum(encoded_seconds.values()) / encode_total, 1.0)
+            update_progress(task_id, int(15 + 70 * fraction), 'processing',
+                            f'Menyesuaikan {len(mismatched)} video {int(fraction * 100)}%')
+        
+        def normalize(index: int):
+            source = ffmpeg.input(video_paths[index])
+            # Fit inside the target frame, letterboxed, at the target frame rate
+            video = (source.video
+                     .filter('scale', width, height, force_original_aspect_ratio='decrease')
+                     .filter('pad', width, height, '(ow-iw)/2', '(oh-ih)/2')
+                     .filter('setsar', 1)
+                     .filter('fps', target['frame_rate'] or 30))
+            streams = [video]
+            options = dict(encode_options)
+            if target['audio_codec']:
+                if self._first_stream(probes[index], 'audio'):
+                    streams.append(source['a:0'])
+                else:
+                    # Silent track so every piece has the same streams
+                    streams.append(ffmpeg.input(f"anullsrc=r={target['sample_rate']}:cl=stereo", f='lavfi').audio)
+                    options['shortest'] = None
+            self._run(ffmpeg.output(*streams, pieces[index], **options), task_id, None, '',
+                      on_progress=lambda out_time, speed: report(index, out_time, speed), threads=clip_threads)
+        
+        def remux(index: int):
+            # Matching clips are only rewrapped, with the same streams the signature describes
+            source = ffmpeg.input(video_paths[index])
+            streams = [source['v:0'], source['a:0']] if target['audio_codec'] else [source['v:0']]
+            self._run(ffmpeg.output(*streams, pieces[index], c='copy', f='mpegts'),
+                      task_id, None, '', on_progress=lambda out_time, speed: None, threads=1)
+        
+        update_progress(task_id, 15, 'processing', f'Menyesuaikan {len(mismatched)} video...')
+        pool = ThreadPoolExecutor(max_workers=workers + 1, thread_name_prefix=f'merge-{task_id}')
+        try:
+            futures = [pool.submit(normalize if index in mismatched else remux, index)
+                       for index in range(len(video_paths))]
+            for future in futures:
+                future.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
+        return pieces
     
     def split_video(self, input_path: str, task_id: str, start_time: str, 
-                   duration: str) -> Optional[str]:
+                   duration: str, mode: str = 'copy') -> Optional[str]:
         """Split/trim video by time"""
+        outputs = self.split_video_ranges(input_path, task_id, [(start_time, duration)], mode)
+        return outputs[0] if outputs else None
+
+    def split_video_ranges(self, input_path: str, task_id: str, ranges: List[Tuple[str, str]],
+                           mode: str = 'copy') -> Optional[List[str]]:
+        """Cut one clip per (start_time, duration) range
+
+        mode 'copy' cuts at the nearest keyframes by stream copy; 'smart' cuts
+        exactly, re-encoding only the partial GOPs at each cut point.
+        """
         try:
-            update_progress(task_id, 20, 'processing', 'Memotong video...')
+            update_progress(task_id, 10, 'processing', 'Memotong video...')
             
-            output_filename = f'split_video_{task_id}.mp4'
-            output_path = os.path.join(self.output_folder, output_filename)
+            probe = self._probe(input_path)
+            total = self._probe_duration(input_path, probe)
             
-            update_progress(task_id, 60, 'processing', 'Memproses pemotongan...')
+            # Expected clip lengths: the requested duration, capped by what is left after the start
+            cuts = []
+            for start_time, duration in ranges:
+                start = parse_time(start_time) or 0.0
+                length = parse_time(duration)
+                if total is not None:
+                    remaining = max(total - start, 0.0)
+                    length = min(length, remaining) if length else remaining
+                if not length:
+                    raise ValueError(f'Rentang kosong mulai {start_time}')
+                cuts.append((start, start + length))
             
-            (
-                ffmpeg
-                .input(input_path, ss=start_time, t=duration)
-                .output(output_path, c='copy')
-                .overwrite_output()
-                .run(quiet=True)
-            )
+            keyframes = None
+            if mode == 'smart':
+                update_progress(task_id, 12, 'processing', 'Membaca indeks keyframe...')
+                keyframes = self._keyframe_times(input_path, probe)
             
-            update_progress(task_id, 100, 'completed', 'Video berhasil dipotong!')
-            return output_path
+            outputs = []
+            lengths = [end - start for start, end in cuts]
+            done = 0.0
+            for index, (start, end) in enumerate(cuts):
+                suffix = f'_{index + 1}' if len(cuts) > 1 else ''
+                output_path = os.path.join(self.output_folder, f'split_video_{task_id}{suffix}.mp4')
+                # Progress share of this clip
+                low = 15 + int(80 * done / sum(lengths))
+                done += lengths[index]
+                high = 15 + int(80 * done / sum(lengths))
+                label = f'Memproses potongan {index + 1}/{len(cuts)}...' if len(cuts) > 1 else 'Memproses pemotongan...'
+                
+                if mode == 'smart':
+                    self._smart_cut(input_path, task_id, probe, keyframes, start, end, total, output_path,
+                                    label, low, high)
+                else:
+                    stream = ffmpeg.input(input_path, ss=round(start, 6), t=round(end - start, 6))
+                    stream = stream.output(output_path, c='copy')
+                    self._run(stream, task_id, end - start, label, start=low, end=high)
+                record_output(task_id, output_path)
+                outputs.append(output_path)
+            
+            update_progress(task_id, 100, 'completed',
+                            'Video berhasil dipotong!' if len(cuts) == 1 else f'{len(cuts)} potongan video berhasil dibuat!',
+                            cut_mode=mode, clips=len(outputs))
+            return outputs
             
         except Exception as e:
             logger.error(f"Video split failed: {e}")
             update_progress(task_id, 0, 'error', f'Pemotongan video gagal: {str(e)}')
             return None
+
+    def _keyframe_times(self, input_path: str, probe: Optional[Dict]) -> List[float]:
+        """Keyframe times of the first video stream, relative to the file start
+
+        Read from packet flags, so nothing is decoded.
+        """
+        result = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+             '-of', 'csv=p=0', input_path],
+            capture_output=True, text=True, check=True
+        )
+        # Input seeking (-ss) is relative to the container start time
+        offset = _to_float((probe or {}).get('format', {}).get('start_time')) or 0.0
+        times = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            pts = _to_float(pts_time)
+            if pts is not None and 'K' in flags:
+                times.append(pts - offset)
+        return sorted(times)
+
+    def _smart_cut(self, input_path: str, task_id: str, probe: Optional[Dict], keyframes: List[float],
+                   start: float, end: float, total: Optional[float], output_path: str, message: str,
+                   low: int, high: int):
+        """Cut [start, end) exactly: encode the partial GOPs at both ends, copy the GOPs in between"""
+        source = self._first_stream(probe, 'video') or {}
+        encoder = SMART_CUT_ENCODERS.get(source.get('codec_name'))
+        first_key = next((k for k in keyframes if k >= start - KEYFRAME_TOLERANCE), None)
+        last_key = next((k for k in reversed(keyframes) if k <= end + KEYFRAME_TOLERANCE), None)
+        reaches_end = total is not None and end >= total - KEYFRAME_TOLERANCE
+        
+        has_gop = (first_key is not None and first_key < end - KEYFRAME_TOLERANCE
+                   and (reaches_end or last_key > first_key))
+        
+        # (action, from, to) pieces of the video stream
+        if not encoder or not has_gop:
+            # No complete GOP inside the range (or a codec we cannot match): encode it all
+            pieces = [('encode', start, end)]
+            encoder = encoder or 'libx264'
+        else:
+            pieces = []
+            if first_key - start > KEYFRAME_TOLERANCE:
+                pieces.append(('encode', start, first_key))
+            if reaches_end:
+                # Nothing follows the last GOP, so it can be copied to the end
+                pieces.append(('copy', first_key, end))
+            else:
+                if last_key > first_key:
+                    pieces.append(('copy', first_key, last_key))
+                if end - last_key > KEYFRAME_TOLERANCE:
+                    pieces.append(('encode', last_key, end))
+        
+        # Boundary encodes follow the source's codec, profile and pixel format so the pieces join cleanly
+        encode_options = {'vcodec': encoder, 'crf': 18}
+        if source.get('pix_fmt'):
+            encode_options['pix_fmt'] = source['pix_fmt']
+        profile = self._encoder_profile(source)
+        if profile:
+            encode_options['profile:v'] = profile
+        
+        work_dir = os.path.join(self.output_folder, f'smartcut_{task_id}')
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            piece_paths = []
+            position = low
+            for index, (action, piece_start, piece_end) in enumerate(pieces):
+                piece_path = os.path.join(work_dir, f'piece_{index:02d}.ts')
+                if action == 'copy':
+                    # Seek just past the keyframe's rounded timestamp so the copy starts on it
+                    stream = ffmpeg.input(input_path, ss=round(piece_start + KEYFRAME_TOLERANCE / 2, 6),
+                                          t=round(piece_end - piece_start, 6)).video
+                    stream = ffmpeg.output(stream, piece_path, vcodec='copy', f='mpegts')
+                else:
+                    stream = ffmpeg.input(input_path, ss=round(piece_start, 6), t=round(piece_end - piece_start, 6)).video
+                    stream = ffmpeg.output(stream, piece_path, f='mpegts', **encode_options)
+                piece_high = low + int((high - low) * (piece_end - start) / (end - start))
+                self._run(stream, task_id, piece_end - piece_start, message, start=position, end=piece_high)
+                position = piece_high
+                piece_paths.append(piece_path)
+            logger.info(f"Smart cut {task_id} {start:.3f}-{end:.3f}s: "
+                        + ', '.join(f'{action} {a:.3f}-{b:.3f}' for action, a, b in pieces))
+            
+            list_path = os.path.join(work_dir, 'pieces.txt')
+            with open(list_path, 'w') as f:
+                for path in piece_paths:
+                    f.write(f"file '{os.path.basename(path)}'\n")
+            streams = [ffmpeg.input(list_path, f='concat', safe=0).video]
+            if self._first_stream(probe, 'audio'):
+                # Audio frames are short, so the whole range is cut exactly by re-encoding it
+                audio_path = os.path.join(work_dir, 'audio.m4a')
+                audio = ffmpeg.input(input_path, ss=round(start, 6), t=round(end - start, 6)).audio
+                self._run(ffmpeg.output(audio, audio_path, acodec='aac', audio_bitrate='192k'), task_id, None, message)
+                streams.append(ffmpeg.input(audio_path).audio)
+            self._run(ffmpeg.output(*streams, output_path, c='copy'), task_id, None, message)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
     
     def add_subtitles(self, video_path: str, subtitle_path: str, task_id: str) -> Optional[str]:
         """Add subtitles to video"""
         try:
-            update_progress(task_id, 20, 'processing', 'Menambahkan subtitle...')
+            update_progress(task_id, 10, 'processing', 'Menambahkan subtitle...')
             
             output_filename = f'subtitled_video_{task_id}.mp4'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            update_progress(task_id, 60, 'processing', 'Memproses subtitle...')
-            
             video = ffmpeg.input(video_path)
             subtitle = ffmpeg.input(subtitle_path)
             
-            (
-                ffmpeg
-                .output(video, subtitle, output_path, vcodec='copy', acodec='copy', scodec='mov_text')
-                .overwrite_output()
-                .run(quiet=True)
-            )
+            stream = ffmpeg.output(video, subtitle, output_path, vcodec='copy', acodec='copy', scodec='mov_text')
+            self._run(stream, task_id, self._probe_duration(video_path), 'Memproses subtitle...')
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'Subtitle berhasil ditambahkan!')
             return output_path
             
@@ -259,42 +1192,53 @@ class FFmpegProcessor:
             update_progress(task_id, 0, 'error', f'Penambahan subtitle gagal: {str(e)}')
             return None
     
-    def get_media_info(self, file_path: str) -> Optional[Dict]:
+    def get_media_info(self, file_path: str, content_hash: Optional[str] = None) -> Optional[Dict]:
         """Get comprehensive media information"""
         try:
-            probe = ffmpeg.probe(file_path)
-            
-            info = {
-                'duration': float(probe['format']['duration']),
-                'size': int(probe['format']['size']),
-                'bitrate': int(probe['format']['bit_rate']),
-                'format_name': probe['format']['format_name'],
-                'streams': []
+            return self._summarize_probe(probe_cache.probe(file_path, content_hash))
+        except Exception as e:
+            logger.error(f"Failed to get media info: {e}")
+            return None
+
+    def get_cached_media_info(self, content_hash: Optional[str]) -> Optional[Dict]:
+        """Media information for content probed before, without touching the file"""
+        if not content_hash:
+            return None
+        probe = probe_cache.lookup(content_hash)
+        try:
+            return self._summarize_probe(probe) if probe else None
+        except Exception as e:
+            logger.error(f"Failed to read cached media info: {e}")
+            return None
+
+    def _summarize_probe(self, probe: Dict) -> Dict:
+        info = {
+            'duration': float(probe['format']['duration']),
+            'size': int(probe['format']['size']),
+            'bitrate': int(probe['format']['bit_rate']),
+            'format_name': probe['format']['format_name'],
+            'streams': []
+        }
+        
+        for stream in probe['streams']:
+            stream_info = {
+                'index': stream['index'],
+                'codec_type': stream['codec_type'],
+                'codec_name': stream['codec_name'],
             }
             
-            for stream in probe['streams']:
-                stream_info = {
-                    'index': stream['index'],
-                    'codec_type': stream['codec_type'],
-                    'codec_name': stream['codec_name'],
-                }
+            if stream['codec_type'] == 'video':
+                stream_info.update({
+                    'width': stream.get('width'),
+                    'height': stream.get('height'),
+                    'fps': self._safe_eval_fraction(stream.get('r_frame_rate', '0/1')),
+                })
+            elif stream['codec_type'] == 'audio':
+                stream_info.update({
+                    'sample_rate': stream.get('sample_rate'),
+                    'channels': stream.get('channels'),
+                })
                 
-                if stream['codec_type'] == 'video':
-                    stream_info.update({
-                        'width': stream.get('width'),
-                        'height': stream.get('height'),
-                        'fps': self._safe_eval_fraction(stream.get('r_frame_rate', '0/1')),
-                    })
-                elif stream['codec_type'] == 'audio':
-                    stream_info.update({
-                        'sample_rate': stream.get('sample_rate'),
-                        'channels': stream.get('channels'),
-                    })
-                    
-                info['streams'].append(stream_info)
-            
-            return info
-            
-        except Exception as e:
-            logger.error(f"Failed to get media info: {e}")
-            return None
\ No newline at end of file
+            info['streams'].append(stream_info)
+        
+        return info
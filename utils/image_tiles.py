@@ -0,0 +1,90 @@
+# Strip-wise processing of large images with pixel and memory budgets
+import logging
+from typing import Callable, List, Optional
+from PIL import Image
+from .config import IMAGE_MAX_PIXELS, IMAGE_MEMORY_BUDGET, IMAGE_STRIP_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Pillow's own decompression bomb check (warning above, error above twice this) follows ours
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+# Bytes per pixel in memory; Pillow stores multi-band modes (RGB too) as 4 bytes
+PIXEL_BYTES = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'I;16B': 2, 'I;16L': 2}
+
+class ImageBudgetError(ValueError):
+    """An image too large to process within the configured limits; the message is shown to the user"""
+
+def pixel_bytes(mode: str) -> int:
+    return PIXEL_BYTES.get(mode, 4)
+
+def open_image(path: str) -> Image.Image:
+    """Image.open that refuses images above IMAGE_MAX_PIXELS (only the header is read)"""
+    try:
+        img = Image.open(path)
+    except Image.DecompressionBombError:
+        raise ImageBudgetError(f'Gambar terlalu besar (maksimum {IMAGE_MAX_PIXELS:,} piksel)')
+    if img.width * img.height > IMAGE_MAX_PIXELS:
+        img.close()
+        raise ImageBudgetError(
+            f'Gambar terlalu besar: {img.width}x{img.height} (maksimum {IMAGE_MAX_PIXELS:,} piksel)'
+        )
+    return img
+
+def check_memory(img: Image.Image, out_mode: Optional[str] = None):
+    """Refuse an image whose decode plus output (when out_mode differs) exceeds IMAGE_MEMORY_BUDGET"""
+    pixels = img.width * img.height
+    needed = pixels * pixel_bytes(img.mode) + 3 * IMAGE_STRIP_BYTES
+    if out_mode and out_mode != img.mode:
+        needed += pixels * pixel_bytes(out_mode)
+    if needed > IMAGE_MEMORY_BUDGET:
+        raise ImageBudgetError(
+            f'Gambar {img.width}x{img.height} membutuhkan sekitar {needed // (1024 * 1024)} MB memori '
+            f'(batas {IMAGE_MEMORY_BUDGET // (1024 * 1024)} MB)'
+        )
+
+def strip_rows(width: int, mode: str, overlap: int = 0) -> int:
+    """Rows per strip so one strip stays near IMAGE_STRIP_BYTES (never fewer than the overlap)"""
+    return max(1, overlap, IMAGE_STRIP_BYTES // max(1, width * pixel_bytes(mode)))
+
+def strip_histogram(img: Image.Image, mode: str) -> List[int]:
+    """Histogram of img converted to mode, without converting the whole image at once"""
+    histogram = None
+    rows = strip_rows(img.width, mode)
+    for top in range(0, img.height, rows):
+        strip = img.crop((0, top, img.width, min(img.height, top + rows))).convert(mode).histogram()
+        histogram = strip if histogram is None else [a + b for a, b in zip(histogram, strip)]
+    return histogram or []
+
+def process_strips(img: Image.Image, operation: Callable[[Image.Image], Image.Image],
+                   out_mode: Optional[str] = None, overlap: int = 0,
+                   on_strip: Optional[Callable[[int, int], None]] = None) -> Image.Image:
+    """Run operation on horizontal strips of img and assemble the result
+
+    The result keeps img's size. With out_mode unset (or equal to img.mode)
+    the strips are written back into img itself, so only a few strips exist
+    beside the decoded image. overlap extra rows above and below each strip
+    are given to operation and trimmed afterwards, enough for a kernel of
+    size 2 * overlap + 1 to see the same neighbours as on the whole image.
+    """
+    in_place = out_mode in (None, img.mode)
+    target = img if in_place else Image.new(out_mode, img.size)
+    rows = strip_rows(img.width, img.mode if in_place else out_mode, overlap)
+    total = -(-img.height // rows)
+    pending = None
+    for index, top in enumerate(range(0, img.height, rows)):
+        bottom = min(img.height, top + rows)
+        window_top = max(0, top - overlap)
+        window = img.crop((0, window_top, img.width, min(img.height, bottom + overlap)))
+        # Written back only now: its last rows were still needed as this window's overlap
+        if pending:
+            target.paste(*pending)
+        result = operation(window)
+        if overlap:
+            result = result.crop((0, top - window_top, img.width, bottom - window_top))
+        pending = (result, (0, top))
+        if on_strip:
+            on_strip(index + 1, total)
+    if pending:
+        target.paste(*pending)
+    return target
@@ -1,19 +1,300 @@
 # Image processing wrapper using Pillow and ImageMagick
 import os
+import json
+import shutil
 import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PIL import Image, ImageFilter, ImageEnhance, ImageOps
 import logging
-from typing import Optional, List, Tuple, Dict
+from typing import Callable, Optional, List, Tuple, Dict
 from .common import update_progress
+from .task_manifest import record_output
+from .resource_governor import thread_budget
+from .image_tiles import open_image, check_memory, process_strips, strip_histogram
 
 logger = logging.getLogger(__name__)
 
+RESAMPLE_METHODS = {
+    'lanczos': Image.Resampling.LANCZOS,
+    'bicubic': Image.Resampling.BICUBIC,
+    'bilinear': Image.Resampling.BILINEAR,
+    'nearest': Image.Resampling.NEAREST,
+}
+# Downscales first shrink cheaply (JPEG DCT scaling, then reduce()) to at most this
+# factor above the target; the final resample from there is visually identical
+REDUCING_GAP = 2.0
+FILTERS = {
+    'blur': ImageFilter.BLUR,
+    'sharpen': ImageFilter.SHARPEN,
+    'emboss': ImageFilter.EMBOSS,
+    'contour': ImageFilter.CONTOUR,
+    'edge_enhance': ImageFilter.EDGE_ENHANCE,
+}
+FILTER_TYPES = set(FILTERS) | {'grayscale', 'sepia', 'none'}
+# Output extension -> Pillow format name
+SAVE_FORMATS = {'jpg': 'JPEG', 'jpeg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP', 'gif': 'GIF', 'bmp': 'BMP',
+                'tiff': 'TIFF'}
+BATCH_OPERATIONS = ('resize', 'enhance', 'filter')
+# Formats offered for srcset variants
+RESPONSIVE_FORMATS = ('jpg', 'webp', 'png')
+# Modes the fused enhancement handles (P is converted to RGBA first)
+ENHANCE_MODES = ('RGB', 'RGBA', 'L', 'LA')
+# ITU-R 601 weights Pillow uses for RGB -> L
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+
+# Single-image steps shared by the per-operation methods and batch workers.
+# Module-level so process pool workers can run them.
+
+def flatten_alpha(img: Image.Image) -> Image.Image:
+    """Composite transparent images onto white (for formats without alpha)"""
+    if img.mode not in ('RGBA', 'LA', 'P'):
+        return img
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
+    return background
+
+def fit_size(size: Tuple[int, int], width: int, height: int, maintain_aspect: bool = True) -> Tuple[int, int]:
+    """Target size, fitted inside width x height when keeping the aspect ratio"""
+    if not maintain_aspect:
+        return width, height
+    aspect_ratio = size[0] / size[1]
+    if width / height > aspect_ratio:
+        # Height is the limiting factor
+        return int(height * aspect_ratio), height
+    # Width is the limiting factor
+    return width, int(width / aspect_ratio)
+
+def resize_op(img: Image.Image, width: int, height: int, maintain_aspect: bool = True,
+              resize_method: str = 'lanczos') -> Image.Image:
+    """Resize; large downscales of a not yet decoded JPEG only decode at a reduced scale"""
+    new_size = fit_size(img.size, width, height, maintain_aspect)
+    resample = RESAMPLE_METHODS.get(resize_method, Image.Resampling.LANCZOS)
+    if new_size[0] >= img.width or new_size[1] >= img.height or resample == Image.Resampling.NEAREST:
+        return img.resize(new_size, resample)
+    
+    # libjpeg decodes at 1/2, 1/4 or 1/8 scale, never below the requested size (no-op once loaded)
+    if img.format == 'JPEG' and img.mode in ('RGB', 'L'):
+        img.draft(img.mode, (int(new_size[0] * REDUCING_GAP), int(new_size[1] * REDUCING_GAP)))
+    # reduce() box-averages by an integer factor, then the chosen filter does the rest
+    return img.resize(new_size, resample, reducing_gap=REDUCING_GAP)
+
+def _clip_level(value: float) -> int:
+    # Pillow's blend truncates and clips to 0..255
+    return 0 if value <= 0 else 255 if value >= 255 else int(value)
+
+def _enhance_chain(img: Image.Image, brightness: float, contrast: float, saturation: float,
+                   sharpness: float) -> Image.Image:
+    # One ImageEnhance pass per factor; modes the fused path does not handle (CMYK, I, F)
+    for enhancer, factor in ((ImageEnhance.Brightness, brightness), (ImageEnhance.Contrast, contrast),
+                             (ImageEnhance.Color, saturation), (ImageEnhance.Sharpness, sharpness)):
+        if factor != 1.0:
+            img = enhancer(img).enhance(factor)
+    return img
+
+def _tone_table(histogram: Optional[List[int]], bands: int, brightness: float, contrast: float) -> List[int]:
+    """Brightness then contrast as one lookup table, like ImageEnhance would apply them
+
+    histogram (of the unadjusted image) is only needed for contrast.
+    """
+    table = [_clip_level(level * brightness) for level in range(256)]
+    if contrast == 1.0:
+        return table
+    # Contrast pivots on the mean gray level of the brightened image; the band
+    # histograms give it without making the brightened copy
+    pixels = max(1, sum(histogram[:256]))
+    means = [sum(count * table[level] for level, count in enumerate(histogram[band * 256:(band + 1) * 256])) / pixels
+             for band in range(bands)]
+    gray = means[0] if bands == 1 else sum(weight * mean for weight, mean in zip(LUMA_WEIGHTS, means))
+    mean = int(gray + 0.5)
+    return [_clip_level(mean + contrast * (level - mean)) for level in table]
+
+def enhance_op(img: Image.Image, brightness: float = 1.0, contrast: float = 1.0,
+               saturation: float = 1.0, sharpness: float = 1.0, flatten: bool = False) -> Image.Image:
+    """Brightness, contrast, saturation and sharpness with one full-image pass each at most
+
+    Matches chained ImageEnhance within rounding: brightness and contrast are
+    one lookup table, saturation one color matrix and sharpness one 3x3
+    kernel. With flatten, transparency goes onto white using the alpha band
+    already split off for those passes.
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA')
+    if img.mode not in ENHANCE_MODES:
+        img = _enhance_chain(img, brightness, contrast, saturation, sharpness)
+        return flatten_alpha(img) if flatten else img
+    
+    bands = 1 if img.mode in ('L', 'LA') else 3
+    table = None
+    if brightness != 1.0 or contrast != 1.0:
+        table = _tone_table(img.histogram() if contrast != 1.0 else None, bands, brightness, contrast)
+    return _enhance_bands(img, table, bands, saturation, sharpness, flatten)
+
+def _enhance_bands(img: Image.Image, table: Optional[List[int]], bands: int, saturation: float,
+                   sharpness: float, flatten: bool) -> Image.Image:
+    # The per-pixel part of enhance_op, also run strip by strip; img is in one of ENHANCE_MODES
+    if table:
+        # Alpha passes through unchanged
+        img = img.point(table * bands + list(range(256)) * (len(img.getbands()) - bands))
+    has_alpha = img.mode in ('RGBA', 'LA')
+    if (saturation == 1.0 or bands == 1) and sharpness == 1.0 and not (flatten and has_alpha):
+        return img
+    
+    # Matrix and kernel run on the color bands only; alpha is put back afterwards
+    alpha = img.getchannel('A') if has_alpha else None
+    color = img.convert('RGB' if bands == 3 else 'L') if alpha is not None else img
+    if saturation != 1.0 and bands == 3:
+        # Blend of each band with the gray level (ImageEnhance.Color) as a color matrix
+        matrix = []
+        for band in range(3):
+            row = [(1 - saturation) * weight for weight in LUMA_WEIGHTS]
+            row[band] += saturation
+            matrix += row + [0]
+        color = color.convert('RGB', tuple(matrix))
+    if sharpness != 1.0:
+        # ImageEnhance.Sharpness blends with SMOOTH; the blend folds into the kernel
+        size, scale, _, weights = ImageFilter.SMOOTH.filterargs
+        kernel = [(1 - sharpness) * weight / scale for weight in weights]
+        kernel[len(kernel) // 2] += sharpness
+        color = color.filter(ImageFilter.Kernel(size, kernel, scale=1))
+    if alpha is None:
+        return color
+    if flatten:
+        # Composite with the alpha split off above, onto white
+        background = Image.new(color.mode, color.size, 255 if bands == 1 else (255, 255, 255))
+        background.paste(color, mask=alpha)
+        return background
+    color.putalpha(alpha)
+    return color
+
+def filter_op(img: Image.Image, filter_type: str) -> Image.Image:
+    if filter_type in FILTERS:
+        return img.filter(FILTERS[filter_type])
+    if filter_type == 'grayscale':
+        return ImageOps.grayscale(img)
+    if filter_type == 'sepia':
+        return ImageOps.colorize(ImageOps.grayscale(img), '#704214', '#C0A882')
+    return img  # No filter
+
+def save_mode(mode: str, output_format: str) -> str:
+    """Mode an image of the given mode is stored in by save_image"""
+    output_format = output_format.lower()
+    if output_format in ('jpg', 'jpeg') and mode in ('RGBA', 'LA', 'P'):
+        return 'RGB'
+    if output_format == 'png' and mode not in ('RGBA', 'RGB', 'P'):
+        return 'RGBA'
+    return mode
+
+def convert_for_save(img: Image.Image, output_format: str) -> Image.Image:
+    """Flatten or convert modes output_format cannot store"""
+    target = save_mode(img.mode, output_format)
+    if target == img.mode:
+        return img
+    return flatten_alpha(img) if output_format.lower() in ('jpg', 'jpeg') else img.convert(target)
+
+def save_image(img: Image.Image, output_path: str, output_format: str, quality: int = 95):
+    """Save in output_format, flattening or converting modes the format cannot store"""
+    output_format = output_format.lower()
+    img = convert_for_save(img, output_format)
+    
+    save_kwargs = {}
+    if output_format in ('jpg', 'jpeg'):
+        save_kwargs['quality'] = quality
+        save_kwargs['optimize'] = True
+    elif output_format == 'png':
+        save_kwargs['optimize'] = True
+    elif output_format == 'webp':
+        save_kwargs['quality'] = quality
+        save_kwargs['method'] = 6
+    
+    img.save(output_path, format=SAVE_FORMATS.get(output_format, output_format.upper()), **save_kwargs)
+
+def apply_operations(img: Image.Image, operations: List[Dict]) -> Image.Image:
+    """Run a chain of {'op': 'resize'|'enhance'|'filter', ...} steps on a decoded image"""
+    for operation in operations:
+        params = {name: value for name, value in operation.items() if name != 'op'}
+        if operation['op'] == 'resize':
+            img = resize_op(img, **params)
+        elif operation['op'] == 'enhance':
+            img = enhance_op(img, **params)
+        elif operation['op'] == 'filter':
+            img = filter_op(img, **params)
+        else:
+            raise ValueError(f"Unknown operation: {operation['op']}")
+    return img
+
+def process_chain(input_path: str, output_path: str, operations: List[Dict], output_format: str,
+                  quality: int = 95) -> str:
+    """Decode once, apply every operation, encode once (batch worker entry point)"""
+    # Not loaded up front: a leading resize can decode a JPEG at reduced scale
+    with open_image(input_path) as img:
+        save_image(apply_operations(img, operations), output_path, output_format, quality)
+    return output_path
+
+# Whole-file variants for single uploads of any size: the decode is checked
+# against the budgets, everything after it runs strip by strip (in place when
+# the mode does not change) instead of on full-size copies.
+
+def convert_strips(img: Image.Image, output_format: str,
+                   on_strip: Optional[Callable[[int, int], None]] = None) -> Image.Image:
+    """convert_for_save for images of any size"""
+    out_mode = save_mode(img.mode, output_format)
+    check_memory(img, out_mode)
+    if out_mode == img.mode:
+        return img
+    return process_strips(img, lambda strip: convert_for_save(strip, output_format), out_mode,
+                          on_strip=on_strip)
+
+def filter_strips(img: Image.Image, filter_type: str, output_format: str,
+                  on_strip: Optional[Callable[[int, int], None]] = None) -> Image.Image:
+    """filter_op then convert_for_save, for images of any size"""
+    filtered_mode = {'grayscale': 'L', 'sepia': 'RGB'}.get(filter_type, img.mode)
+    out_mode = save_mode(filtered_mode, output_format)
+    check_memory(img, out_mode)
+    # Kernel filters see neighbours up to half their size away
+    overlap = FILTERS[filter_type].filterargs[0][1] // 2 if filter_type in FILTERS else 0
+    return process_strips(img, lambda strip: convert_for_save(filter_op(strip, filter_type), output_format),
+                          out_mode, overlap, on_strip)
+
+def enhance_strips(img: Image.Image, brightness: float = 1.0, contrast: float = 1.0,
+                   saturation: float = 1.0, sharpness: float = 1.0,
+                   on_strip: Optional[Callable[[int, int], None]] = None) -> Image.Image:
+    """enhance_op(..., flatten=True) for images of any size"""
+    work_mode = 'RGBA' if img.mode == 'P' else img.mode
+    if work_mode not in ENHANCE_MODES:
+        check_memory(img, 'RGB')
+        return enhance_op(img, brightness, contrast, saturation, sharpness, flatten=True)
+    
+    bands = 1 if work_mode in ('L', 'LA') else 3
+    out_mode = 'L' if bands == 1 else 'RGB'
+    check_memory(img, out_mode)
+    table = None
+    if brightness != 1.0 or contrast != 1.0:
+        histogram = None
+        if contrast != 1.0:
+            histogram = img.histogram() if img.mode == work_mode else strip_histogram(img, work_mode)
+        # The contrast pivot is global, so the table is built once for all strips
+        table = _tone_table(histogram, bands, brightness, contrast)
+    
+    def operation(strip: Image.Image) -> Image.Image:
+        if strip.mode != work_mode:
+            strip = strip.convert(work_mode)
+        return _enhance_bands(strip, table, bands, saturation, sharpness, flatten=True)
+    # Sharpness is a 3x3 kernel
+    return process_strips(img, operation, out_mode, 1 if sharpness != 1.0 else 0, on_strip)
+
 class ImageProcessor:
     """Comprehensive image processing with Pillow and ImageMagick"""
     
     def __init__(self, output_folder: str):
         self.output_folder = output_folder
         
+    def _strip_progress(self, task_id: str, message: str) -> Callable[[int, int], None]:
+        """Progress from 20 to 60 percent while the strips of a large image are processed"""
+        return lambda done, total: update_progress(task_id, 20 + 40 * done // total, 'processing', message)
+    
     def convert_format(self, input_path: str, task_id: str, output_format: str = 'jpg',
                       quality: int = 95) -> Optional[str]:
         """Convert image format with quality control"""
@@ -23,32 +304,14 @@ class ImageProcessor:
             output_filename = f'converted_image_{task_id}.{output_format.lower()}'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            with Image.open(input_path) as img:
-                # Handle transparency for JPEG
-                if output_format.lower() in ['jpg', 'jpeg'] and img.mode in ('RGBA', 'LA', 'P'):
-                    # Create white background
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                elif output_format.lower() == 'png' and img.mode not in ('RGBA', 'RGB', 'P'):
-                    img = img.convert('RGBA')
-                
+            with open_image(input_path) as img:
+                # Transparency is flattened for JPEG
+                converted = convert_strips(img, output_format,
+                                           self._strip_progress(task_id, 'Mengonversi format gambar...'))
                 update_progress(task_id, 60, 'processing', 'Menyimpan gambar...')
-                
-                save_kwargs = {}
-                if output_format.lower() in ['jpg', 'jpeg']:
-                    save_kwargs['quality'] = quality
-                    save_kwargs['optimize'] = True
-                elif output_format.lower() == 'png':
-                    save_kwargs['optimize'] = True
-                elif output_format.lower() == 'webp':
-                    save_kwargs['quality'] = quality
-                    save_kwargs['method'] = 6
-                
-                img.save(output_path, format=output_format.upper(), **save_kwargs)
+                save_image(converted, output_path, output_format, quality)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Gambar berhasil dikonversi ke {output_format}!')
             return output_path
             
@@ -66,48 +329,14 @@ class ImageProcessor:
             output_filename = f'resized_image_{task_id}.jpg'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            with Image.open(input_path) as img:
-                original_width, original_height = img.size
-                
-                if maintain_aspect:
-                    # Calculate aspect ratio
-                    aspect_ratio = original_width / original_height
-                    
-                    if width / height > aspect_ratio:
-                        # Height is the limiting factor
-                        new_height = height
-                        new_width = int(height * aspect_ratio)
-                    else:
-                        # Width is the limiting factor
-                        new_width = width
-                        new_height = int(width / aspect_ratio)
-                else:
-                    new_width, new_height = width, height
-                
-                # Choose resampling method
-                resample_methods = {
-                    'lanczos': Image.Resampling.LANCZOS,
-                    'bicubic': Image.Resampling.BICUBIC,
-                    'bilinear': Image.Resampling.BILINEAR,
-                    'nearest': Image.Resampling.NEAREST,
-                }
-                
-                resample = resample_methods.get(resize_method, Image.Resampling.LANCZOS)
-                
+            with open_image(input_path) as img:
                 update_progress(task_id, 60, 'processing', 'Memproses resize...')
                 
-                resized_img = img.resize((new_width, new_height), resample)
-                
-                # Convert to RGB if necessary for JPEG
-                if resized_img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', resized_img.size, (255, 255, 255))
-                    if resized_img.mode == 'P':
-                        resized_img = resized_img.convert('RGBA')
-                    background.paste(resized_img, mask=resized_img.split()[-1] if resized_img.mode == 'RGBA' else None)
-                    resized_img = background
-                
-                resized_img.save(output_path, 'JPEG', quality=95, optimize=True)
+                resized_img = resize_op(img, width, height, maintain_aspect, resize_method)
+                new_width, new_height = resized_img.size
+                save_image(resized_img, output_path, 'jpg', 95)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Gambar berhasil diubah ke ukuran {new_width}x{new_height}!')
             return output_path
             
@@ -116,44 +345,54 @@ class ImageProcessor:
             update_progress(task_id, 0, 'error', f'Resize gambar gagal: {str(e)}')
             return None
     
-    def batch_process(self, input_paths: List[str], task_id: str, operation: str,
-                     **kwargs) -> List[str]:
-        """Batch process multiple images"""
+    def batch_process(self, input_paths: List[str], task_id: str, operations: List[Dict],
+                      output_format: str = 'jpg', quality: int = 95) -> List[str]:
+        """Run a chain of operations on many images in a process pool
+
+        Each image is decoded once, passed through every operation and
+        encoded once in a worker process (Pillow work does not release the
+        GIL). Results are recorded as they finish; failed images are skipped.
+        """
+        total_images = len(input_paths)
         try:
-            update_progress(task_id, 10, 'processing', f'Memproses batch {len(input_paths)} gambar...')
+            update_progress(task_id, 10, 'processing', f'Memproses batch {total_images} gambar...')
             
-            results = []
-            total_images = len(input_paths)
+            jobs = {}
+            for index, input_path in enumerate(input_paths):
+                stem = os.path.splitext(os.path.basename(input_path))[0]
+                output_filename = f'batch_{task_id}_{index:03d}_{stem}.{output_format.lower()}'
+                jobs[index] = (input_path, os.path.join(self.output_folder, output_filename))
             
-            for i, input_path in enumerate(input_paths):
-                # Update progress for each image
-                progress = 10 + (80 * i // total_images)
-                update_progress(task_id, progress, 'processing', 
-                              f'Memproses gambar {i+1} dari {total_images}...')
-                
-                individual_task_id = f"{task_id}_{i}"
-                
-                if operation == 'resize':
-                    result = self.resize_image(input_path, individual_task_id, 
-                                             kwargs.get('width', 800), 
-                                             kwargs.get('height', 600),
-                                             kwargs.get('maintain_aspect', True))
-                elif operation == 'convert':
-                    result = self.convert_format(input_path, individual_task_id,
-                                               kwargs.get('output_format', 'jpg'),
-                                               kwargs.get('quality', 95))
-                elif operation == 'enhance':
-                    result = self.enhance_image(input_path, individual_task_id,
-                                              kwargs.get('brightness', 1.0),
-                                              kwargs.get('contrast', 1.0),
-                                              kwargs.get('saturation', 1.0),
-                                              kwargs.get('sharpness', 1.0))
-                
-                if result:
-                    results.append(result)
+            results, failed = {}, 0
+            workers = max(1, min(total_images, thread_budget()))
+            # Workers come from a clean server process, not forks of this (threaded) one
+            context = multiprocessing.get_context('forkserver')
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                futures = {
+                    pool.submit(process_chain, input_path, output_path, operations, output_format, quality): index
+                    for index, (input_path, output_path) in jobs.items()
+                }
+                for done, future in enumerate(as_completed(futures), start=1):
+                    index = futures[future]
+                    try:
+                        results[index] = future.result()
+                        record_output(task_id, results[index])
+                    except Exception as e:
+                        failed += 1
+                        logger.warning(f"Batch {task_id}: image {index} failed: {e}")
+                    update_progress(task_id, 10 + 85 * done // total_images, 'processing',
+                                    f'Memproses gambar {done} dari {total_images}...',
+                                    done=done, total=total_images, failed=failed)
             
-            update_progress(task_id, 100, 'completed', f'Batch processing selesai! {len(results)} gambar berhasil.')
-            return results
+            if not results:
+                raise ValueError('Tidak ada gambar yang berhasil diproses')
+            logger.info(f"Batch {task_id}: {len(results)}/{total_images} images with {workers} workers")
+            message = f'Batch processing selesai! {len(results)} gambar berhasil.'
+            if failed:
+                message += f' {failed} gambar gagal.'
+            update_progress(task_id, 100, 'completed', message, done=total_images, total=total_images,
+                            failed=failed)
+            return [results[index] for index in sorted(results)]
             
         except Exception as e:
             logger.error(f"Batch processing failed: {e}")
@@ -170,36 +409,14 @@ class ImageProcessor:
             output_filename = f'enhanced_image_{task_id}.jpg'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            with Image.open(input_path) as img:
-                # Apply enhancements
-                if brightness != 1.0:
-                    enhancer = ImageEnhance.Brightness(img)
-                    img = enhancer.enhance(brightness)
-                
-                if contrast != 1.0:
-                    enhancer = ImageEnhance.Contrast(img)
-                    img = enhancer.enhance(contrast)
-                
-                if saturation != 1.0:
-                    enhancer = ImageEnhance.Color(img)
-                    img = enhancer.enhance(saturation)
-                
-                if sharpness != 1.0:
-                    enhancer = ImageEnhance.Sharpness(img)
-                    img = enhancer.enhance(sharpness)
+            with open_image(input_path) as img:
+                enhanced_img = enhance_strips(img, brightness, contrast, saturation, sharpness,
+                                              self._strip_progress(task_id, 'Meningkatkan kualitas gambar...'))
                 
                 update_progress(task_id, 60, 'processing', 'Menyimpan gambar yang ditingkatkan...')
-                
-                # Convert to RGB if necessary
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = background
-                
-                img.save(output_path, 'JPEG', quality=95, optimize=True)
+                save_image(enhanced_img, output_path, 'jpg', 95)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'Gambar berhasil ditingkatkan!')
             return output_path
             
@@ -216,37 +433,14 @@ class ImageProcessor:
             output_filename = f'filtered_image_{task_id}.jpg'
             output_path = os.path.join(self.output_folder, output_filename)
             
-            with Image.open(input_path) as img:
-                if filter_type == 'blur':
-                    filtered_img = img.filter(ImageFilter.BLUR)
-                elif filter_type == 'sharpen':
-                    filtered_img = img.filter(ImageFilter.SHARPEN)
-                elif filter_type == 'emboss':
-                    filtered_img = img.filter(ImageFilter.EMBOSS)
-                elif filter_type == 'contour':
-                    filtered_img = img.filter(ImageFilter.CONTOUR)
-                elif filter_type == 'edge_enhance':
-                    filtered_img = img.filter(ImageFilter.EDGE_ENHANCE)
-                elif filter_type == 'grayscale':
-                    filtered_img = ImageOps.grayscale(img)
-                elif filter_type == 'sepia':
-                    # Create sepia effect
-                    filtered_img = ImageOps.colorize(ImageOps.grayscale(img), '#704214', '#C0A882')
-                else:
-                    filtered_img = img  # No filter
+            with open_image(input_path) as img:
+                filtered_img = filter_strips(img, filter_type, 'jpg',
+                                             self._strip_progress(task_id, f'Menerapkan filter {filter_type}...'))
                 
                 update_progress(task_id, 60, 'processing', 'Menyimpan gambar yang difilter...')
-                
-                # Convert to RGB if necessary
-                if filtered_img.mode in ('RGBA', 'LA', 'P'):
-                    background = Image.new('RGB', filtered_img.size, (255, 255, 255))
-                    if filtered_img.mode == 'P':
-                        filtered_img = filtered_img.convert('RGBA')
-                    background.paste(filtered_img, mask=filtered_img.split()[-1] if filtered_img.mode == 'RGBA' else None)
-                    filtered_img = background
-                
-                filtered_img.save(output_path, 'JPEG', quality=95, optimize=True)
+                save_image(filtered_img, output_path, 'jpg', 95)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Filter {filter_type} berhasil diterapkan!')
             return output_path
             
@@ -255,6 +449,78 @@ class ImageProcessor:
             update_progress(task_id, 0, 'error', f'Penerapan filter gagal: {str(e)}')
             return None
     
+    def responsive_set(self, input_path: str, task_id: str, widths: List[int], formats: List[str],
+                       quality: int = 85) -> Optional[Dict]:
+        """Variants of one image at every width in every format, for srcset
+
+        The image is decoded once and downscaled as a pyramid, widest first,
+        each level resampled from the one above it. Encodes run in a thread
+        pool while the next level is resized (Pillow releases the GIL for
+        both). Widths at or above the source width are skipped. The variants
+        and manifest.json go into one directory served under /stream; its
+        zip bundle comes from /download.
+        """
+        output_dir = os.path.join(self.output_folder, f'responsive_{task_id}')
+        try:
+            update_progress(task_id, 10, 'processing', 'Membaca gambar...')
+            os.makedirs(output_dir, exist_ok=True)
+            
+            with open_image(input_path) as img:
+                check_memory(img)
+                source_size = img.size
+                targets = sorted({width for width in widths if width < img.width}, reverse=True) or [img.width]
+                # Palette and other modes are resampled in RGB(A), not nearest-neighbour
+                if img.mode not in ENHANCE_MODES:
+                    img = img.convert('RGBA' if img.mode == 'P' or 'transparency' in img.info else 'RGB')
+                
+                variants, futures = [], {}
+                total = len(targets) * len(formats)
+                with ThreadPoolExecutor(max_workers=max(1, min(total, thread_budget()))) as pool:
+                    level = img
+                    for width in targets:
+                        size = (width, max(1, round(width * source_size[1] / source_size[0])))
+                        if level.size != size:
+                            # The first step can still decode a JPEG at reduced scale
+                            level = resize_op(level, *size, maintain_aspect=False)
+                        for output_format in formats:
+                            filename = f'{width}w.{output_format}'
+                            variant = {'width': size[0], 'height': size[1], 'format': output_format,
+                                       'filename': filename, 'url': f'/stream/{task_id}/{filename}'}
+                            # Own copy per encode: Image.save keeps its options on the image object
+                            future = pool.submit(save_image, level.copy(), os.path.join(output_dir, filename),
+                                                 output_format, quality)
+                            futures[future] = variant
+                            variants.append(variant)
+                    
+                    for done, future in enumerate(as_completed(futures), start=1):
+                        future.result()
+                        update_progress(task_id, 20 + 75 * done // total, 'processing',
+                                        f'Menyimpan varian {done} dari {total}...')
+            
+            for variant in variants:
+                variant['size'] = os.path.getsize(os.path.join(output_dir, variant['filename']))
+            manifest = {
+                'source': {'width': source_size[0], 'height': source_size[1]},
+                'variants': variants,
+                'srcset': {output_format: ', '.join(f"{v['url']} {v['width']}w" for v in reversed(variants)
+                                                    if v['format'] == output_format)
+                           for output_format in formats},
+                'bundle_url': f'/download/{task_id}',
+            }
+            with open(os.path.join(output_dir, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f, indent=2)
+            
+            record_output(task_id, output_dir, kind='stream')
+            update_progress(task_id, 100, 'completed', f'{len(variants)} varian gambar berhasil dibuat!',
+                            manifest=manifest)
+            return manifest
+            
+        except Exception as e:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            logger.error(f"Responsive image set failed: {e}")
+            update_progress(task_id, 0, 'error', f'Pembuatan varian gambar gagal: {str(e)}')
+            return None
+    
     def get_image_info(self, file_path: str) -> Optional[Dict]:
         """Get comprehensive image information"""
         try:
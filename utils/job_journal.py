@@ -0,0 +1,173 @@
+# Persistent job journal shared by web workers and the job supervisor
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, List, Optional
+from .sqlite_store import connect
+from .config import TASK_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+# A watched task's last_seen is written at most this often per process
+WATCH_TOUCH_INTERVAL = 30
+
+_watched = {}
+_watched_lock = threading.Lock()
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            task_id TEXT PRIMARY KEY,
+            job_type TEXT NOT NULL,
+            resource_class TEXT NOT NULL,
+            params TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            owner_pid INTEGER,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            last_seen REAL,
+            cancel_reason TEXT
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs (status, resource_class, created_at)')
+
+_init_schema()
+
+def _row_to_job(row) -> Dict:
+    keys = ('task_id', 'job_type', 'resource_class', 'params', 'status', 'attempts', 'owner_pid',
+            'created_at', 'started_at', 'finished_at')
+    job = dict(zip(keys, row))
+    job['params'] = json.loads(job['params'])
+    return job
+
+_COLUMNS = ('task_id, job_type, resource_class, params, status, attempts, owner_pid, '
+            'created_at, started_at, finished_at')
+
+def enqueue(task_id: str, job_type: str, resource_class: str, params: Dict):
+    """Add a job to the journal in the queued state"""
+    connect(TASK_DB_PATH).execute(
+        'INSERT OR REPLACE INTO jobs (task_id, job_type, resource_class, params, status, attempts, created_at) '
+        "VALUES (?, ?, ?, ?, 'queued', 0, ?)",
+        (task_id, job_type, resource_class, json.dumps(params), time.time())
+    )
+
+def get_job(task_id: str) -> Optional[Dict]:
+    row = connect(TASK_DB_PATH).execute(f'SELECT {_COLUMNS} FROM jobs WHERE task_id = ?', (task_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+def claim_next(resource_class: str) -> Optional[Dict]:
+    """Atomically move the oldest queued job of a class to running"""
+    conn = connect(TASK_DB_PATH)
+    with conn:
+        conn.execute('BEGIN IMMEDIATE')
+        row = conn.execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued' AND resource_class = ? "
+            'ORDER BY created_at LIMIT 1', (resource_class,)
+        ).fetchone()
+        if not row:
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, owner_pid = ?, started_at = ? "
+            'WHERE task_id = ?', (os.getpid(), time.time(), row[0])
+        )
+    job = _row_to_job(row)
+    job['attempts'] += 1
+    return job
+
+def finish(task_id: str, status: str, from_status: str = 'running') -> bool:
+    """Record the final state of a job; False if it already left from_status"""
+    return bool(connect(TASK_DB_PATH).execute(
+        'UPDATE jobs SET status = ?, finished_at = ? WHERE task_id = ? AND status = ?',
+        (status, time.time(), task_id, from_status)
+    ).rowcount)
+
+def set_owner(task_id: str, pid: int):
+    """Record the process that executes a running job"""
+    connect(TASK_DB_PATH).execute('UPDATE jobs SET owner_pid = ? WHERE task_id = ?', (pid, task_id))
+
+def request_cancel(task_id: str, reason: str) -> bool:
+    """Flag a running job for cancellation by its dispatcher"""
+    return bool(connect(TASK_DB_PATH).execute(
+        "UPDATE jobs SET cancel_reason = ? WHERE task_id = ? AND status = 'running'", (reason, task_id)
+    ).rowcount)
+
+def cancel_reason(task_id: str) -> Optional[str]:
+    row = connect(TASK_DB_PATH).execute('SELECT cancel_reason FROM jobs WHERE task_id = ?', (task_id,)).fetchone()
+    return row[0] if row else None
+
+def mark_watched(task_id: str):
+    """Note that a client is still following this task (throttled)"""
+    now = time.time()
+    with _watched_lock:
+        if now - _watched.get(task_id, 0) < WATCH_TOUCH_INTERVAL:
+            return
+        _watched[task_id] = now
+        if len(_watched) > 10000:
+            _watched.clear()
+    connect(TASK_DB_PATH).execute(
+        "UPDATE jobs SET last_seen = ? WHERE task_id = ? AND status IN ('queued', 'running')", (now, task_id)
+    )
+
+def unwatched_jobs(idle_seconds: int) -> List[str]:
+    """Active jobs nobody has polled or streamed for idle_seconds"""
+    cutoff = time.time() - idle_seconds
+    rows = connect(TASK_DB_PATH).execute(
+        "SELECT task_id FROM jobs WHERE status IN ('queued', 'running') AND cancel_reason IS NULL "
+        'AND COALESCE(last_seen, created_at) < ?', (cutoff,)
+    ).fetchall()
+    return [task_id for (task_id,) in rows]
+
+def requeue(task_id: str):
+    connect(TASK_DB_PATH).execute(
+        "UPDATE jobs SET status = 'queued', owner_pid = NULL, started_at = NULL, cancel_reason = NULL WHERE task_id = ?", (task_id,)
+    )
+
+def queued_jobs(resource_class: Optional[str] = None) -> List[Dict]:
+    """Queued jobs in dispatch order"""
+    if resource_class:
+        rows = connect(TASK_DB_PATH).execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued' AND resource_class = ? ORDER BY created_at",
+            (resource_class,)
+        ).fetchall()
+    else:
+        rows = connect(TASK_DB_PATH).execute(
+            f"SELECT {_COLUMNS} FROM jobs WHERE status = 'queued' ORDER BY created_at"
+        ).fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def running_jobs() -> List[Dict]:
+    rows = connect(TASK_DB_PATH).execute(f"SELECT {_COLUMNS} FROM jobs WHERE status = 'running'").fetchall()
+    return [_row_to_job(row) for row in rows]
+
+def queue_position(task_id: str) -> Optional[int]:
+    """1-based position of a queued job within its resource class"""
+    row = connect(TASK_DB_PATH).execute(
+        "SELECT resource_class, created_at FROM jobs WHERE task_id = ? AND status = 'queued'", (task_id,)
+    ).fetchone()
+    if not row:
+        return None
+    return connect(TASK_DB_PATH).execute(
+        "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND resource_class = ? AND created_at <= ?", row
+    ).fetchone()[0]
+
+def counts() -> Dict[str, Dict[str, int]]:
+    """Number of queued and running jobs per resource class"""
+    result = {}
+    for resource_class, status, count in connect(TASK_DB_PATH).execute(
+        "SELECT resource_class, status, COUNT(*) FROM jobs WHERE status IN ('queued', 'running') "
+        'GROUP BY resource_class, status'
+    ):
+        result.setdefault(resource_class, {})[status] = count
+    return result
+
+def purge_finished(max_age_seconds: int):
+    """Forget finished jobs older than max_age_seconds"""
+    cutoff = time.time() - max_age_seconds
+    connect(TASK_DB_PATH).execute(
+        "DELETE FROM jobs WHERE status NOT IN ('queued', 'running') AND finished_at < ?", (cutoff,)
+    )
@@ -5,6 +5,7 @@ import subprocess
 import logging
 from typing import Optional, Dict, List
 from .common import update_progress
+from .task_manifest import record_output
 
 logger = logging.getLogger(__name__)
 
@@ -50,6 +51,7 @@ class DocumentProcessor:
                 extra_args=args
             )
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Dokumen berhasil dikonversi ke {output_format}!')
             return output_path
             
@@ -77,6 +79,7 @@ class DocumentProcessor:
                 format=input_format
             )
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'Teks berhasil diekstrak!')
             return output_path
             
@@ -105,6 +108,7 @@ class DocumentProcessor:
                 extra_args=['--wrap=none']
             )
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'Dokumen berhasil dikonversi ke Markdown!')
             return output_path
             
@@ -157,6 +161,7 @@ class DocumentProcessor:
             # Clean up temporary file
             os.remove(temp_md_path)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Dokumen berhasil digabungkan ke format {output_format}!')
             return output_path
             
@@ -201,6 +206,7 @@ class DocumentProcessor:
                 )
                 
                 output_paths.append(section_pdf_path)
+                record_output(task_id, section_pdf_path)
                 os.remove(section_md_path)  # Clean up temp file
             
             update_progress(task_id, 100, 'completed', f'Dokumen berhasil dipisahkan menjadi {len(output_paths)} bagian!')
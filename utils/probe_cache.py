@@ -0,0 +1,135 @@
+# ffprobe result cache shared by the info endpoints and the media pipeline
+import os
+import copy
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+import ffmpeg
+from .sqlite_store import connect
+from .config import TASK_DB_PATH, PROBE_CACHE_MEMORY_ENTRIES, PROBE_CACHE_DB_ENTRIES
+
+logger = logging.getLogger(__name__)
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS probe_cache (
+            cache_key TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_probe_cache_access ON probe_cache (last_access)')
+    # Local file -> content hash, so a saved upload finds probes made from its content elsewhere
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS probe_aliases (
+            file_key TEXT PRIMARY KEY,
+            content_key TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+_init_schema()
+
+# In-process LRU in front of the database (job processes are short-lived, web workers are not)
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+def _file_key(path: str) -> Optional[str]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f'file:{os.path.realpath(path)}:{stat.st_size}:{stat.st_mtime_ns}'
+
+def _content_key(content_hash: Optional[str]) -> Optional[str]:
+    return f'sha256:{content_hash}' if content_hash else None
+
+def _memory_get(key: str) -> Optional[Dict]:
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    return None
+
+def _memory_put(key: str, data: Dict):
+    with _memory_lock:
+        _memory[key] = data
+        _memory.move_to_end(key)
+        while len(_memory) > PROBE_CACHE_MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+def _db_get(key: str) -> Optional[Dict]:
+    conn = connect(TASK_DB_PATH)
+    row = conn.execute('SELECT data FROM probe_cache WHERE cache_key = ?', (key,)).fetchone()
+    if not row:
+        return None
+    conn.execute('UPDATE probe_cache SET last_access = ? WHERE cache_key = ?', (time.time(), key))
+    return json.loads(row[0])
+
+def _db_put(key: str, data: Dict):
+    conn = connect(TASK_DB_PATH)
+    conn.execute(
+        'INSERT OR REPLACE INTO probe_cache (cache_key, data, last_access) VALUES (?, ?, ?)',
+        (key, json.dumps(data), time.time())
+    )
+    # LRU bound on the persistent layer
+    conn.execute(
+        'DELETE FROM probe_cache WHERE cache_key IN (SELECT cache_key FROM probe_cache '
+        'ORDER BY last_access DESC LIMIT -1 OFFSET ?)', (PROBE_CACHE_DB_ENTRIES,)
+    )
+
+def remember_content_hash(path: str, content_hash: str):
+    """Record the content hash of a local file (known when an upload is saved)"""
+    file_key = _file_key(path)
+    if not file_key or not content_hash:
+        return
+    conn = connect(TASK_DB_PATH)
+    conn.execute(
+        'INSERT OR REPLACE INTO probe_aliases (file_key, content_key, created_at) VALUES (?, ?, ?)',
+        (file_key, _content_key(content_hash), time.time())
+    )
+    conn.execute(
+        'DELETE FROM probe_aliases WHERE file_key IN (SELECT file_key FROM probe_aliases '
+        'ORDER BY created_at DESC LIMIT -1 OFFSET ?)', (PROBE_CACHE_DB_ENTRIES,)
+    )
+
+def lookup(content_hash: str) -> Optional[Dict]:
+    """Cached probe for content seen before, without needing the file"""
+    key = _content_key(content_hash)
+    data = _memory_get(key) or _db_get(key)
+    if data is None:
+        return None
+    _memory_put(key, data)
+    return copy.deepcopy(data)
+
+def probe(path: str, content_hash: Optional[str] = None) -> Dict:
+    """ffprobe a file, at most once per content (or per path, size and mtime)
+
+    Raises ffmpeg.Error like ffmpeg.probe when the file cannot be probed.
+    """
+    file_key = _file_key(path)
+    content_key = _content_key(content_hash)
+    if not content_key and file_key:
+        row = connect(TASK_DB_PATH).execute(
+            'SELECT content_key FROM probe_aliases WHERE file_key = ?', (file_key,)
+        ).fetchone()
+        content_key = row[0] if row else None
+
+    keys = [key for key in (content_key, file_key) if key]
+    for key in keys:
+        data = _memory_get(key) or _db_get(key)
+        if data is not None:
+            for other in keys:
+                _memory_put(other, data)
+            return copy.deepcopy(data)
+
+    data = ffmpeg.probe(path)
+    if keys:
+        _db_put(keys[0], data)
+    for key in keys:
+        _memory_put(key, data)
+    return copy.deepcopy(data)
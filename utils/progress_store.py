@@ -0,0 +1,166 @@
+# Pluggable progress storage backends for Universal Toolkit
+import os
+import json
+import time
+import atexit
+import logging
+import threading
+from typing import Dict, Optional
+from .sqlite_store import connect
+from .config import PROGRESS_BACKEND, PROGRESS_DB_PATH, PROGRESS_TTL_SECONDS, PROGRESS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Statuses that end a task; these are written through immediately
+TERMINAL_STATUSES = {'completed', 'error', 'cancelled', 'interrupted'}
+
+# How often expired entries are evicted
+EVICTION_INTERVAL = 60
+
+class MemoryProgressStore:
+    """In-process progress store (only correct with a single worker process)"""
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_eviction = time.time()
+
+    def set(self, task_id: str, entry: Dict):
+        now = time.time()
+        with self._lock:
+            self._entries[task_id] = (entry, now)
+            if now - self._last_eviction > EVICTION_INTERVAL:
+                self._evict_expired(now)
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        with self._lock:
+            item = self._entries.get(task_id)
+        return item[0] if item else None
+
+    def flush(self):
+        """Nothing to flush; writes are immediate"""
+
+    def _evict_expired(self, now: float):
+        cutoff = now - self.ttl_seconds
+        expired = [task_id for task_id, (_, updated) in self._entries.items() if updated < cutoff]
+        for task_id in expired:
+            del self._entries[task_id]
+        self._last_eviction = now
+
+class SQLiteProgressStore:
+    """Progress store in a SQLite WAL database shared by all workers on the node
+
+    Writes are coalesced per task and flushed in one transaction every
+    flush interval; terminal statuses are written through immediately.
+    Reads are a primary-key lookup.
+    """
+
+    def __init__(self, db_path: str, ttl_seconds: int, flush_interval: float):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+        self._last_eviction = 0.0
+        self._init_schema()
+        atexit.register(self.flush)
+
+    def _init_schema(self):
+        conn = connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS progress (
+                task_id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_progress_updated ON progress (updated_at)')
+
+    def set(self, task_id: str, entry: Dict):
+        with self._lock:
+            self._pending[task_id] = (entry, time.time())
+
+        if entry.get('status') in TERMINAL_STATUSES:
+            self.flush()
+        else:
+            self._ensure_flusher()
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        # Unflushed writes from this process are the freshest view
+        with self._lock:
+            item = self._pending.get(task_id)
+        if item:
+            return item[0]
+
+        row = connect(self.db_path).execute(
+            'SELECT data FROM progress WHERE task_id = ?', (task_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def flush(self):
+        """Write all pending updates in a single transaction"""
+        with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+        rows = [(task_id, json.dumps(entry), updated) for task_id, (entry, updated) in pending.items()]
+        try:
+            conn = connect(self.db_path)
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                # Job processes write the same task concurrently; an older
+                # pending update must never overwrite a newer one
+                conn.executemany(
+                    'INSERT INTO progress (task_id, data, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT (task_id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at '
+                    'WHERE excluded.updated_at >= progress.updated_at', rows
+                )
+        except Exception as e:
+            logger.error(f"Progress flush failed: {e}")
+            # Put updates back unless newer ones arrived meanwhile
+            with self._lock:
+                for task_id, item in pending.items():
+                    self._pending.setdefault(task_id, item)
+
+    def evict_expired(self):
+        """Delete entries not updated within the TTL"""
+        cutoff = time.time() - self.ttl_seconds
+        try:
+            deleted = connect(self.db_path).execute(
+                'DELETE FROM progress WHERE updated_at < ?', (cutoff,)
+            ).rowcount
+            if deleted:
+                logger.info(f"Evicted {deleted} expired progress entries")
+        except Exception as e:
+            logger.error(f"Progress eviction failed: {e}")
+        self._last_eviction = time.time()
+
+    def _ensure_flusher(self):
+        """Start the background flusher once per process"""
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_loop, name='progress-flusher', daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+            if time.time() - self._last_eviction > EVICTION_INTERVAL:
+                self.evict_expired()
+
+def create_progress_store():
+    """Create the configured progress store backend"""
+    if PROGRESS_BACKEND == 'memory':
+        return MemoryProgressStore(PROGRESS_TTL_SECONDS)
+    if PROGRESS_BACKEND == 'sqlite':
+        return SQLiteProgressStore(PROGRESS_DB_PATH, PROGRESS_TTL_SECONDS, PROGRESS_FLUSH_INTERVAL)
+    raise ValueError(f"Unknown progress backend: {PROGRESS_BACKEND}")
+
+progress_store = create_progress_store()
@@ -0,0 +1,111 @@
+# Server-Sent Events stream of task progress for Universal Toolkit
+import json
+import time
+import threading
+from typing import Dict, Iterator, List, Optional
+from .common import get_progress
+from .progress_store import TERMINAL_STATUSES
+from .job_journal import mark_watched
+from .config import PROGRESS_STREAM_MAX_CONCURRENT
+
+# Server-side check interval (local store read, no client round trip)
+POLL_INTERVAL = 0.5
+# Comment line sent when nothing changed, keeps proxies from closing the connection
+HEARTBEAT_INTERVAL = 15
+# Streams end after this long; EventSource reconnects on its own
+MAX_STREAM_SECONDS = 60
+# Client reconnect delay in milliseconds
+RETRY_MS = 2000
+# Unknown (mistyped or expired) task ids end the stream like finished tasks, once
+# they stay unknown this long (a just-submitted task may not be visible yet)
+END_STATUSES = TERMINAL_STATUSES | {'unknown'}
+UNKNOWN_GRACE_SECONDS = 5
+
+_slots = threading.BoundedSemaphore(max(1, PROGRESS_STREAM_MAX_CONCURRENT))
+
+def _state_key(progress: dict) -> str:
+    return str(progress.get('timestamp', ''))
+
+def _encode_event_id(last_sent: Dict[str, str]) -> str:
+    # The id carries the state of every task: EventSource only sends back the last id
+    return ';'.join(f'{task_id}@{state}' for task_id, state in last_sent.items())
+
+def _decode_event_id(last_event_id: Optional[str]) -> Dict[str, str]:
+    last_sent = {}
+    for part in (last_event_id or '').split(';'):
+        if '@' in part:
+            task_id, state = part.split('@', 1)
+            last_sent[task_id] = state
+    return last_sent
+
+def progress_events(task_ids: List[str], last_event_id: Optional[str] = None) -> Iterator[str]:
+    """Yield SSE messages whenever the progress of a task changes
+
+    A 'progress' event is sent for the current state on connect and then
+    only when it changes. Tasks drop out once they reach a terminal status
+    (or are still unknown after UNKNOWN_GRACE_SECONDS); a 'done' event is
+    sent when none are left.
+    """
+    # Reconnect: skip resending the states the client already has
+    last_sent = {task_id: state for task_id, state in _decode_event_id(last_event_id).items()
+                 if task_id in task_ids}
+
+    pending = list(dict.fromkeys(task_ids))
+    started = time.time()
+    last_write = started
+
+    yield f"retry: {RETRY_MS}\n\n"
+
+    while pending and time.time() - started < MAX_STREAM_SECONDS:
+        for task_id in list(pending):
+            mark_watched(task_id)
+            progress = get_progress(task_id)
+            if progress.get('status') == 'unknown' and time.time() - started < UNKNOWN_GRACE_SECONDS:
+                continue
+            state = _state_key(progress)
+
+            if last_sent.get(task_id) != state:
+                last_sent[task_id] = state
+                payload = json.dumps({'task_id': task_id, **progress})
+                yield f"id: {_encode_event_id(last_sent)}\nevent: progress\ndata: {payload}\n\n"
+                last_write = time.time()
+
+            if progress.get('status') in END_STATUSES:
+                pending.remove(task_id)
+
+        if not pending:
+            yield "event: done\ndata: {}\n\n"
+            return
+
+        if time.time() - last_write >= HEARTBEAT_INTERVAL:
+            yield ": heartbeat\n\n"
+            last_write = time.time()
+
+        time.sleep(POLL_INTERVAL)
+
+class ProgressStream:
+    """progress_events holding one of the per-worker stream slots until closed
+
+    A plain class rather than a generator, so the slot is released even when
+    the WSGI server closes the response before iterating it.
+    """
+
+    def __init__(self, task_ids: List[str], last_event_id: Optional[str] = None):
+        self._events = progress_events(task_ids, last_event_id)
+        self._slot_held = True
+
+    @classmethod
+    def open(cls, task_ids: List[str], last_event_id: Optional[str] = None) -> Optional['ProgressStream']:
+        """A stream, or None when this worker already serves the maximum number"""
+        if not _slots.acquire(blocking=False):
+            return None
+        return cls(task_ids, last_event_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return self._events
+
+    def close(self):
+        self._events.close()
+        if self._slot_held:
+            self._slot_held = False
+            _slots.release()
@@ -0,0 +1,81 @@
+# Per-job CPU budget: thread counts and CPU/I/O priority of job processes
+import os
+import shutil
+import logging
+import subprocess
+from typing import Optional
+from . import job_journal
+from .config import JOB_CONCURRENCY, JOB_THREAD_BUDGET, JOB_NICE_LEVELS, JOB_IONICE_LEVELS
+
+logger = logging.getLogger(__name__)
+
+# Budget of this process once it runs a job (None: not a job process)
+_budget = None
+
+def system_cores() -> int:
+    """CPU cores this process may run on (respects container CPU sets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def compute_budget(resource_class: str, running: Optional[int] = None, queued: Optional[int] = None) -> int:
+    """Threads for a new job (running counts the job itself)
+
+    Decided once when the job starts and kept for its lifetime. A CPU job
+    gets every core only if it is the only CPU job and none are queued;
+    otherwise it gets the fixed per-slot share, so the total stays near the
+    core count however the jobs arrive. A job that started alone keeps all
+    cores when others start later, so the box is briefly oversubscribed.
+    """
+    if JOB_THREAD_BUDGET:
+        return JOB_THREAD_BUDGET
+    cores = system_cores()
+    share = max(1, cores // max(1, JOB_CONCURRENCY['cpu']))
+    if resource_class != 'cpu':
+        # Downloads and utilities only occasionally encode; one CPU slot's share
+        return share
+    if running is None or queued is None:
+        cpu = job_journal.counts().get('cpu', {})
+        running = cpu.get('running', 1) if running is None else running
+        queued = cpu.get('queued', 0) if queued is None else queued
+    return cores if running <= 1 and not queued else share
+
+def _set_io_priority(level: int):
+    """Best-effort I/O class at the given level (0 highest, 7 lowest), if ionice exists"""
+    ionice = shutil.which('ionice')
+    if not ionice:
+        return
+    try:
+        subprocess.run([ionice, '-c', '2', '-n', str(level), '-p', str(os.getpid())],
+                       check=True, capture_output=True, timeout=5)
+    except (OSError, subprocess.SubprocessError) as e:
+        logger.warning(f"Could not set I/O priority: {e}")
+
+def apply_job_limits(resource_class: str) -> int:
+    """Fix the thread budget and lower the priority of the current job process
+
+    Children (ffmpeg, pandoc, xelatex, yt-dlp) inherit the nice and I/O
+    levels, so the web workers stay responsive under load.
+    """
+    global _budget
+    _budget = compute_budget(resource_class)
+
+    nice = JOB_NICE_LEVELS.get(resource_class, 0)
+    if nice:
+        try:
+            os.nice(nice)
+        except OSError as e:
+            logger.warning(f"Could not lower CPU priority: {e}")
+    io_level = JOB_IONICE_LEVELS.get(resource_class)
+    if io_level is not None:
+        _set_io_priority(io_level)
+
+    # Libraries with their own thread pools (OpenMP and friends) follow the same budget
+    for name in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[name] = str(_budget)
+    return _budget
+
+def thread_budget() -> int:
+    """Threads the current job may use; every core outside job processes"""
+    return _budget or system_cores()
@@ -0,0 +1,200 @@
+# Content-addressed cache of conversion results
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import subprocess
+from functools import lru_cache
+from typing import Dict, Optional
+from .sqlite_store import connect
+from .common import update_progress
+from .task_manifest import record_output
+from .config import TASK_DB_PATH, CACHE_FOLDER, OUTPUT_FOLDER, RESULT_CACHE_ENABLED, RESULT_CACHE_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS result_cache (
+            cache_key TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_result_cache_access ON result_cache (last_access)')
+    conn.execute('CREATE TABLE IF NOT EXISTS cache_counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+    conn.execute("INSERT OR IGNORE INTO cache_counters (name, value) VALUES ('hits', 0), ('misses', 0)")
+
+_init_schema()
+
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    """Version string of the tool that produces a result (part of the cache key)"""
+    try:
+        if tool == 'ffmpeg':
+            result = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True, timeout=10)
+            return result.stdout.split('\n', 1)[0]
+        if tool == 'pandoc':
+            import pypandoc
+            return pypandoc.get_pandoc_version()
+        if tool == 'pillow':
+            import PIL
+            return PIL.__version__
+    except Exception as e:
+        logger.warning(f"Could not determine {tool} version: {e}")
+    return 'unknown'
+
+def _normalize(value):
+    # 'MP4' and 'mp4 ' select the same output, as do 23 and 23.0
+    if isinstance(value, str):
+        return value.strip().lower()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+# Bumped when an operation's output changes without a tool upgrade, so old results are not reused
+PIPELINE_VERSIONS = {
+    'image.resize': 2,  # Reduced-scale JPEG decode and reducing_gap
+    'image.enhance': 2,  # Fused lookup-table, color matrix and kernel passes
+}
+
+def make_cache_key(upload: Dict, operation: str, params: Dict, tool: str) -> Optional[str]:
+    """Build a cache key from input content, operation, parameters, tool and pipeline version"""
+    if not RESULT_CACHE_ENABLED or not upload.get('sha256'):
+        return None
+    params = {name: _normalize(value) for name, value in params.items()}
+    # The input extension selects the decoder/reader, so it is part of the input identity
+    input_ext = os.path.splitext(upload['filename'])[1].lower()
+    material = json.dumps([upload['sha256'], input_ext, operation, params, tool_version(tool),
+                           PIPELINE_VERSIONS.get(operation, 1)], sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+def _count(name: str):
+    connect(TASK_DB_PATH).execute('UPDATE cache_counters SET value = value + 1 WHERE name = ?', (name,))
+
+def _link_file(source: str, destination: str):
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def _size(path: str) -> int:
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files)
+
+def _link_or_copy(source: str, destination: str):
+    """Hard-link when possible (same filesystem), otherwise copy; published atomically
+
+    Directory results (e.g. thumbnail packages) are rebuilt file by file.
+    """
+    temp_path = f'{destination}.{os.getpid()}.tmp'
+    if not os.path.isdir(source):
+        _link_file(source, temp_path)
+        os.replace(temp_path, destination)
+        return
+
+    shutil.copytree(source, temp_path, copy_function=_link_file)
+    _remove(destination)
+    try:
+        os.replace(temp_path, destination)
+    except OSError:
+        # Another worker published the same content first
+        shutil.rmtree(temp_path, ignore_errors=True)
+
+def lookup(cache_key: Optional[str]) -> Optional[str]:
+    """Get the cached result path for a key, or None on a miss"""
+    if not cache_key:
+        return None
+
+    conn = connect(TASK_DB_PATH)
+    row = conn.execute('SELECT path FROM result_cache WHERE cache_key = ?', (cache_key,)).fetchone()
+    if row and os.path.exists(row[0]):
+        conn.execute('UPDATE result_cache SET last_access = ? WHERE cache_key = ?', (time.time(), cache_key))
+        _count('hits')
+        return row[0]
+
+    if row:
+        # Entry whose file vanished
+        conn.execute('DELETE FROM result_cache WHERE cache_key = ?', (cache_key,))
+    _count('misses')
+    return None
+
+def serve_cached(cache_key: Optional[str], task_id: str, name_prefix: str, kind: Optional[str] = None,
+                 **extra) -> Optional[str]:
+    """Complete a task immediately from the cache; returns the output path on a hit
+
+    kind is recorded in the task manifest; extra goes into the completed progress.
+    """
+    cached_path = lookup(cache_key)
+    if not cached_path:
+        return None
+
+    ext = os.path.splitext(cached_path)[1]
+    output_path = os.path.join(OUTPUT_FOLDER, f'{name_prefix}_{task_id}{ext}')
+    _link_or_copy(cached_path, output_path)
+    record_output(task_id, output_path, kind=kind)
+    update_progress(task_id, 100, 'completed', 'Selesai! (hasil dari cache)', cached=True, **extra)
+    return output_path
+
+def store(cache_key: Optional[str], output_path: Optional[str]):
+    """Add a finished result to the cache and evict least recently used entries"""
+    if not cache_key or not output_path or not os.path.exists(output_path):
+        return
+    try:
+        ext = os.path.splitext(output_path)[1]
+        cached_path = os.path.join(CACHE_FOLDER, f'{cache_key}{ext}')
+        _link_or_copy(output_path, cached_path)
+        now = time.time()
+        connect(TASK_DB_PATH).execute(
+            'INSERT OR REPLACE INTO result_cache (cache_key, path, size, created_at, last_access) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (cache_key, cached_path, _size(cached_path), now, now)
+        )
+        evict()
+    except Exception as e:
+        logger.error(f"Result cache store failed: {e}")
+
+def evict(max_bytes: int = RESULT_CACHE_MAX_BYTES):
+    """Remove least recently used entries until the cache fits in max_bytes"""
+    conn = connect(TASK_DB_PATH)
+    total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM result_cache').fetchone()[0]
+    if total <= max_bytes:
+        return
+
+    for cache_key, path, size in conn.execute(
+        'SELECT cache_key, path, size FROM result_cache ORDER BY last_access'
+    ).fetchall():
+        if total <= max_bytes:
+            break
+        # Only the worker whose DELETE succeeds removes the file
+        if conn.execute('DELETE FROM result_cache WHERE cache_key = ?', (cache_key,)).rowcount:
+            _remove(path)
+            total -= size
+
+def stats() -> Dict:
+    """Cache hit/miss counters and current size"""
+    conn = connect(TASK_DB_PATH)
+    counters = dict(conn.execute('SELECT name, value FROM cache_counters').fetchall())
+    entries, size = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM result_cache').fetchone()
+    lookups = counters.get('hits', 0) + counters.get('misses', 0)
+    return {
+        'enabled': RESULT_CACHE_ENABLED,
+        'hits': counters.get('hits', 0),
+        'misses': counters.get('misses', 0),
+        'hit_rate': round(counters.get('hits', 0) / lookups, 4) if lookups else 0.0,
+        'entries': entries,
+        'size_bytes': size,
+        'max_bytes': RESULT_CACHE_MAX_BYTES,
+    }
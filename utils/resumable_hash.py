@@ -0,0 +1,62 @@
+# SHA-256 whose intermediate state can be saved and resumed in another process
+import ctypes
+import ctypes.util
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# sizeof(SHA256_CTX): eight state words, bit count, one 64-byte block, num, md_len
+STATE_SIZE = 112
+
+def _load_libcrypto():
+    """OpenSSL's libcrypto, found directly or through the library hashlib is linked against"""
+    candidates = [ctypes.util.find_library('crypto')]
+    try:
+        import _hashlib
+        candidates.append(_hashlib.__file__)
+    except ImportError:
+        pass
+    for candidate in candidates:
+        if not candidate:
+            continue
+        try:
+            lib = ctypes.CDLL(candidate)
+            for name in ('SHA256_Init', 'SHA256_Update', 'SHA256_Final'):
+                getattr(lib, name).restype = ctypes.c_int
+            lib.SHA256_Update.argtypes = [ctypes.c_void_p, ctypes.c_char_p, ctypes.c_size_t]
+            return lib
+        except (OSError, AttributeError):
+            continue
+    logger.warning("libcrypto not found; chunked uploads are re-hashed when finalized")
+    return None
+
+_libcrypto = _load_libcrypto()
+
+def available() -> bool:
+    return _libcrypto is not None
+
+class ResumableSha256:
+    """hashlib.sha256 look-alike whose state() can be stored and passed back in later"""
+
+    def __init__(self, state: Optional[bytes] = None):
+        if state is not None and len(state) != STATE_SIZE:
+            raise ValueError('Invalid SHA-256 state')
+        if state is None:
+            self._ctx = ctypes.create_string_buffer(STATE_SIZE)
+            _libcrypto.SHA256_Init(self._ctx)
+        else:
+            self._ctx = ctypes.create_string_buffer(state, STATE_SIZE)
+
+    def update(self, data: bytes):
+        _libcrypto.SHA256_Update(self._ctx, data, len(data))
+
+    def state(self) -> bytes:
+        return self._ctx.raw
+
+    def hexdigest(self) -> str:
+        # Finalize a copy, so the hash can still be updated afterwards
+        ctx = ctypes.create_string_buffer(self._ctx.raw, STATE_SIZE)
+        digest = ctypes.create_string_buffer(32)
+        _libcrypto.SHA256_Final(digest, ctx)
+        return digest.raw.hex()
@@ -0,0 +1,381 @@
+# Bounded background job scheduler for Universal Toolkit
+import os
+import sys
+import glob
+import fcntl
+import shutil
+import signal
+import importlib
+import threading
+import time
+import logging
+import subprocess
+import multiprocessing
+from typing import Callable, Dict, Optional
+from . import job_journal, resource_governor
+from .common import update_progress, get_progress
+from .progress_store import progress_store
+from .task_manifest import forget_outputs
+from .config import (JOB_CONCURRENCY, JOB_RUNNER, JOB_MAX_ATTEMPTS, SUPERVISOR_LOCK_PATH,
+                     OUTPUT_FOLDER, ABANDONED_TASK_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# How often idle dispatch workers look for jobs submitted by other processes
+DISPATCH_POLL_INTERVAL = 0.5
+# Minimum delay between attempts to launch the supervisor from one process
+SUPERVISOR_SPAWN_COOLDOWN = 10
+# How often a dispatch worker checks whether its running job was cancelled
+CANCEL_POLL_INTERVAL = 0.5
+# Time a cancelled job gets to exit after SIGTERM before SIGKILL
+CANCEL_GRACE_SECONDS = 5
+# How often the dispatcher looks for jobs nobody is watching any more
+WATCHDOG_INTERVAL = 30
+
+# Job processes are forked from a clean single-threaded server, never from
+# the multi-threaded dispatcher itself
+_job_context = multiprocessing.get_context('forkserver')
+
+# Registered job handlers: job_type -> (handler, resource_class)
+job_handlers = {}
+
+def register_job(job_type: str, resource_class: str = 'cpu') -> Callable:
+    """Register a background job handler under a job type name"""
+    def decorator(func):
+        if resource_class not in JOB_CONCURRENCY:
+            raise ValueError(f"Unknown resource class: {resource_class}")
+        job_handlers[job_type] = (func, resource_class)
+        return func
+    return decorator
+
+class JobScheduler:
+    """Job queue with a worker pool per resource class
+
+    Jobs are written to the persistent journal by any process. Exactly one
+    process per node dispatches them: the one holding the supervisor lock
+    (the job supervisor, or a web worker when JOB_RUNNER is 'thread').
+    """
+
+    def __init__(self, limits: Dict[str, int]):
+        self.limits = {name: max(1, limit) for name, limit in limits.items()}
+        self._wakeup = {name: threading.Event() for name in self.limits}
+        self._workers = []
+        self._lock_file = None
+        self._supervisor = None
+        self._last_spawn = 0.0
+        self._lock = threading.Lock()
+
+    def submit(self, task_id: str, job_type: str, params: Dict) -> int:
+        """Queue a job and return its position in the queue (1-based)"""
+        if job_type not in job_handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        _, resource_class = job_handlers[job_type]
+
+        job_journal.enqueue(task_id, job_type, resource_class, params)
+        position = job_journal.queue_position(task_id) or 1
+        update_progress(task_id, 0, 'queued', self._queued_message(position),
+                        queue_position=position)
+        # Written now, not by the flusher: the first progress request may reach another worker
+        progress_store.flush()
+
+        self._wakeup[resource_class].set()
+        self.ensure_dispatcher()
+        return position
+
+    def get_queue_position(self, task_id: str) -> Optional[int]:
+        """Get current queue position of a task, or None if not queued"""
+        return job_journal.queue_position(task_id)
+
+    def stats(self) -> Dict:
+        """Get queue length, running count and thread budget per resource class"""
+        counts = job_journal.counts()
+        return {
+            name: {
+                'limit': self.limits[name],
+                'running': counts.get(name, {}).get('running', 0),
+                'queued': counts.get(name, {}).get('queued', 0),
+                # Threads a job of this class starting now would get
+                'next_job_threads': resource_governor.compute_budget(
+                    name, counts.get(name, {}).get('running', 0) + 1, counts.get(name, {}).get('queued', 0)),
+            }
+            for name in self.limits
+        }
+
+    # Dispatcher ownership
+
+    def _acquire_lock(self) -> bool:
+        """Take the node-wide dispatcher lock; held until this process exits"""
+        lock_file = open(SUPERVISOR_LOCK_PATH, 'a')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _lock_is_free(self) -> bool:
+        with open(SUPERVISOR_LOCK_PATH, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            return True
+
+    def start_dispatcher(self) -> bool:
+        """Recover the journal and start worker threads if no other process dispatches"""
+        with self._lock:
+            if self._lock_file:
+                return True
+            if not self._acquire_lock():
+                return False
+
+        # Fork job processes with every handler module already imported
+        _job_context.set_forkserver_preload(sorted({h.__module__ for h, _ in job_handlers.values()}))
+
+        self.recover()
+        if ABANDONED_TASK_SECONDS > 0:
+            threading.Thread(target=self._watchdog_loop, name='job-watchdog', daemon=True).start()
+        for resource_class, limit in self.limits.items():
+            for i in range(limit):
+                worker = threading.Thread(
+                    target=self._worker_loop,
+                    args=(resource_class,),
+                    name=f'job-{resource_class}-{i}',
+                    daemon=True
+                )
+                worker.start()
+                self._workers.append(worker)
+        logger.info(f"Job dispatcher started in pid {os.getpid()} with limits {self.limits}")
+        return True
+
+    def ensure_dispatcher(self):
+        """Make sure some process on this node is dispatching journaled jobs"""
+        if self._lock_file:
+            return
+        if JOB_RUNNER == 'thread':
+            self.start_dispatcher()
+            return
+
+        with self._lock:
+            # Reap a supervisor that exited (e.g. lost the lock race)
+            if self._supervisor and self._supervisor.poll() is not None:
+                self._supervisor = None
+            if time.time() - self._last_spawn < SUPERVISOR_SPAWN_COOLDOWN or not self._lock_is_free():
+                return
+            self._last_spawn = time.time()
+
+            script = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'job_supervisor.py')
+            # New session: the supervisor outlives gunicorn worker recycling
+            self._supervisor = subprocess.Popen([sys.executable, script], start_new_session=True)
+            logger.info(f"Started job supervisor (pid {self._supervisor.pid})")
+
+    # Recovery after a restart
+
+    def recover(self):
+        """Requeue or interrupt jobs left running by a dispatcher that died"""
+        for job in job_journal.running_jobs():
+            task_id = job['task_id']
+            if _pid_alive(job['owner_pid']):
+                # Job process outlived its dispatcher; it records its own result
+                continue
+            _remove_partial_outputs(task_id)
+
+            if job['attempts'] < JOB_MAX_ATTEMPTS and _inputs_exist(job['params']):
+                job_journal.requeue(task_id)
+                update_progress(task_id, 0, 'queued', 'Server dimulai ulang, tugas diantrekan kembali...')
+                logger.info(f"Requeued job {job['job_type']} ({task_id}) after restart")
+            else:
+                job_journal.finish(task_id, 'interrupted')
+                _remove_inputs(job['params'])
+                update_progress(task_id, 0, 'interrupted', 'Tugas terhenti karena server dimulai ulang')
+                logger.warning(f"Job {job['job_type']} ({task_id}) interrupted by restart")
+
+    # Cancellation
+
+    def cancel(self, task_id: str, message: str = 'Tugas dibatalkan') -> Optional[bool]:
+        """Cancel a queued or running job
+
+        Returns None for unknown tasks and False if the job already finished.
+        Running jobs are stopped by their dispatcher within CANCEL_POLL_INTERVAL.
+        """
+        job = job_journal.get_job(task_id)
+        if not job:
+            return None
+
+        if job['status'] == 'queued' and job_journal.finish(task_id, 'cancelled', from_status='queued'):
+            _remove_inputs(job['params'])
+            update_progress(task_id, 0, 'cancelled', message)
+            return True
+
+        # Either running, or claimed between the lookup and the update above
+        return job_journal.request_cancel(task_id, message)
+
+    def _watchdog_loop(self):
+        """Cancel jobs whose progress nobody has polled or streamed for a while"""
+        while True:
+            time.sleep(WATCHDOG_INTERVAL)
+            try:
+                for task_id in job_journal.unwatched_jobs(ABANDONED_TASK_SECONDS):
+                    logger.info(f"Cancelling unwatched task {task_id}")
+                    self.cancel(task_id, 'Tugas dibatalkan karena tidak ada yang memantau')
+            except Exception as e:
+                logger.error(f"Job watchdog failed: {e}")
+
+    # Dispatch
+
+    def _queued_message(self, position: int) -> str:
+        return f'Menunggu antrian (posisi {position})...'
+
+    def _refresh_positions(self, resource_class: str):
+        """Report new queue positions after a job leaves the queue"""
+        for position, job in enumerate(job_journal.queued_jobs(resource_class), start=1):
+            update_progress(job['task_id'], 0, 'queued', self._queued_message(position),
+                            queue_position=position)
+
+    def _worker_loop(self, resource_class: str):
+        wakeup = self._wakeup[resource_class]
+        while True:
+            try:
+                job = job_journal.claim_next(resource_class)
+            except Exception as e:
+                logger.error(f"Claiming {resource_class} job failed: {e}")
+                job = None
+
+            if not job:
+                wakeup.wait(DISPATCH_POLL_INTERVAL)
+                wakeup.clear()
+                continue
+
+            self._refresh_positions(resource_class)
+            self._run_job(job)
+
+    def _run_job(self, job: Dict):
+        """Run one job in its own process and stop it if it gets cancelled"""
+        task_id = job['task_id']
+        handler, _ = job_handlers.get(job['job_type'], (None, None))
+        if handler is None:
+            job_journal.finish(task_id, 'failed')
+            update_progress(task_id, 0, 'error', 'Tugas gagal: jenis tugas tidak dikenal')
+            return
+
+        # Not a daemon: jobs such as image batches start worker processes of their own
+        process = _job_context.Process(
+            target=_job_process_main,
+            args=(task_id, job['job_type'], job['params'], handler.__module__),
+            name=f'job-{task_id}'
+        )
+        process.start()
+
+        while True:
+            process.join(CANCEL_POLL_INTERVAL)
+            if process.exitcode is not None:
+                break
+            reason = job_journal.cancel_reason(task_id)
+            if reason:
+                _terminate(process)
+                if job_journal.finish(task_id, 'cancelled'):
+                    _remove_partial_outputs(task_id)
+                    _remove_inputs(job['params'])
+                    update_progress(task_id, 0, 'cancelled', reason)
+                    logger.info(f"Cancelled job {job['job_type']} ({task_id})")
+                return
+
+        # The job process records its own result; this only catches crashes
+        if job_journal.finish(task_id, 'failed'):
+            logger.error(f"Job process for {job['job_type']} ({task_id}) exited with code {process.exitcode}")
+            _remove_partial_outputs(task_id)
+            _remove_inputs(job['params'])
+            update_progress(task_id, 0, 'error', 'Tugas gagal: proses berhenti tiba-tiba')
+
+def _run_handler(task_id: str, job_type: str, params: Dict) -> str:
+    handler, _ = job_handlers[job_type]
+    try:
+        update_progress(task_id, 5, 'processing', 'Memulai pemrosesan...')
+        handler(task_id, **params)
+    except Exception as e:
+        logger.error(f"Job {job_type} ({task_id}) failed: {e}")
+        update_progress(task_id, 0, 'error', f'Tugas gagal: {str(e)}')
+        return 'failed'
+
+    # Handlers report their own errors through progress
+    return 'failed' if get_progress(task_id).get('status') == 'error' else 'completed'
+
+def _job_process_main(task_id: str, job_type: str, params: Dict, handler_module: str):
+    """Entry point of a job process"""
+    # Own process group, so ffmpeg/pandoc/yt-dlp children are killed with the job
+    os.setsid()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    importlib.import_module(handler_module)
+    job_journal.set_owner(task_id, os.getpid())
+    _, resource_class = job_handlers[job_type]
+    threads = resource_governor.apply_job_limits(resource_class)
+    logger.info(f"Job {job_type} ({task_id}) runs with {threads} threads")
+
+    status = _run_handler(task_id, job_type, params)
+    job_journal.finish(task_id, status)
+    # Multiprocessing children skip atexit handlers
+    progress_store.flush()
+
+def _terminate(process):
+    """Stop a job process and everything it started"""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            # No process group yet (setsid has not run); signal the process alone
+            try:
+                os.kill(process.pid, sig)
+            except ProcessLookupError:
+                pass
+        process.join(CANCEL_GRACE_SECONDS)
+        if process.exitcode is not None:
+            return
+
+def _pid_alive(pid: Optional[int]) -> bool:
+    if not pid or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _job_input_paths(params: Dict):
+    paths = list(params.get('file_paths') or [])
+    if params.get('input_path'):
+        paths.append(params['input_path'])
+    return paths
+
+def _inputs_exist(params: Dict) -> bool:
+    return all(os.path.exists(path) for path in _job_input_paths(params))
+
+def _remove_inputs(params: Dict):
+    for path in _job_input_paths(params):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _remove_partial_outputs(task_id: str):
+    """Delete whatever an interrupted job left in the output folder"""
+    forget_outputs(task_id)
+    for path in glob.glob(os.path.join(OUTPUT_FOLDER, f'*{task_id}*')):
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            os.remove(path)
+
+# Shared scheduler instance used by all blueprints
+job_scheduler = JobScheduler(JOB_CONCURRENCY)
+
+def submit_job(task_id: str, job_type: str, **params) -> int:
+    """Submit a registered job type for background processing"""
+    return job_scheduler.submit(task_id, job_type, params)
+
+def cancel_job(task_id: str, message: str = 'Tugas dibatalkan') -> Optional[bool]:
+    """Cancel a queued or running job"""
+    return job_scheduler.cancel(task_id, message)
@@ -0,0 +1,24 @@
+# SQLite helpers for node-local state shared across gunicorn workers
+import os
+import sqlite3
+import threading
+
+_local = threading.local()
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Get a per-thread, per-process WAL connection to a state database"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None or getattr(_local, 'pid', None) != os.getpid():
+        # Connections must not be shared across a fork
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    conn = connections.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=10000')
+        connections[db_path] = conn
+    return conn
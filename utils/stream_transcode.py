@@ -0,0 +1,140 @@
+# Pipe-through transcodes: the input is piped into ffmpeg and its output streamed to the client
+import os
+import logging
+import threading
+import subprocess
+from collections import deque
+from typing import BinaryIO, Iterator, List, Optional
+from werkzeug.exceptions import RequestEntityTooLarge
+from .config import STREAM_TRANSCODE_MAX_CONCURRENT
+
+logger = logging.getLogger(__name__)
+
+# Read and write size; small enough that the first bytes leave quickly
+STREAM_CHUNK_SIZE = 64 * 1024
+# Time the input feeder gets to notice ffmpeg is gone
+FEEDER_JOIN_TIMEOUT = 5
+
+_slots = threading.BoundedSemaphore(max(1, STREAM_TRANSCODE_MAX_CONCURRENT))
+
+class StreamTranscodeError(Exception):
+    """A transcode that could not start; the message is shown to the user"""
+
+    def __init__(self, message: str, status_code: int = 422):
+        super().__init__(message)
+        self.status_code = status_code
+
+class StreamTranscode:
+    """One ffmpeg run read as an iterator of output chunks, nothing written to disk
+
+    The input comes from source (written to stdin after prefix, e.g. bytes
+    already read for content sniffing) or from a path in the ffmpeg
+    arguments. cleanup_path is removed when the run ends.
+    """
+
+    def __init__(self, args: List[str], source: Optional[BinaryIO] = None, prefix: bytes = b'',
+                 cleanup_path: Optional[str] = None):
+        self.args = args
+        self.source = source
+        self.prefix = prefix
+        self.cleanup_path = cleanup_path
+        self.process = None
+        self._first_chunk = b''
+        self._threads = []
+        self._stderr_tail = deque(maxlen=20)
+        self._slot_held = False
+        self._input_error = None
+
+    def start(self) -> 'StreamTranscode':
+        """Start ffmpeg and wait for its first output, so bad input fails before any response"""
+        if not _slots.acquire(blocking=False):
+            self._remove_input()
+            raise StreamTranscodeError('Server sedang sibuk, coba lagi sebentar lagi', 503)
+        self._slot_held = True
+        try:
+            self.process = subprocess.Popen(
+                self.args, stdin=subprocess.PIPE if self.source else subprocess.DEVNULL,
+                stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+            self._spawn(self._drain_stderr)
+            if self.source:
+                self._spawn(self._feed)
+
+            self._first_chunk = self.process.stdout.read1(STREAM_CHUNK_SIZE)
+            if not self._first_chunk:
+                self.process.wait()
+                for thread in self._threads:
+                    thread.join(FEEDER_JOIN_TIMEOUT)
+                if self._input_error:
+                    raise self._input_error
+                detail = b''.join(self._stderr_tail).decode(errors='replace').strip().splitlines()
+                logger.warning(f"Streaming transcode produced no output: {detail[-1] if detail else 'no stderr'}")
+                raise StreamTranscodeError('File tidak dapat diproses secara streaming')
+        except BaseException:
+            self.close()
+            raise
+        return self
+
+    def __iter__(self) -> Iterator[bytes]:
+        try:
+            if self._first_chunk:
+                yield self._first_chunk
+            while chunk := self.process.stdout.read1(STREAM_CHUNK_SIZE):
+                yield chunk
+            if self.process.wait() != 0:
+                # Headers are already sent; the client sees a truncated body
+                reason = self._input_error or f'exit code {self.process.returncode}'
+                logger.error(f"Streaming transcode failed: {reason}")
+        finally:
+            # Also runs when the client disconnects (the generator is closed)
+            self.close()
+
+    def close(self):
+        """Stop ffmpeg, release the concurrency slot and remove the input file"""
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+        if self.process:
+            self.process.wait()
+            self.process.stdout.close()
+        for thread in self._threads:
+            thread.join(FEEDER_JOIN_TIMEOUT)
+        self._threads = []
+        if self._slot_held:
+            self._slot_held = False
+            _slots.release()
+        self._remove_input()
+
+    def _spawn(self, target):
+        thread = threading.Thread(target=target, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _drain_stderr(self):
+        # A chatty ffmpeg must never block on a full stderr pipe
+        for line in self.process.stderr:
+            self._stderr_tail.append(line)
+
+    def _feed(self):
+        """Copy the input into ffmpeg's stdin while the output is being read"""
+        stdin = self.process.stdin
+        try:
+            if self.prefix:
+                stdin.write(self.prefix)
+            while block := self.source.read(STREAM_CHUNK_SIZE):
+                stdin.write(block)
+        except (OSError, ValueError):
+            # ffmpeg exited (or was killed) before reading everything
+            pass
+        except RequestEntityTooLarge:
+            # Body over the size limit: ffmpeg must not finish on a truncated input
+            self._input_error = StreamTranscodeError('File terlalu besar untuk streaming', 413)
+            self.process.kill()
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def _remove_input(self):
+        if self.cleanup_path and os.path.exists(self.cleanup_path):
+            os.remove(self.cleanup_path)
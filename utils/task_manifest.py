@@ -0,0 +1,129 @@
+# Task output manifest: maps each task to the artifacts it produced
+import os
+import time
+import zipfile
+import logging
+import mimetypes
+from typing import Dict, List, Optional
+from .sqlite_store import connect
+from .expiry_index import track, touch
+from .config import TASK_DB_PATH
+
+logger = logging.getLogger(__name__)
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS task_outputs (
+            task_id TEXT NOT NULL,
+            path TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            mime TEXT,
+            kind TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (task_id, path)
+        )
+    ''')
+
+_init_schema()
+
+def _path_size(path: str) -> int:
+    if os.path.isdir(path):
+        total = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return total
+    return os.path.getsize(path)
+
+def record_output(task_id: str, path: str, kind: Optional[str] = None) -> Dict:
+    """Record an output artifact (file or directory) produced by a task"""
+    if kind is None:
+        kind = 'directory' if os.path.isdir(path) else 'file'
+    mime = None if os.path.isdir(path) else (mimetypes.guess_type(path)[0] or 'application/octet-stream')
+    artifact = {
+        'path': path,
+        'size': _path_size(path),
+        'mime': mime,
+        'kind': kind,
+        'created_at': time.time(),
+    }
+    connect(TASK_DB_PATH).execute(
+        'INSERT OR REPLACE INTO task_outputs (task_id, path, size, mime, kind, created_at) '
+        'VALUES (?, ?, ?, ?, ?, ?)',
+        (task_id, path, artifact['size'], mime, kind, artifact['created_at'])
+    )
+    track(path, task_id, kind, artifact['size'])
+    return artifact
+
+def get_outputs(task_id: str) -> List[Dict]:
+    """Get all artifacts recorded for a task, oldest first"""
+    rows = connect(TASK_DB_PATH).execute(
+        'SELECT path, size, mime, kind, created_at FROM task_outputs '
+        'WHERE task_id = ? ORDER BY created_at',
+        (task_id,)
+    ).fetchall()
+    return [
+        {'path': path, 'size': size, 'mime': mime, 'kind': kind, 'created_at': created_at}
+        for path, size, mime, kind, created_at in rows
+    ]
+
+def forget_outputs(task_id: str):
+    """Remove all manifest entries of a task"""
+    connect(TASK_DB_PATH).execute('DELETE FROM task_outputs WHERE task_id = ?', (task_id,))
+
+def resolve_download(task_id: str) -> Optional[Dict]:
+    """Get the single downloadable artifact of a task
+
+    A task with one output file is served directly. Directories and
+    multi-file outputs are packed into a zip bundle once, which is then
+    recorded in the manifest and reused.
+    """
+    outputs = [a for a in get_outputs(task_id) if os.path.exists(a['path'])]
+    # A streaming package next to the downloaded file is only for playback
+    if any(a['kind'] != 'stream' for a in outputs):
+        outputs = [a for a in outputs if a['kind'] != 'stream']
+    if not outputs:
+        return None
+
+    bundles = [a for a in outputs if a['kind'] == 'bundle']
+    if bundles:
+        artifact = bundles[-1]
+    elif len(outputs) == 1 and outputs[0]['kind'] == 'file':
+        artifact = outputs[0]
+    else:
+        return _create_bundle(task_id, outputs)
+
+    touch(artifact['path'])
+    return artifact
+
+def resolve_stream(task_id: str) -> Optional[str]:
+    """Get the directory served under /stream (HLS package, thumbnails or responsive images), if any"""
+    streams = [a for a in get_outputs(task_id) if a['kind'] == 'stream' and os.path.isdir(a['path'])]
+    return streams[-1]['path'] if streams else None
+
+def _create_bundle(task_id: str, outputs: List[Dict]) -> Dict:
+    """Zip all artifacts of a task into one downloadable file"""
+    output_folder = os.path.dirname(outputs[0]['path'].rstrip(os.sep))
+    bundle_path = os.path.join(output_folder, f'bundle_{task_id}.zip')
+    temp_path = f'{bundle_path}.{os.getpid()}.tmp'
+
+    with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for artifact in outputs:
+            path = artifact['path']
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    for name in files:
+                        file_path = os.path.join(root, name)
+                        arcname = os.path.join(os.path.basename(path), os.path.relpath(file_path, path))
+                        zipf.write(file_path, arcname)
+            else:
+                zipf.write(path, os.path.basename(path))
+
+    # Atomic publish so concurrent requests never serve a partial zip
+    os.replace(temp_path, bundle_path)
+    logger.info(f"Created download bundle for task {task_id}")
+    return record_output(task_id, bundle_path, kind='bundle')
@@ -0,0 +1,268 @@
+# Resumable chunked uploads streamed straight to disk
+import os
+import time
+import uuid
+import fcntl
+import hashlib
+import logging
+from typing import Dict, Optional, Tuple, BinaryIO
+from werkzeug.utils import secure_filename
+from .sqlite_store import connect
+from .common import allowed_file, sniff_file_types
+from . import resumable_hash, expiry_index
+from .config import (TASK_DB_PATH, UPLOAD_FOLDER, CHUNKED_UPLOAD_MAX_SIZE,
+                     CHUNKED_UPLOAD_CHUNK_SIZE, CHUNKED_UPLOAD_TTL_SECONDS)
+
+logger = logging.getLogger(__name__)
+
+# Bytes kept from the start of the upload for magic byte sniffing
+SNIFF_BYTES = 512
+READ_BLOCK_SIZE = 64 * 1024
+
+class UploadError(Exception):
+    """Upload request that cannot be accepted; message is shown to the user"""
+
+    def __init__(self, message: str, status_code: int = 400, received: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.received = received
+
+def _init_schema():
+    conn = connect(TASK_DB_PATH)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS upload_sessions (
+            upload_id TEXT PRIMARY KEY,
+            filename TEXT NOT NULL,
+            file_type TEXT,
+            total_size INTEGER NOT NULL,
+            received INTEGER NOT NULL DEFAULT 0,
+            header BLOB,
+            sha256 TEXT,
+            hash_state BLOB,
+            status TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    ''')
+
+_init_schema()
+
+def _part_path(upload_id: str) -> str:
+    return os.path.join(UPLOAD_FOLDER, f'chunked_{upload_id}.part')
+
+def _session_row(upload_id: str) -> Optional[Dict]:
+    row = connect(TASK_DB_PATH).execute(
+        'SELECT upload_id, filename, file_type, total_size, received, header, sha256, hash_state, status, '
+        'created_at FROM upload_sessions WHERE upload_id = ?', (upload_id,)
+    ).fetchone()
+    if not row:
+        return None
+    keys = ('upload_id', 'filename', 'file_type', 'total_size', 'received', 'header', 'sha256',
+            'hash_state', 'status', 'created_at')
+    return dict(zip(keys, row))
+
+def public_session(session: Dict) -> Dict:
+    """Session fields safe to return to the client"""
+    return {
+        'upload_id': session['upload_id'],
+        'filename': session['filename'],
+        'total_size': session['total_size'],
+        'received': session['received'],
+        'status': session['status'],
+        'sha256': session['sha256'],
+        'chunk_size': CHUNKED_UPLOAD_CHUNK_SIZE,
+    }
+
+def create_session(filename: str, total_size: int, file_type: Optional[str] = None) -> Dict:
+    """Start a new chunked upload"""
+    filename = secure_filename(filename or '')
+    if not filename:
+        raise UploadError('Nama file tidak valid')
+    if file_type and not allowed_file(filename, file_type):
+        raise UploadError('Format file tidak valid')
+    if total_size <= 0:
+        raise UploadError('File kosong')
+    if total_size > CHUNKED_UPLOAD_MAX_SIZE:
+        raise UploadError(f'File terlalu besar (maksimal {CHUNKED_UPLOAD_MAX_SIZE // (1024 * 1024)}MB)', 413)
+
+    _purge_stale_sessions()
+
+    upload_id = str(uuid.uuid4())
+    now = time.time()
+    # Pre-create the part file so every chunk can open it in r+b mode
+    open(_part_path(upload_id), 'wb').close()
+    # Abandoned parts are deleted by the expiry sweeper; every chunk renews the expiry
+    expiry_index.track(_part_path(upload_id), kind='upload', ttl_seconds=CHUNKED_UPLOAD_TTL_SECONDS)
+    connect(TASK_DB_PATH).execute(
+        'INSERT INTO upload_sessions (upload_id, filename, file_type, total_size, received, status, '
+        'created_at, updated_at) VALUES (?, ?, ?, ?, 0, ?, ?, ?)',
+        (upload_id, filename, file_type, total_size, 'uploading', now, now)
+    )
+    return public_session(_session_row(upload_id))
+
+def get_session(upload_id: str) -> Optional[Dict]:
+    """Get upload state (used by clients to resume after a dropped connection)"""
+    return _session_row(upload_id)
+
+def write_chunk(upload_id: str, offset: int, stream: BinaryIO, length: Optional[int] = None) -> Dict:
+    """Append a chunk at the given offset, streaming it to disk while hashing
+
+    Only offset == bytes received so far is accepted. Bytes written before a
+    connection drop are kept, so the client resumes from the reported offset.
+    A chunk larger than CHUNKED_UPLOAD_CHUNK_SIZE or past the declared size
+    is refused and nothing of it is kept (checked up front when the request
+    has a Content-Length). The hash state is saved with every chunk, so
+    chunks may go to different workers.
+    """
+    session = _session_row(upload_id)
+    if not session:
+        raise UploadError('Sesi unggahan tidak ditemukan', 404)
+    if session['status'] != 'uploading':
+        raise UploadError('Sesi unggahan sudah selesai', 409, session['received'])
+    if length is not None and (length > CHUNKED_UPLOAD_CHUNK_SIZE or offset + length > session['total_size']):
+        raise UploadError('Chunk terlalu besar', 400, session['received'])
+
+    try:
+        part = open(_part_path(upload_id), 'r+b')
+    except FileNotFoundError:
+        # Part expired and was swept; the session cannot be resumed
+        abort_session(upload_id)
+        raise UploadError('Sesi unggahan tidak ditemukan', 404)
+
+    with part:
+        try:
+            # Serialize writers across gunicorn workers
+            fcntl.flock(part.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise UploadError('Chunk lain sedang diunggah', 409, session['received'])
+
+        # Re-read under the lock; another worker may have advanced it
+        session = _session_row(upload_id)
+        received = session['received']
+        if offset != received:
+            raise UploadError('Offset tidak sesuai', 409, received)
+
+        hasher = _resume_hasher(session)
+        header = session['header'] or b''
+        limit = min(CHUNKED_UPLOAD_CHUNK_SIZE, session['total_size'] - received)
+        written = 0
+        oversize = False
+
+        part.seek(received)
+        try:
+            while written < limit:
+                block = stream.read(min(READ_BLOCK_SIZE, limit - written))
+                if not block:
+                    break
+                part.write(block)
+                if hasher is not None:
+                    hasher.update(block)
+                if len(header) < SNIFF_BYTES:
+                    header += block[:SNIFF_BYTES - len(header)]
+                written += len(block)
+            # More data than fits: the bytes written stay unrecorded and are overwritten later
+            oversize = written == limit and bool(stream.read(1))
+        finally:
+            # Persist whatever arrived, even if the client disconnected mid-chunk
+            part.flush()
+            if not oversize:
+                received += written
+                connect(TASK_DB_PATH).execute(
+                    'UPDATE upload_sessions SET received = ?, header = ?, hash_state = ?, updated_at = ? '
+                    'WHERE upload_id = ?',
+                    (received, header, hasher.state() if hasher is not None else None, time.time(), upload_id)
+                )
+                expiry_index.track(_part_path(upload_id), kind='upload', size=received,
+                                   ttl_seconds=CHUNKED_UPLOAD_TTL_SECONDS)
+
+        if oversize:
+            raise UploadError('Chunk terlalu besar', 400, received)
+
+    session['received'] = received
+    return public_session(session)
+
+def finalize_session(upload_id: str) -> Dict:
+    """Verify a fully received upload: size, magic bytes and content hash"""
+    session = _session_row(upload_id)
+    if not session:
+        raise UploadError('Sesi unggahan tidak ditemukan', 404)
+    if session['status'] == 'complete':
+        return public_session(session)
+    if session['received'] != session['total_size']:
+        raise UploadError('Unggahan belum lengkap', 409, session['received'])
+
+    detected = sniff_file_types(session['header'] or b'')
+    file_type = session['file_type']
+    # Text formats have no signature; anything with a known signature must match
+    if file_type and detected and file_type not in detected:
+        abort_session(upload_id)
+        raise UploadError('Isi file tidak sesuai dengan formatnya')
+
+    hasher = _resume_hasher(session)
+    # Without libcrypto the hash has to be computed from the file once
+    sha256 = hasher.hexdigest() if hasher is not None else hash_file(_part_path(upload_id))
+
+    connect(TASK_DB_PATH).execute(
+        "UPDATE upload_sessions SET status = 'complete', sha256 = ?, updated_at = ? WHERE upload_id = ?",
+        (sha256, time.time(), upload_id)
+    )
+    session.update(status='complete', sha256=sha256)
+    return public_session(session)
+
+def claim_upload(upload_id: str, task_id: str, file_type: Optional[str] = None,
+                 prefix: str = '') -> Tuple[str, Dict]:
+    """Move a finalized upload into UPLOAD_FOLDER for a task (each upload can be claimed once)"""
+    session = _session_row(upload_id)
+    if not session or session['status'] != 'complete':
+        raise UploadError('Unggahan tidak ditemukan atau belum selesai')
+    if file_type and not allowed_file(session['filename'], file_type):
+        raise UploadError('Format file tidak valid')
+
+    claimed = connect(TASK_DB_PATH).execute(
+        "UPDATE upload_sessions SET status = 'claimed', updated_at = ? WHERE upload_id = ? AND status = 'complete'",
+        (time.time(), upload_id)
+    ).rowcount
+    if not claimed:
+        raise UploadError('Unggahan sudah digunakan')
+
+    input_path = os.path.join(UPLOAD_FOLDER, f"{prefix}{task_id}_{session['filename']}")
+    os.replace(_part_path(upload_id), input_path)
+    expiry_index.forget(_part_path(upload_id))
+    connect(TASK_DB_PATH).execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+    return input_path, session
+
+def abort_session(upload_id: str):
+    """Cancel an upload and delete its partial data"""
+    connect(TASK_DB_PATH).execute('DELETE FROM upload_sessions WHERE upload_id = ?', (upload_id,))
+    part_path = _part_path(upload_id)
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    expiry_index.forget(part_path)
+
+def _resume_hasher(session: Dict) -> Optional[resumable_hash.ResumableSha256]:
+    """Running hash of the bytes received so far, restored from the session record"""
+    if not resumable_hash.available():
+        return None
+    if session['received'] == 0:
+        return resumable_hash.ResumableSha256()
+    if session['hash_state'] is None:
+        return None
+    return resumable_hash.ResumableSha256(session['hash_state'])
+
+def hash_file(path: str) -> str:
+    """SHA-256 of a file on disk"""
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while block := f.read(1024 * 1024):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+def _purge_stale_sessions():
+    """Drop sessions that were abandoned longer than the TTL"""
+    cutoff = time.time() - CHUNKED_UPLOAD_TTL_SECONDS
+    conn = connect(TASK_DB_PATH)
+    stale = conn.execute('SELECT upload_id FROM upload_sessions WHERE updated_at < ?', (cutoff,)).fetchall()
+    for (upload_id,) in stale:
+        abort_session(upload_id)
+    if stale:
+        logger.info(f"Purged {len(stale)} stale upload sessions")
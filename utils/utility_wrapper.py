@@ -10,7 +10,8 @@ import tarfile
 import json
 import logging
 from typing import Optional, Dict, List, Any
-from .common import update_progress
+from .common import update_progress, safe_filename
+from .task_manifest import record_output
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +55,7 @@ class UtilityProcessor:
             output_path = os.path.join(self.output_folder, output_filename)
             img.save(output_path)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 'QR code berhasil dibuat!')
             return output_path
             
@@ -133,7 +135,7 @@ class UtilityProcessor:
                 archive_name = f'archive_{task_id}'
             
             if archive_type == 'zip':
-                output_filename = f'{archive_name}.zip'
+                output_filename = safe_filename(f'{archive_name}.zip', task_id)
                 output_path = os.path.join(self.output_folder, output_filename)
                 
                 with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
@@ -154,7 +156,7 @@ class UtilityProcessor:
                 elif 'bz2' in ext:
                     mode = 'w:bz2'
                     
-                output_filename = f'{archive_name}.{ext}'
+                output_filename = safe_filename(f'{archive_name}.{ext}', task_id)
                 output_path = os.path.join(self.output_folder, output_filename)
                 
                 with tarfile.open(output_path, mode) as tarf:
@@ -166,6 +168,7 @@ class UtilityProcessor:
                         arcname = os.path.basename(file_path)
                         tarf.add(file_path, arcname)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', f'Arsip {archive_type} berhasil dibuat!')
             return output_path
             
@@ -203,6 +206,7 @@ class UtilityProcessor:
                                       f'Mengekstrak file {i+1} dari {len(members)}...')
                         tarf.extract(member, extract_dir)
             
+            record_output(task_id, extract_dir)
             update_progress(task_id, 100, 'completed', 'Arsip berhasil diekstrak!')
             return extract_dir
             
@@ -259,6 +263,7 @@ class UtilityProcessor:
             with open(hash_path, 'w') as f:
                 json.dump(result, f, indent=2)
             
+            record_output(task_id, hash_path)
             update_progress(task_id, 100, 'completed', f'Hash {hash_type.upper()} berhasil dihitung!')
             return result
             
@@ -298,6 +303,7 @@ class UtilityProcessor:
             with open(output_path, 'w', encoding=target_encoding) as f:
                 f.write(content)
             
+            record_output(task_id, output_path)
             update_progress(task_id, 100, 'completed', 
                           f'Encoding berhasil dikonversi dari {source_encoding} ke {target_encoding}!')
             return output_path
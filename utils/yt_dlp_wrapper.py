@@ -5,6 +5,7 @@ import gallery_dl
 import logging
 from typing import Dict, Optional, List
 from .common import update_progress
+from .task_manifest import record_output
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +19,8 @@ class MediaDownloader:
         self.ffmpeg_location = shutil.which('ffmpeg')
         
     def download_video(self, url: str, task_id: str, format_type: str = 'mp4', 
-                      quality: str = 'best') -> bool:
-        """Download video with yt-dlp"""
+                      quality: str = 'best', complete: bool = True) -> bool:
+        """Download video with yt-dlp (complete=False leaves the task open for a follow-up step)"""
         try:
             update_progress(task_id, 10, 'processing', 'Mengambil informasi video...')
             
@@ -51,9 +52,14 @@ class MediaDownloader:
             update_progress(task_id, 30, 'processing', 'Memulai unduhan...')
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True)
             
-            update_progress(task_id, 100, 'completed', 'Unduhan berhasil!')
+            self._record_downloads(task_id, info)
+            
+            if complete:
+                update_progress(task_id, 100, 'completed', 'Unduhan berhasil!')
+            else:
+                update_progress(task_id, 90, 'processing', 'Unduhan selesai, menyiapkan streaming...')
             return True
             
         except Exception as e:
@@ -83,7 +89,9 @@ class MediaDownloader:
             update_progress(task_id, 30, 'processing', 'Memulai unduhan audio...')
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True)
+            
+            self._record_downloads(task_id, info)
             
             update_progress(task_id, 100, 'completed', 'Unduhan audio berhasil!')
             return True
@@ -111,7 +119,9 @@ class MediaDownloader:
             update_progress(task_id, 30, 'processing', f'Mengunduh maksimal {max_downloads} video...')
             
             with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                ydl.download([url])
+                info = ydl.extract_info(url, download=True)
+            
+            self._record_downloads(task_id, info)
             
             update_progress(task_id, 100, 'completed', 'Unduhan playlist berhasil!')
             return True
@@ -148,6 +158,7 @@ class MediaDownloader:
             ], input=str(config), text=True, capture_output=True, timeout=300)  # 5 minute timeout
             
             if result.returncode == 0:
+                record_output(task_id, output_dir)
                 update_progress(task_id, 100, 'completed', 'Unduhan galeri berhasil!')
                 return True
             else:
@@ -189,6 +200,26 @@ class MediaDownloader:
             logger.error(f"Failed to get video info: {e}")
             return None
     
+    def _record_downloads(self, task_id: str, info: Optional[Dict]) -> int:
+        """Record the final files written by yt-dlp (after post-processing) in the task manifest"""
+        if not info:
+            return 0
+        
+        count = 0
+        entries = info.get('entries') or [info]
+        for entry in entries:
+            if not entry:
+                continue  # Playlist entries that failed with ignoreerrors
+            for download in entry.get('requested_downloads') or []:
+                filepath = download.get('filepath')
+                if filepath and os.path.exists(filepath):
+                    record_output(task_id, filepath)
+                    count += 1
+        
+        if count == 0:
+            logger.warning(f"No downloaded files found for task {task_id}")
+        return count
+    
     def _get_audio_config(self, format_type: str, quality: str) -> Dict:
         """Get audio configuration for different formats"""
         base_config = {